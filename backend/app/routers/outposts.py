@@ -1,154 +1,183 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
-
-from backend.app.utils.outposts_utils import SpawnPoint, FetchSpawnPoint, DeleteSpawnPoint
-from backend.app.utils.mongo_utils import mongo_client
-
-import os, json, random, datetime
-
-router = APIRouter(
-    prefix="/outposts",
-    tags=["Outposts"]
-)
-
-# List all outposts
-@router.get("/")
-async def list_outposts():
-    return {"outposts": ["Siberian Frontier", "Indian Bazar", "Arab Souk"]}
-
-@router.get("/route_coordinates")
-async def route_coordinates():
-    database_name = "transports"
-    collection_name = "routes"
-
-    db = mongo_client[database_name]
-    collection = db[collection_name]
-
-    routes = list(collection.find({}, {"_id": 0}))
-
-    return JSONResponse(status_code=200, content=routes)
-
-# Get details of a specific outpost
-@router.get("/{outpost_id}")
-async def get_outpost(outpost_id: int):
-    return {"outpost_id": outpost_id, "name": "Sample Outpost", "language": "Russian"}
-
-
-@router.post("/add_spawn_point")
-# async def add_spawn_point(spawn_point: dict, admin_password: str):
-async def add_spawn_point(spawn_point: SpawnPoint, admin_password: str):
-    real_admin_password = os.getenv("ADMIN_PASSWORD")
-    if admin_password != real_admin_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can add spawn points"})
-    
-    db = mongo_client["outposts"]
-    collection = db["spawn_points"]
-
-    spawn_point = spawn_point.model_dump()
-    # Check if spawn point already exists
-    existing_spawn_point = collection.find_one({"id": spawn_point["id"]})
-    if existing_spawn_point:
-        return JSONResponse(status_code=400, content={"message": "Spawn point already exists, update it using /update_spawn_point"})
-    
-    collection.insert_one(spawn_point)
-    return JSONResponse(status_code=200, content={"message": "Spawn point added"})
-
-@router.post("/update_spawn_point")
-async def update_spawn_point(spawn_id:str, spawn_point:dict, admin_password: str):
-    real_admin_password = os.getenv("ADMIN_PASSWORD")
-    if admin_password != real_admin_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can update spawn points"})
-    
-    db = mongo_client["outposts"]
-    collection = db["spawn_points"]
-
-    # Check if spawn point exists
-    existing_spawn_point = collection.find_one({"id": spawn_id})
-    if not existing_spawn_point:
-        return JSONResponse(status_code=404, content={"message": "Spawn point not found"})
-    
-    collection.update_one({"id": spawn_id}, {"$set": spawn_point})
-    return JSONResponse(status_code=200, content={"message": "Spawn point updated"})
-
-@router.post("/fetch_spawn_points")
-async def fetch_spawn_points():
-    print("Inside /outposts/fetch_spawn_points")
-    db = mongo_client["outposts"]
-    collection = db["spawn_points"]
-
-    # Use MongoDB's aggregation framework to get selected fields
-    spawn_points = list(collection.find(
-        {},
-        {'_id': 0, "goods_available": 0, "goods_demanded": 0, 'trade_routes': 0}
-    ))
-
-    # No need to use json.dumps(), FastAPI handles serialization automatically
-    return JSONResponse(status_code=200, content=spawn_points)
-
-@router.post("/choose_spawn_point")
-async def choose_spawn_point(data: FetchSpawnPoint):
-    print("Inside /outposts/choose_spawn_point")
-    username = data.username
-    spawn_id = data.spawn_id
-    try:
-        db_user = mongo_client["users"]
-        db_outpost = mongo_client["outposts"]
-        user_collection = db_user["metaverse_users"]
-        spawn_collection = db_outpost["spawn_points"]
-
-        # Check if spawn point exists
-        existing_spawn_point = spawn_collection.find_one({"id": spawn_id})
-        if not existing_spawn_point:
-            return JSONResponse(status_code=404, content={"message": "Spawn point not found"})
-        
-        # Check if user exists
-        existing_user = user_collection.find_one({"username": username})
-        if not existing_user:
-            return JSONResponse(status_code=404, content={"message": "User not found"})
-
-        # Check if user has already chosen a spawn point
-        if existing_user.get("chose_spawn_already"):
-            return JSONResponse(status_code=400, content={"message": "User has already chosen a spawn point. Use transports to move to the chosen spawn point."})
-
-        bonus_amount = existing_spawn_point.get("gold_bonus", 0)
-        time = datetime.datetime.now()
-        user_collection.update_one({"username": username}, {"$set": {"spawn_outpost_id": spawn_id, "current_outpost_id": spawn_id,"chose_spawn_already": True, "money": bonus_amount, "merchandise_weight": 0,"updated_at": time}})
-
-        return JSONResponse(status_code=200, content={"message": "Spawn point chosen"})
-    
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"message": str(e)})
-
-@router.post("/delete_spawn_point")
-async def delete_spawn_point(request: DeleteSpawnPoint):
-    real_admin_password = os.getenv("ADMIN_PASSWORD")
-    if request.admin_password != real_admin_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can delete spawn points"})
-    
-    spawn_id = request.spawn_id
-
-    db_user = mongo_client["users"]
-    db_outpost = mongo_client["outposts"]
-    user_collection = db_user["metaverse_users"]
-    spawn_collection = db_outpost["spawn_points"]
-
-    # Check if spawn point exists
-    unique_spawn_ids = spawn_collection.distinct("id")
-
-    if not unique_spawn_ids:
-        return JSONResponse(status_code=404, content={"message": "No spawn points found"})
-    if spawn_id not in unique_spawn_ids:
-        return JSONResponse(status_code=404, content={"message": f"Spawn point with ID {spawn_id} not found"})
-    
-    unique_spawn_ids.remove(spawn_id)
-
-    if not unique_spawn_ids:
-        return JSONResponse(status_code=400, content={"message": f"Cannot delete the last spawn point with ID {spawn_id}"})
-
-    user_collection.update_many(
-        {"spawn_id": spawn_id},
-        {"$set": {"spawn_id": random.choice(unique_spawn_ids), "chose_spawn_already": False}}
-    )    
-
-    spawn_collection.delete_one({"id": spawn_id})
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from backend.app.utils.outposts_utils import SpawnPoint, FetchSpawnPoint, DeleteSpawnPoint
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.geo_utils import route_level_for_zoom
+from backend.app.utils.polyline_utils import route_points, encode_google_polyline
+from backend.app.utils.catalog_cache_utils import get_spawn_points, get_spawn_point, spawn_points_cache
+from typing import Optional
+
+import os, json, random, datetime
+
+router = APIRouter(
+    prefix="/outposts",
+    tags=["Outposts"]
+)
+
+# List all outposts
+@router.get("/")
+async def list_outposts():
+    return {"outposts": ["Siberian Frontier", "Indian Bazar", "Arab Souk"]}
+
+@router.get("/route_coordinates")
+async def route_coordinates(zoom: Optional[int] = None, encoding: str = "json"):
+    """Route polylines for the map. Pass the map zoom to get a simplified level of detail (fewer points), leave it out for full routes.
+    encoding="polyline" returns every route as a Google encoded polyline string ("polyline") instead of a "route" array of points."""
+    if encoding not in ("json", "polyline"):
+        return JSONResponse(status_code=400, content={"message": "encoding must be json or polyline"})
+
+    database_name = "transports"
+    collection_name = "routes"
+
+    db = mongo_client[database_name]
+    collection = db[collection_name]
+
+    level = route_level_for_zoom(zoom)
+    if level is None:
+        routes = await collection.find({}, {"_id": 0, "route_levels": 0}).to_list()
+    else:
+        #Level is picked on the server, so only the simplified points leave MongoDB. Routes without levels fall back to the full route.
+        cursor = await collection.aggregate([
+            {"$set": {
+                "route": {"$ifNull": [f"$route_levels.{level}.route", "$route"]},
+                "tolerance_m": {"$ifNull": [f"$route_levels.{level}.tolerance_m", 0]},
+                #The packed full route is only needed when there is no level to serve
+                "route_bin": {"$cond": [{"$ifNull": [f"$route_levels.{level}.route", False]}, "$$REMOVE", "$route_bin"]}
+            }},
+            {"$project": {"_id": 0, "route_levels": 0}}
+        ])
+        routes = await cursor.to_list()
+
+    for route in routes:
+        #Routes stored packed (see polyline_utils) are decoded here, clients always get plain points or a polyline string
+        points = route["route"] if route.get("route") is not None else route_points(route).tolist()
+        route.pop("route_bin", None)
+        route.pop("route_encoding", None)
+        if encoding == "polyline":
+            route.pop("route", None)
+            route["polyline"] = encode_google_polyline(points)
+        else:
+            route["route"] = points
+
+    return JSONResponse(status_code=200, content=routes)
+
+# Get details of a specific outpost
+@router.get("/{outpost_id}")
+async def get_outpost(outpost_id: int):
+    return {"outpost_id": outpost_id, "name": "Sample Outpost", "language": "Russian"}
+
+
+@router.post("/add_spawn_point")
+# async def add_spawn_point(spawn_point: dict, admin_password: str):
+async def add_spawn_point(spawn_point: SpawnPoint, admin_password: str):
+    real_admin_password = os.getenv("ADMIN_PASSWORD")
+    if admin_password != real_admin_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can add spawn points"})
+    
+    db = mongo_client["outposts"]
+    collection = db["spawn_points"]
+
+    spawn_point = spawn_point.model_dump()
+    # Check if spawn point already exists
+    existing_spawn_point = await collection.find_one({"id": spawn_point["id"]})
+    if existing_spawn_point:
+        return JSONResponse(status_code=400, content={"message": "Spawn point already exists, update it using /update_spawn_point"})
+    
+    await collection.insert_one(spawn_point)
+    spawn_points_cache.invalidate()
+    return JSONResponse(status_code=200, content={"message": "Spawn point added"})
+
+@router.post("/update_spawn_point")
+async def update_spawn_point(spawn_id:str, spawn_point:dict, admin_password: str):
+    real_admin_password = os.getenv("ADMIN_PASSWORD")
+    if admin_password != real_admin_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can update spawn points"})
+    
+    db = mongo_client["outposts"]
+    collection = db["spawn_points"]
+
+    # Check if spawn point exists
+    existing_spawn_point = await collection.find_one({"id": spawn_id})
+    if not existing_spawn_point:
+        return JSONResponse(status_code=404, content={"message": "Spawn point not found"})
+    
+    await collection.update_one({"id": spawn_id}, {"$set": spawn_point})
+    spawn_points_cache.invalidate()
+    return JSONResponse(status_code=200, content={"message": "Spawn point updated"})
+
+@router.post("/fetch_spawn_points")
+async def fetch_spawn_points():
+    print("Inside /outposts/fetch_spawn_points")
+    #Metadata only (no goods arrays or trade routes), from the catalog cache
+    spawn_points = await get_spawn_points()
+
+    # No need to use json.dumps(), FastAPI handles serialization automatically
+    return JSONResponse(status_code=200, content=spawn_points)
+
+@router.post("/choose_spawn_point")
+async def choose_spawn_point(data: FetchSpawnPoint):
+    print("Inside /outposts/choose_spawn_point")
+    username = data.username
+    spawn_id = data.spawn_id
+    try:
+        db_user = mongo_client["users"]
+        user_collection = db_user["metaverse_users"]
+
+        # Check if spawn point exists
+        existing_spawn_point = await get_spawn_point(spawn_id)
+        if not existing_spawn_point:
+            return JSONResponse(status_code=404, content={"message": "Spawn point not found"})
+        
+        # Check if user exists
+        existing_user = await user_collection.find_one({"username": username})
+        if not existing_user:
+            return JSONResponse(status_code=404, content={"message": "User not found"})
+
+        # Check if user has already chosen a spawn point
+        if existing_user.get("chose_spawn_already"):
+            return JSONResponse(status_code=400, content={"message": "User has already chosen a spawn point. Use transports to move to the chosen spawn point."})
+
+        bonus_amount = existing_spawn_point.get("gold_bonus", 0)
+        time = datetime.datetime.now()
+        await user_collection.update_one({"username": username}, {"$set": {"spawn_outpost_id": spawn_id, "current_outpost_id": spawn_id,"chose_spawn_already": True, "money": bonus_amount, "merchandise_weight": 0,"updated_at": time}})
+
+        return JSONResponse(status_code=200, content={"message": "Spawn point chosen"})
+    
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": str(e)})
+
+@router.post("/delete_spawn_point")
+async def delete_spawn_point(request: DeleteSpawnPoint):
+    real_admin_password = os.getenv("ADMIN_PASSWORD")
+    if request.admin_password != real_admin_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can delete spawn points"})
+    
+    spawn_id = request.spawn_id
+
+    db_user = mongo_client["users"]
+    db_outpost = mongo_client["outposts"]
+    user_collection = db_user["metaverse_users"]
+    spawn_collection = db_outpost["spawn_points"]
+
+    # Check if spawn point exists
+    unique_spawn_ids = await spawn_collection.distinct("id")
+
+    if not unique_spawn_ids:
+        return JSONResponse(status_code=404, content={"message": "No spawn points found"})
+    if spawn_id not in unique_spawn_ids:
+        return JSONResponse(status_code=404, content={"message": f"Spawn point with ID {spawn_id} not found"})
+    
+    unique_spawn_ids.remove(spawn_id)
+
+    if not unique_spawn_ids:
+        return JSONResponse(status_code=400, content={"message": f"Cannot delete the last spawn point with ID {spawn_id}"})
+
+    await user_collection.update_many(
+        {"spawn_id": spawn_id},
+        {"$set": {"spawn_id": random.choice(unique_spawn_ids), "chose_spawn_already": False}}
+    )    
+
+    await spawn_collection.delete_one({"id": spawn_id})
+    spawn_points_cache.invalidate()
     return JSONResponse(status_code=200, content={"message": "Spawn point deleted"})
\ No newline at end of file
@@ -1,266 +1,407 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
-
-from backend.app.utils.mongo_utils import mongo_client
-from backend.app.utils.transports_utils import weight_unit_conversion_table
-
-import datetime, uuid
-router = APIRouter(
-    prefix="/trades",
-    tags=["Trades"]
-)
-
-# List all trades
-@router.get("/")
-async def list_trades():
-    return {"trades": ["Trade 1", "Trade 2"]}
-
-# Create a trade
-@router.post("/")
-async def create_trade(trade: dict):
-    return {"message": "Trade created in backend.app.router.trades", "trade": trade}
-
-@router.get("/fetch/{outpost}")
-async def fetch_goods(outpost: str):
-    db = mongo_client["outposts"]
-    collection = db["goods"]
-
-    goods = list(collection.find({"outpost_id": outpost}))
-    
-    if not goods:
-        return JSONResponse(status_code=404, content={"message":"No goods found for this outpost"})
-    
-    return JSONResponse(status_code=200, content={"outpost": outpost, "goods": str(goods)})
-
-
-@router.post("/purchase_goods", operation_id="purchase_goods") #Tested
-async def purchase_goods(username:str, good_id: str, quantity: int, outpost_id: str):
-    #First we check through all the conditions that might generate errors, then we do the transaction
-    """
-    Deducts good's quantity from outposts/goods (field "quantity") and outposts/spawn_points ("goods_available"), 
-    Increases good's quantity in player's inventory ("inventory").
-    Deducts money from player's money
-    Adds trade ID in trades/purchases collection
-
-    Parameters:
-    - good_id: good which needs to be purchased
-    - username: Player who will purchase
-    - quantity: Quantity of good which needs to be purchased
-    - outpost_id: Outpost where the good is available
-
-    Returns:
-    - JSONResponse: A response indicating the success or failure of the operation.
-
-    Notes:
-    - The goods in users inventory is stored as a list. The last purchased quantity will come out as the top item in the inventory list, acts as a cache.
-    """
-
-    outpost_db = mongo_client["outposts"]
-    goods_collection = outpost_db["goods"]
-    outposts_collection = outpost_db["spawn_points"]
-
-    outpost = outposts_collection.find_one({"id": outpost_id})
-    if not outpost:
-        return JSONResponse(status_code=404, content={"message": f"Outpost with ID {outpost_id} not found"})
-
-    good = goods_collection.find_one({"name": good_id, "outpost_id": outpost_id})
-    if not good:
-        return JSONResponse(status_code=404, content={"message": f"Good with ID {good_id} not found in outpost {outpost_id}"})
-
-    available_quantity = good["quantity"]
-    good_unit = good["unit"]
-    if quantity > available_quantity:
-        return JSONResponse(status_code=400, content={"message": f"Insufficient quantity of good with ID {good_id} in outpost {outpost_id}"})
-    
-    money_required = quantity * good["price"]
-
-    #Check if the player has enough money
-    users_db = mongo_client["users"]
-    users_collection = users_db["metaverse_users"]
-
-    player = users_collection.find_one({"username": username})
-    if not player:
-        return JSONResponse(status_code=404, content={"message": f"Player with username {username} not found"})
-    if player.get("current_outpost_id") != outpost_id:
-        return JSONResponse(status_code=400, content={"message": f"Player is not in outpost {outpost_id}"})
-    if player.get("money", 0) < money_required:
-        return JSONResponse(status_code=400, content={"message": f"Not enough funds. Required: {money_required}, Available: {player.get('money',0)}"})
-
-    goods_available = outpost.get("goods_available", [])
-
-    updated_good = None
-    for good in goods_available:
-        if good["name"] == good_id:
-            if good["quantity"] < quantity:
-                return JSONResponse(status_code=400, content={"message": f"Insufficient quantity of good '{good_id}' in spawn point {outpost_id}"})
-            good["quantity"] -= quantity
-            updated_good = good
-            break
-
-    if not updated_good:
-        return JSONResponse(status_code=404, content={"message": f"Good '{good_id}' not found in spawn point {outpost_id}"})
-
-    # Reorder the list (move updated good to the top)
-    goods_available = [updated_good] + [good for good in goods_available if good["name"] != good_id]
-
-    # Update the spawn_points collection
-    outposts_collection.update_one(
-        {"id": outpost_id},
-        {"$set": {"goods_available": goods_available}}
-    )
-
-    player_inventory_now = player.get("inventory", {})
-    time_now = datetime.datetime.now()
-    if good_id not in player_inventory_now: #Do not use dict get method here, as it doesn't update anything
-        player_inventory_now[good_id] = {"quantity": 0, "average_price": 0, "updated_at": time_now, "created_at": time_now}
-
-    previous_quantity = player_inventory_now[good_id]["quantity"]
-    previous_average_price = player_inventory_now[good_id]["average_price"]
-
-    new_quantity = previous_quantity + quantity
-    average_price = (previous_quantity * previous_average_price + money_required) / new_quantity
-
-    trade_id = uuid.uuid4().hex
-
-    time = datetime.datetime.now()
-    player_inventory_now[good_id].update({
-    "quantity": new_quantity,
-    "average_price": average_price,
-    "unit": good.get("unit", "kg"),
-    "updated_at": time,
-    "trade_ids": player_inventory_now[good_id].get("trade_ids", []) + [trade_id]
-    }) #Do not use get method, it won't update anything.
-
-    print(good)
-    if good_unit == "kg":
-        merchandise_weight = player.get("merchandise_weight", 0) + quantity
-    else:
-        #Search which item of list weight_unit_conversion_table matches with "name" and "unit" of item
-        entry = None
-        for entry in weight_unit_conversion_table:
-            if good_id == entry["name"] and good_unit == entry["unit"]:
-                merchandise_weight = player.get("merchandise_weight", 0) + quantity * entry["per_unit_mass"]
-                break
-
-    users_collection.update_one(
-        {"username": username},
-        {
-            "$set": {
-                "inventory": player_inventory_now,
-                "money": player.get("money", 0) - money_required,
-                "merchandise_weight": merchandise_weight
-            }
-        }
-    )
-
-    #Update the good quantity in the outpost
-    goods_collection.update_one({"name": good_id, "outpost_id": outpost_id}, {"$set": {"quantity": available_quantity - quantity}})
-
-    trade_database = mongo_client["trades"]
-    trade_collection_name = "purchases"
-
-    if trade_collection_name not in trade_database.list_collection_names():
-        trade_database.create_collection(trade_collection_name)
-    
-    trade_collection = trade_database[trade_collection_name]
-
-    trade_data = {
-        "trade_id": trade_id,
-        "username": username,
-        "good_id": good_id,
-        "quantity": quantity,
-        "outpost_id": outpost_id,
-        "type": "purchase",
-        "price": money_required,
-        "created_at": time_now
-    }
-
-    trade_collection.insert_one(trade_data)
-
-    return JSONResponse(status_code=200, content={"message": f"Successfully bought {quantity} of good with ID {good_id} in outpost {outpost_id}"})
-
-@router.post("/sell_goods", operation_id="sell_goods") #Tested
-async def sell_goods(username:str, good_id: str, quantity: int, outpost_id: str, price: float, unit: str):
-    """
-        Takes username, good_id, quantity, outpost_id, price, unit as input.
-        Deducts quantity from user.inventory
-        Increases quantity at outposts.spawn_points.goods_available
-        Increases quantity at outpost.goods.quantity
-
-        Needs more polishing TODO
-    """
-    ## TODO - Figure out the goddamn price. First user should be able to query about the price he might get, then only sell.
-    ## TODO - Do a separate endpoint for price query from the outpost.
-    if quantity <= 0:
-        return JSONResponse(status_code=400, content={"message": "Quantity must be greater than 0"})
-    outposts_db = mongo_client["outposts"]
-    goods_collection = outposts_db["goods"]
-    outposts_collection = outposts_db["spawn_points"]
-    users_db = mongo_client["users"]
-    users_collection = users_db["metaverse_users"]
-    trade_database = mongo_client["trades"]
-    trade_collection = trade_database["purchases"]
-    
-    user = users_collection.find_one({"username": username, "current_outpost_id": outpost_id})
-
-    if not user:
-        return JSONResponse(status_code=404, content={"message": f"User with username {username} not found at {outpost_id}"})
-    
-    time = datetime.datetime.now()
-    trade_id = uuid.uuid4().hex
-
-    inventory = user.get("inventory", {})
-    if good_id not in inventory:
-        return JSONResponse(status_code=404, content={"message": f"Good with ID {good_id} not found in inventory"})
-    
-    if quantity > inventory[good_id]["quantity"]:
-        return JSONResponse(status_code=400, content={"message": f"Insufficient quantity of good with ID {good_id} in inventory"})
-    
-    goods_result = goods_collection.update_one({"name": good_id, "outpost_id": outpost_id}, {"$inc": {"quantity": quantity}})
-
-    #From the player inventory, deduct the quantity of the good
-    inventory[good_id]["quantity"] -= quantity
-    inventory[good_id]["updated_at"] = time
-    inventory[good_id]["trade_ids"] = inventory[good_id].get("trade_ids", []) + [trade_id]
-    users_collection.update_one({"username": username, "current_outpost_id": outpost_id}, {"$set": {"inventory": inventory}})
-
-    #Update the spawn_points collection
-    result = outposts_collection.update_one(
-        {"id": outpost_id, "goods_available.name": good_id},  # Match document containing the good
-        {
-            "$inc": {"goods_available.$.quantity": quantity},  # Increment quantity if it exists
-            "$set": {"goods_available.$.price": price, "goods_available.$.unit": unit}
-        }
-    )
-
-    # If no document was modified, the good doesn't exist; insert it
-    if result.matched_count == 0:
-        result = outposts_collection.update_one(
-            {"id": outpost_id},  # Match the specific outpost
-            {
-                "$push": {  # Add a new good dictionary to the goods_available array
-                    "goods_available": {
-                        "name": good_id,
-                        "price": price,
-                        "quantity": quantity,
-                        "unit": unit
-                    }
-                }
-            }
-        )
-
-    trade_entry = {
-        "trade_id": trade_id,
-        "username": username,
-        "good_id": good_id,
-        "quantity": quantity,
-        "outpost_id": outpost_id,
-        "type": "sell",
-        "price": price,
-        "created_at": time
-    }
-
-    trade_collection.insert_one(trade_entry)
-    
-    return JSONResponse(status_code=200, content={"message": f"Successfully sold {quantity} of good with ID {good_id} in outpost {outpost_id}"})
-
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from typing import List, Optional
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.transports_utils import calculate_good_weight
+from backend.app.utils.trade_ledger_utils import trade_ledger
+from backend.app.utils.quote_utils import price_tables, create_quote_token, verify_quote_token, use_quote_token, release_quote_token, QUOTE_TOKEN_SECONDS
+from backend.app.utils.order_book_utils import order_books, settlement_updates, refund_updates, ORDER_SIDES
+from backend.app.utils.trade_history_utils import trade_history, get_rollup, rebuild_rollups, HISTORY_PAGE_SIZE
+from backend.app.utils.candles_utils import get_candles, backfill_candles, CANDLE_INTERVALS, CANDLE_MAX_POINTS
+from backend.app.utils.arbitrage_utils import find_arbitrage, weight_bucket
+from backend.app.utils.inventory_utils import inventory_collection, add_to_inventory, take_from_inventory, inventory_filter
+from backend.app.utils.response_utils import BSONResponse, NDJSONResponse, projection_from_fields
+
+import asyncio, datetime, os, uuid
+router = APIRouter(
+    prefix="/trades",
+    tags=["Trades"]
+)
+
+# List all trades
+@router.get("/")
+async def list_trades(username: Optional[str] = None, outpost_id: Optional[str] = None, good_id: Optional[str] = None,
+                      since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                      cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE):
+    """
+    Trade history, newest first, filtered by any of username, outpost_id, good_id and a created_at range [since, until).
+    Pass the returned next_cursor to get the next page, it is None on the last one.
+    """
+    try:
+        trades, next_cursor = await trade_history({"username": username, "outpost_id": outpost_id, "good_id": good_id}, since, until, cursor, limit)
+    except (ValueError, KeyError):
+        return JSONResponse(status_code=400, content={"message": "Invalid cursor"})
+
+    for trade in trades:
+        trade.pop("_id", None)
+    return BSONResponse(status_code=200, content={"trades": trades, "next_cursor": next_cursor})
+
+@router.get("/arbitrage")
+async def arbitrage(user_id: str, k: int = 10, max_quantity: int = 100):
+    """
+    Top k trades for the player: buy a good at one outpost, carry it along the shortest path, sell it at another.
+    Profit is (bid at destination - ask at source) * quantity - transport cost for the player's merchandise_weight (cheapest method).
+    """
+    if k <= 0 or max_quantity <= 0:
+        return JSONResponse(status_code=400, content={"message": "k and max_quantity must be greater than 0"})
+    user = await mongo_client["users"]["metaverse_users"].find_one({"username": user_id}, {"_id": 0, "merchandise_weight": 1})
+    if not user:
+        return JSONResponse(status_code=404, content={"message": f"User {user_id} not found"})
+
+    opportunities = await find_arbitrage(user.get("merchandise_weight", 0), min(k, 100), max_quantity)
+    return JSONResponse(status_code=200, content={"weight_bucket": weight_bucket(user.get("merchandise_weight", 0)), "opportunities": opportunities})
+
+@router.get("/candles/{outpost_id}/{good_id}")
+async def candles(outpost_id: str, good_id: str, interval: str = "1h", since: Optional[datetime.datetime] = None,
+                  until: Optional[datetime.datetime] = None, limit: int = CANDLE_MAX_POINTS):
+    """
+    OHLCV candles of a good at an outpost, oldest first, as columns t (bucket start, epoch seconds), o, h, l, c, v.
+    since/until without a timezone are UTC, buckets are UTC minutes, hours and days.
+    """
+    if interval not in CANDLE_INTERVALS:
+        return JSONResponse(status_code=400, content={"message": f"interval must be one of {tuple(CANDLE_INTERVALS)}"})
+    columns = await get_candles(outpost_id, good_id, interval, since, until, limit)
+    return JSONResponse(status_code=200, content={"outpost_id": outpost_id, "good_id": good_id, "interval": interval, **columns})
+
+@router.post("/candles/backfill") #Admin only
+async def backfill_trade_candles(admin_password: str, since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None):
+    """Rebuilds the candles of a time range (everything by default) from the trade ledgers."""
+    if admin_password != os.getenv("ADMIN_PASSWORD"):
+        return JSONResponse(status_code=403, content={"message": "Only admins can backfill candles"})
+    await backfill_candles(since, until)
+    return JSONResponse(status_code=200, content={"message": "Candles backfilled"})
+
+@router.get("/rollups/user/{username}")
+async def user_rollup(username: str):
+    """Precomputed totals of a player: trade counts, volumes, quantities and realized P&L."""
+    return await _rollup_response("user_rollups", username)
+
+@router.get("/rollups/outpost/{outpost_id}")
+async def outpost_rollup(outpost_id: str):
+    """Precomputed totals of the trades made at an outpost."""
+    return await _rollup_response("outpost_rollups", outpost_id)
+
+async def _rollup_response(collection_name: str, key: str):
+    rollup = await get_rollup(collection_name, key)
+    if not rollup:
+        return JSONResponse(status_code=404, content={"message": f"No trades found for {key}"})
+    for field in ("first_trade_at", "last_trade_at"):
+        if isinstance(rollup.get(field), datetime.datetime):
+            rollup[field] = rollup[field].isoformat()
+    return JSONResponse(status_code=200, content=rollup)
+
+@router.post("/rollups/rebuild") #Admin only
+async def rebuild_trade_rollups(admin_password: str):
+    """Recomputes the user and outpost rollups from the whole ledger."""
+    if admin_password != os.getenv("ADMIN_PASSWORD"):
+        return JSONResponse(status_code=403, content={"message": "Only admins can rebuild rollups"})
+    await rebuild_rollups()
+    return JSONResponse(status_code=200, content={"message": "Rollups rebuilt"})
+
+# Create a trade
+@router.post("/")
+async def create_trade(trade: dict):
+    return {"message": "Trade created in backend.app.router.trades", "trade": trade}
+
+@router.get("/fetch/{outpost}")
+async def fetch_goods(outpost: str, fields: Optional[str] = None, stream: bool = False):
+    db = mongo_client["outposts"]
+    collection = db["goods"]
+
+    projection = projection_from_fields(fields)
+    if stream:
+        return NDJSONResponse(collection.find({"outpost_id": outpost}, projection))
+
+    goods = await collection.find({"outpost_id": outpost}, projection).to_list()
+    
+    if not goods:
+        return JSONResponse(status_code=404, content={"message":"No goods found for this outpost"})
+    
+    return BSONResponse(status_code=200, content={"outpost": outpost, "goods": goods})
+
+
+@router.post("/purchase_goods", operation_id="purchase_goods") #Tested
+async def purchase_goods(username:str, good_id: str, quantity: int, outpost_id: str):
+    """
+    Deducts good's quantity from outposts/goods (field "quantity", the only copy of the stock, see stock_utils)
+    Increases good's quantity in player's inventory (users/inventory row of the good).
+    Deducts money from player's money
+    Queues the trade record for trades/purchases (written in batches by the trade ledger)
+
+    Parameters:
+    - good_id: good which needs to be purchased
+    - username: Player who will purchase
+    - quantity: Quantity of good which needs to be purchased
+    - outpost_id: Outpost where the good is available
+
+    Returns:
+    - JSONResponse: A response indicating the success or failure of the operation.
+
+    Notes:
+    - No read-then-write. Stock and money are taken with guarded updates ("quantity" >= asked, "money" >= required), so two buyers can never oversell the same stock.
+    - Happy path is 3 round trips: take stock, charge player, inventory. The trade record never waits on MongoDB.
+    - If charging the player fails, the taken stock is given back. Extra reads only happen on the failure path, to build the error message.
+    """
+    if quantity <= 0:
+        return JSONResponse(status_code=400, content={"message": "Quantity must be greater than 0"})
+
+    outpost_db = mongo_client["outposts"]
+    goods_collection = outpost_db["goods"]
+    users_collection = mongo_client["users"]["metaverse_users"]
+
+    time_now = datetime.datetime.now()
+
+    #Round trip 1 - take the stock, only if enough of it is there. Returns price and unit for the next step.
+    good = await goods_collection.find_one_and_update(
+        {"name": good_id, "outpost_id": outpost_id, "quantity": {"$gte": quantity}},
+        {"$inc": {"quantity": -quantity}, "$set": {"last_updated": time_now}},
+        projection={"_id": 0, "price": 1, "unit": 1}
+    )
+    if not good:
+        if not await goods_collection.find_one({"name": good_id, "outpost_id": outpost_id}, {"_id": 1}):
+            return JSONResponse(status_code=404, content={"message": f"Good with ID {good_id} not found in outpost {outpost_id}"})
+        return JSONResponse(status_code=400, content={"message": f"Insufficient quantity of good with ID {good_id} in outpost {outpost_id}"})
+
+    good_unit = good.get("unit", "kg")
+    money_required = quantity * good["price"]
+    merchandise_weight = calculate_good_weight(good_id, good_unit, quantity)
+    trade_id = uuid.uuid4().hex
+
+    #Round trip 2 - charge the player, guarded on location and money
+    player_result = await users_collection.update_one(
+        {"username": username, "current_outpost_id": outpost_id, "money": {"$gte": money_required}},
+        {"$inc": {"money": -money_required, "merchandise_weight": merchandise_weight}, "$set": {"updated_at": time_now}}
+    )
+
+    if player_result.matched_count == 0:
+        #Give the stock back, then figure out why the player could not pay
+        await goods_collection.update_one({"name": good_id, "outpost_id": outpost_id}, {"$inc": {"quantity": quantity}})
+
+        player = await users_collection.find_one({"username": username}, {"_id": 0, "current_outpost_id": 1, "money": 1})
+        if not player:
+            return JSONResponse(status_code=404, content={"message": f"Player with username {username} not found"})
+        if player.get("current_outpost_id") != outpost_id:
+            return JSONResponse(status_code=400, content={"message": f"Player is not in outpost {outpost_id}"})
+        return JSONResponse(status_code=400, content={"message": f"Not enough funds. Required: {money_required}, Available: {player.get('money',0)}"})
+
+    trade_data = {
+        "trade_id": trade_id,
+        "username": username,
+        "good_id": good_id,
+        "quantity": quantity,
+        "outpost_id": outpost_id,
+        "type": "purchase",
+        "price": money_required,
+        "unit_price": good["price"],
+        "created_at": time_now
+    }
+
+    #Round trip 3 - the player's inventory row. The trade record goes to the write-behind ledger.
+    await inventory_collection().bulk_write([add_to_inventory(username, good_id, quantity, money_required, good_unit, trade_id, time_now)])
+    trade_ledger.record(trade_data)
+    price_tables.invalidate(outpost_id)
+
+    return JSONResponse(status_code=200, content={"message": f"Successfully bought {quantity} of good with ID {good_id} in outpost {outpost_id}"})
+
+@router.get("/quote", operation_id="quote_goods")
+async def quote_goods(username: str, outpost_id: str, goods: Optional[List[str]] = Query(None)):
+    """
+    Bid (what the outpost pays when you sell) and ask (what you pay when you buy) for the given goods at an outpost, all of its goods if none are given.
+    Every quoted good has a quote_token to pass to /trades/sell_goods, valid for QUOTE_TOKEN_SECONDS.
+    Served from the cached price table of the outpost.
+    """
+    table = await price_tables.get(outpost_id)
+    if not table:
+        return JSONResponse(status_code=404, content={"message": f"No goods found for outpost {outpost_id}"})
+
+    quotes = {}
+    for good_id in goods or list(table):
+        entry = table.get(good_id)
+        quotes[good_id] = None if entry is None else {**entry, "quote_token": create_quote_token(username, outpost_id, good_id, entry)}
+
+    return JSONResponse(status_code=200, content={"outpost_id": outpost_id, "valid_for_seconds": QUOTE_TOKEN_SECONDS, "quotes": quotes})
+
+@router.post("/sell_goods", operation_id="sell_goods") #Tested
+async def sell_goods(username:str, good_id: str, quantity: int, outpost_id: str, quote_token: str):
+    """
+    Sells goods from the player's inventory to the outpost at the bid of a quote from /trades/quote.
+
+    Deducts quantity from the player's inventory and pays bid * quantity to the player
+    Increases quantity at outposts.goods.quantity (creating the good if the outpost no longer has it)
+    Queues the trade record for trades/purchases
+
+    Notes:
+    - The price comes from the signed quote token, so it needs no read to validate. A token is good for one sale.
+    - Only the inventory row of the good is touched, with a guarded $inc ("quantity" >= sold).
+    """
+    if quantity <= 0:
+        return JSONResponse(status_code=400, content={"message": "Quantity must be greater than 0"})
+
+    quote = verify_quote_token(quote_token, username, outpost_id, good_id)
+    if quote is None:
+        return JSONResponse(status_code=400, content={"message": "Quote token is invalid or expired, get a new one from /trades/quote"})
+    if not await use_quote_token(quote):
+        return JSONResponse(status_code=400, content={"message": "Quote token was already used, get a new one from /trades/quote"})
+
+    outposts_db = mongo_client["outposts"]
+    goods_collection = outposts_db["goods"]
+    users_collection = mongo_client["users"]["metaverse_users"]
+
+    time_now = datetime.datetime.now()
+    trade_id = uuid.uuid4().hex
+    unit = quote["unit"]
+    money_received = round(quote["bid"] * quantity, 2)
+
+    #Take the goods, only if the player has enough of them
+    #Returns the average purchase price of the goods too, for the realized P&L of the sale
+    inventory_row = await inventory_collection().find_one_and_update(
+        inventory_filter(username, good_id, quantity), take_from_inventory(quantity, trade_id, time_now), projection={"_id": 0, "average_price": 1}
+    )
+    if not inventory_row:
+        await release_quote_token(quote)
+        return JSONResponse(status_code=400, content={"message": f"User {username} has less than {quantity} of {good_id} in inventory"})
+
+    #Pay the player, only if at the outpost. Otherwise the goods go back.
+    player_result = await users_collection.update_one(
+        {"username": username, "current_outpost_id": outpost_id},
+        {"$inc": {"money": money_received, "merchandise_weight": -calculate_good_weight(good_id, unit, quantity)}, "$set": {"updated_at": time_now}}
+    )
+    if player_result.matched_count == 0:
+        await asyncio.gather(
+            inventory_collection().update_one({"username": username, "good_id": good_id}, {"$inc": {"quantity": quantity}}),
+            release_quote_token(quote)
+        )
+        return JSONResponse(status_code=404, content={"message": f"User with username {username} not found at {outpost_id}"})
+
+    # If the good doesn't exist at the outpost any more, it is created at the quoted ask
+    await goods_collection.update_one(
+        {"name": good_id, "outpost_id": outpost_id},
+        {"$inc": {"quantity": quantity}, "$set": {"last_updated": time_now}, "$setOnInsert": {"type": "good", "price": quote["ask"], "unit": unit}},
+        upsert=True
+    )
+
+    trade_ledger.record({
+        "trade_id": trade_id,
+        "username": username,
+        "good_id": good_id,
+        "quantity": quantity,
+        "outpost_id": outpost_id,
+        "type": "sell",
+        "price": money_received,
+        "unit_price": quote["bid"],
+        "average_price": inventory_row.get("average_price", 0),
+        "realized_pnl": round(money_received - inventory_row.get("average_price", 0) * quantity, 2),
+        "created_at": time_now
+    })
+    price_tables.invalidate(outpost_id)
+
+    return JSONResponse(status_code=200, content={"message": f"Successfully sold {quantity} of good with ID {good_id} in outpost {outpost_id} for {money_received}"})
+
+async def _apply_settlement(user_updates, inventory_updates):
+    writes = []
+    if user_updates:
+        writes.append(mongo_client["users"]["metaverse_users"].bulk_write(user_updates, ordered=False))
+    if inventory_updates:
+        writes.append(inventory_collection().bulk_write(inventory_updates, ordered=False))
+    await asyncio.gather(*writes)
+
+def _order_content(order):
+    return {key: value.isoformat() if isinstance(value, datetime.datetime) else value for key, value in order.items()}
+
+def _order_books_unavailable():
+    #Only the worker holding the order_books lease has the books (see order_book_utils)
+    return JSONResponse(status_code=503, content={"message": "Order books are served by another worker, try again"})
+
+@router.post("/orders", operation_id="place_order")
+async def place_order(username: str, outpost_id: str, good_id: str, side: str, price: float, quantity: int):
+    """
+    Limit order on the (outpost_id, good_id) order book. Matches at once against resting orders (best price, then oldest first),
+    what is left rests in the book until it is filled or cancelled.
+
+    The order is paid for when it is placed: a buy order escrows price * quantity of money, a sell order escrows the goods
+    from the inventory. Fills pay out from the escrow, see order_book_utils.settlement_updates. Fills are logged in trades.fills,
+    not in the trade history.
+    """
+    if not order_books.serving():
+        return _order_books_unavailable()
+    if side not in ORDER_SIDES:
+        return JSONResponse(status_code=400, content={"message": f"side must be one of {ORDER_SIDES}"})
+    if quantity <= 0 or price <= 0:
+        return JSONResponse(status_code=400, content={"message": "Quantity and price must be greater than 0"})
+
+    users_collection = mongo_client["users"]["metaverse_users"]
+    goods_collection = mongo_client["outposts"]["goods"]
+    time_now = datetime.datetime.now()
+
+    if side == "buy":
+        good, escrow = await asyncio.gather(
+            goods_collection.find_one({"name": good_id, "outpost_id": outpost_id}, {"_id": 0, "unit": 1}),
+            users_collection.update_one(
+                {"username": username, "current_outpost_id": outpost_id, "money": {"$gte": price * quantity}},
+                {"$inc": {"money": -price * quantity}}
+            )
+        )
+        if escrow.matched_count == 0:
+            return JSONResponse(status_code=400, content={"message": f"Player {username} is not in outpost {outpost_id} or can't pay {price * quantity}"})
+        if not good:
+            await users_collection.update_one({"username": username}, {"$inc": {"money": price * quantity}})
+            return JSONResponse(status_code=404, content={"message": f"Good with ID {good_id} is not traded in outpost {outpost_id}"})
+        unit = good.get("unit", "kg")
+    else:
+        row = await inventory_collection().find_one_and_update(
+            inventory_filter(username, good_id, quantity), take_from_inventory(quantity, None, time_now), projection={"_id": 0, "unit": 1}
+        )
+        if not row:
+            return JSONResponse(status_code=400, content={"message": f"Player {username} has less than {quantity} of {good_id}"})
+        unit = row.get("unit", "kg")
+        escrow = await users_collection.update_one(
+            {"username": username, "current_outpost_id": outpost_id}, {"$inc": {"merchandise_weight": -calculate_good_weight(good_id, unit, quantity)}}
+        )
+        if escrow.matched_count == 0:
+            await inventory_collection().update_one({"username": username, "good_id": good_id}, {"$inc": {"quantity": quantity}})
+            return JSONResponse(status_code=400, content={"message": f"Player {username} is not in outpost {outpost_id}"})
+
+    order = order_books.new_order(username, side, price, quantity, unit, time_now)
+    fills = order_books.submit(outpost_id, good_id, order, time_now)
+    if fills:
+        await _apply_settlement(*settlement_updates(fills, time_now))
+    #The order's escrow is taken, its book is saved before answering (see order_book_utils)
+    await order_books.save_snapshots()
+
+    return JSONResponse(status_code=200, content={
+        "order": _order_content(order.to_dict()),
+        "fills": [_order_content({key: fill[key] for key in ("trade_id", "price", "quantity", "buyer", "seller", "created_at")}) for fill in fills]
+    })
+
+@router.delete("/orders/{order_id}", operation_id="cancel_order")
+async def cancel_order(order_id: str, username: str, outpost_id: str, good_id: str):
+    """Cancels the unfilled part of a resting order and gives its escrow back."""
+    if not order_books.serving():
+        return _order_books_unavailable()
+    book = order_books.books.get((outpost_id, good_id))
+    order = book.orders.get(order_id) if book else None
+    if order is None or order.username != username:
+        return JSONResponse(status_code=404, content={"message": f"No open order {order_id} of {username} on {good_id} in outpost {outpost_id}"})
+
+    order_books.cancel(outpost_id, good_id, order_id)
+    await _apply_settlement(*refund_updates(good_id, order, datetime.datetime.now()))
+    await order_books.save_snapshots()
+    return JSONResponse(status_code=200, content={"message": f"Order {order_id} cancelled", "order": _order_content(order.to_dict())})
+
+@router.get("/order_book/{outpost_id}/{good_id}")
+async def get_order_book(outpost_id: str, good_id: str, levels: int = 10):
+    """Best bid/ask and aggregated depth of an order book."""
+    if not order_books.serving():
+        return _order_books_unavailable()
+    book = order_books.books.get((outpost_id, good_id))
+    if book is None:
+        return JSONResponse(status_code=200, content={"outpost_id": outpost_id, "good_id": good_id, "best_bid": None, "best_ask": None, "bids": [], "asks": []})
+    best_bid, best_ask = book.best_bid(), book.best_ask()
+    return JSONResponse(status_code=200, content={
+        "outpost_id": outpost_id,
+        "good_id": good_id,
+        "best_bid": best_bid.price if best_bid else None,
+        "best_ask": best_ask.price if best_ask else None,
+        **book.depth(levels)
+    })
@@ -1,448 +1,499 @@
-from fastapi import APIRouter, Header, UploadFile, File, Form
-from backend.app.utils.mongo_utils import mongo_client
-from backend.app.utils.transports_utils import weight_unit_conversion_table, direct_distance_calculator, Transport, calculate_transport_cost
-from fastapi.responses import JSONResponse
-import gpxpy
-from geopy.distance import geodesic
-import os
-import pandas as pd
-
-router = APIRouter(
-    prefix="/transports",
-    tags=["Transports"]
-)
-
-@router.post("/add_transport_method") #Admin only
-async def add_edit_transport_method(transport: Transport, admin_password: str = Header(None)): #Last tested, 13/02/2025
-    actual_password = os.getenv("ADMIN_PASSWORD")
-
-    if admin_password != actual_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can add/edit transport methods. Go away."})
-    
-    database_name = "transports"
-    collection_name = "transport_methods"
-
-    transport_type = transport.name
-    is_it_an_edit = transport.edit
-
-    db = mongo_client[database_name]
-    if collection_name not in db.list_collection_names():
-        db.create_collection(collection_name)
-
-
-    collection = db[collection_name]
-    exists = collection.find_one({"name": transport_type})
-
-    if is_it_an_edit:
-        if not exists:
-            return JSONResponse(status_code=400, content={"message": "Transport method does not exist."})
-
-        update_fields = {k: v for k, v in transport.model_dump().items() if v is not None}
-
-        if update_fields:
-            collection.update_one({"name": transport_type}, {"$set": update_fields})
-            return JSONResponse(status_code=200, content={"message": f"Transport method {transport_type} updated successfully"})
-        else:
-            return JSONResponse(status_code=400, content={"message": "No fields to update"})
-
-    else:
-        if exists:
-            return JSONResponse(status_code=400, content={"message": "Transport method already exists. Use edit flag to update"})
-        collection.insert_one(transport.model_dump())
-        return JSONResponse(status_code=200, content={"message": f"Transport method {transport_type} added successfully"})
-
-@router.delete("/delete_transport_method") #Admin only
-async def delete_transport_method(transport_type: str, admin_password: str = Header(None)): #Last tested, 13/02/2025
-    "Deletes a transport method upon the request of an admin"
-    actual_password = os.getenv("ADMIN_PASSWORD")
-
-    if admin_password != actual_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can delete transport methods. Go away."})
-    
-    database_name = "transports"
-    collection_name = "transport_methods"
-
-    if collection_name not in mongo_client[database_name].list_collection_names():
-        return JSONResponse(status_code=404, content={"message": f"Collection {collection_name} not found in database {database_name}"})
-    
-    collection = mongo_client[database_name][collection_name]
-    exists = collection.find_one({"name": transport_type})
-
-    if not exists:
-        return JSONResponse(status_code=404, content={"message": f"Transport method {transport_type} not found. Ensure spell check."})
-
-    collection.delete_one({"name": transport_type})
-    return JSONResponse(status_code=200, content={"message": f"Transport method {transport_type} deleted successfully"})
-    
-@router.get("/weight_converter_sanity_check")
-async def weight_converter_sanity_check():
-    """This function checks if every good is either measured in KG or their unit has a conversion formula to KG."""
-    db = mongo_client["outposts"]
-    collection = db["goods"]
-
-    # Convert weight_unit_conversion_table into a set for O(1) lookup
-    conversion_set = {(entry["name"], entry["unit"]) for entry in weight_unit_conversion_table}
-
-    goods = collection.find({}, {"name": 1, "unit": 1})  # Fetch only required fields
-
-    errors = []
-    
-    for good in goods:
-        name, unit = good.get("name"), good.get("unit")
-
-        # Direct kg check
-        if unit == "kg":
-            continue
-
-        # Check if the name and unit exist in the conversion table
-        if (name, unit) not in conversion_set:
-            errors.append(f"Missing conversion for {name} ({unit})")
-
-    if errors:
-        return JSONResponse(
-            status_code=500,
-            content={"message": "Weight converter issues found", "errors": errors}
-        )
-
-    return JSONResponse(status_code=200, content={"message": "Weight converter is working fine"})
-
-
-
-# List all transport options
-@router.get("/")
-async def list_transport(): #Last tested. 13/02/2025
-    """Lists all transport methods available along with their details"""
-    database_name = "transports"
-    collection_name = "transport_methods"
-
-    if collection_name not in mongo_client[database_name].list_collection_names():
-        return JSONResponse(status_code=404, content={"message": f"Collection {collection_name} not found in database {database_name}"})
-    
-    collection = mongo_client[database_name][collection_name]
-
-    transports = list(collection.find({}, {"_id": 0}))
-    if not transports:
-        return JSONResponse(status_code=404, content={"message": "No transport methods found"})
-    
-    return JSONResponse(status_code=200, content={"transports": transports})
-
-@router.get("/transport_profile") #Tested. 12/02/2025 (Pre-pre-valentine's day)
-async def transport_profile(user_id: str):
-    result = {}
-    database_name = "users"
-    collection_name = "metaverse_users"
-
-    db = mongo_client[database_name]
-    if collection_name not in db.list_collection_names():
-        return JSONResponse(status_code=404, content={"message": "{collection_name} Collection not found"})
-
-    collection = db[collection_name]
-    user = collection.find_one({"username": user_id})
-
-    if not user:
-        return JSONResponse(status_code=200, content={"message": "User {user_id} not found"})
-    
-    #Weight calculation
-    # result["weight"] = user["merchandise_weight"]
-
-    #Distance calculation
-    current_outpost = user["current_outpost_id"]
-    # print(current_outpost)
-    if current_outpost is None:
-        return JSONResponse(status_code=200, content={"message": "User {user_id} has no current outpost. Choose spawn point."})
-    
-    database_name = "transports"
-    collection_name = "transport_methods"
-
-    transport_collection = mongo_client[database_name][collection_name]
-    transport_methods = list(transport_collection.find({}, {"_id": 0}))
-
-    # database_name = "outposts"
-    # collection_name = "spawn_points"
-
-    # db = mongo_client[database_name]
-    # outpost_collection = db["spawn_points"]
-    # print("Total spawn points", outpost_collection.count_documents({}))
-
-    # routes = outpost_collection.find_one({"id": current_outpost}, {"trade_routes": 1, "latitude": 1, "longitude": 1})
-    # # print(routes)
-    # if not routes or "trade_routes" not in routes:
-    #     return JSONResponse(status_code=200, content={"message": "No trade routes found for current outpost. You are stranded."})
-
-    # trade_routes = routes["trade_routes"]
-    # current_coords = (routes["latitude"], routes["longitude"])
-    # # print(current_coords)
-    # # print(trade_routes)
-    # connected_outposts = list(
-    #     outpost_collection.find(
-    #         {"id": {"$in": trade_routes}}, 
-    #         {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}
-    #     )
-    # )
-    # routes = [
-    #         {**outpost, "distance": direct_distance_calculator(current_coords, (outpost["latitude"], outpost["longitude"]))}
-    #         for outpost in connected_outposts
-    #     ]
-    result["merchandise_weight"] = user["merchandise_weight"]
-
-    database_name = "transports"
-    collection_name = "routes"
-
-    db = mongo_client[database_name]
-    collection = db[collection_name]
-
-    routes = list(collection.find(
-        {
-            "$or": [
-                {"source_id": current_outpost},
-                {"destination_id": current_outpost}
-            ]
-        },
-        {"_id": 0, "route": 0}
-    ))
-    if not routes:
-        return JSONResponse(status_code=200, content={"message": "No trade routes found for current outpost. You are stranded."})
-    
-    # routes = [route for route in routes if route["destination_id"] in routes]
-    #Invert the items for which the current outpost is the destination
-    for route in routes:
-        if current_outpost == route["destination_id"]:
-            route["source_id"], route["destination_id"] = route["destination_id"], route["source_id"]
-            route["source"], route["destination"] = route["destination"], route["source"]
-            route["source_coords"], route["destination_coords"] = route["destination_coords"], route["source_coords"]
-        route["options"] = calculate_transport_cost(route["distance"], user["merchandise_weight"], transport_methods)
-
-    result["routes"] = routes
-    
-
-    return JSONResponse(status_code=200, content=result)
-
-# Get transport details
-@router.get("/{transport_id}")
-async def get_transport(transport_id: int):
-    return JSONResponse(status_code=200, content={"transport_id": transport_id, "type": "Caravan", "fee": 100})
-
-@router.post("/add_route") #Admin only
-async def add_route(file_path: str, start: str, end: str, admin_password: str = Header(None)):
-    """Add coordinate of routes from one outpost to another. 
-    Input - relative file path of gpx file manually added from google maps
-    Output - list of coordinates for every route in MongoDB
-    Challenge - There is no direct route from Tobolsk to Hanzhou on modern google maps, I had to make two separate roads, one from Tobolsk to Mongolia, and another from Mongolia to Hanzhou."""
-
-    actual_password = os.getenv("ADMIN_PASSWORD")
-
-    if admin_password != actual_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can add routes. Go away."})
-    
-    # if not os.path.isfile(file_path):
-    #     return JSONResponse(status_code=404, content={"message":"File not found"})
-
-    database_name = "transports"
-    collection_name = "routes"
-
-    db = mongo_client[database_name]
-    if collection_name not in db.list_collection_names():
-        db.create_collection(collection_name)
-
-    routes_collection = db[collection_name]
-
-    database_name = "outposts"
-    collection_name = "spawn_points"
-
-    db = mongo_client[database_name]
-    if collection_name not in db.list_collection_names():
-        return JSONResponse(status_code=404, content={"message": "{collection_name} Collection not found"})
-    
-    outpost_collection = db[collection_name]
-    source_doc = outpost_collection.find_one({"name": start})
-    destination_doc = outpost_collection.find_one({"name": end})
-
-    if not source_doc or not destination_doc:
-        return JSONResponse(status_code=404, content={"message": "Source or destination not found"})
-    
-    source_id = source_doc["id"]
-    destination_id = destination_doc["id"]
-
-    point_count = 100
-    if file_path.endswith(".gpx"):
-        try:
-            with open(file_path, "r") as f:
-                gpx = gpxpy.parse(f)
-
-            lats, lons = [], []
-
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        lats.append(point.latitude)
-                        lons.append(point.longitude)
-
-            # print(len(lats))
-            zipped_route = list(zip(lats, lons))
-            total_distance = 0
-            for i in range(1, len(zipped_route)):
-                total_distance += geodesic(zipped_route[i-1], zipped_route[i]).kilometers
-
-            step = len(lats) // point_count
-
-            final_lats, final_lons = [], []
-            for i in range(0, len(lats), step):
-                final_lats.append(lats[i])
-                final_lons.append(lons[i])
-
-            if lats[-1] != final_lats[-1]:
-                final_lats.append(lats[-1])
-                final_lons.append(lons[-1])
-            
-            # print(len(final_lats), len(final_lons))            
-
-            # print(start, end)
-            zipped_route = list(zip(final_lats, final_lons))
-
-            # Check for existing route in both directions
-            existing_route = routes_collection.find_one(
-                {"$or": [
-                    {"source": start, "destination": end},
-                    {"source": end, "destination": start}
-                ]}
-            )
-
-            if existing_route:
-                return JSONResponse(status_code=400, content={"message": "Route already exists. Cannot insert duplicate."})
-            
-            # Insert the new route
-            result = routes_collection.insert_one(
-                {
-                    "source": start,
-                    "source_id": source_id,
-                    "destination": end,
-                    "destination_id": destination_id,
-                    "route": zipped_route,
-                    "source_coords": [final_lats[0], final_lons[0]],
-                    "destination_coords": [final_lats[-1], final_lons[-1]],
-                    "distance": round(total_distance, 1)
-                }
-            )
-
-            if result.inserted_id is not None:
-                return JSONResponse(status_code=201, content={"message": "Route added successfully."})
-            else:
-                return JSONResponse(status_code=500, content={"message": "Failed to add route."})
-                
-        except Exception as e:
-            return JSONResponse(status_code=500, content={"message": str(e)})
-        
-    elif file_path.endswith(".csv"):
-        df = pd.read_csv(file_path)
-
-        sliced_df = df.iloc[start:end]
-        data = sliced_df.to_dict(orient='records')
-        zipped_route = list(zip(data["latitude"], data["longitude"]))
-    
-        total_distance = 0
-        for i in range(1, len(zipped_route)):
-            total_distance += geodesic(zipped_route[i-1], zipped_route[i]).kilometers
-
-        result = routes_collection.insert_one({
-            "source": start,
-            "source_id": source_id,
-            "destination": end,
-            "destination_id": destination_id,
-            "route": zipped_route,
-            "source_coords": [final_lats[0], final_lons[0]],
-            "destination_coords": [final_lats[-1], final_lons[-1]],
-            "distance": total_distance})
-
-        if result.inserted_id is not None:
-            return JSONResponse(status_code=201, content={"message": "Route added successfully."})
-        else:
-            return JSONResponse(status_code=500, content={"message": "Failed to add route."})
-        
-        # collection.insert_many(data)
-
-    elif os.path.isdir(file_path):
-        gpx_files = sorted([file for file in os.listdir(file_path) if file.endswith(".gpx")])
-        # print(gpx_files)
-
-        lats, lons = [], []
-        for gpx_file in gpx_files:
-            gpx_file_path = os.path.join(file_path, gpx_file)
-            with open(gpx_file_path, "r") as f:
-                gpx = gpxpy.parse(f)
-
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        lats.append(point.latitude)
-                        lons.append(point.longitude)
-
-        # print(len(lats))
-        step = len(lats) // point_count
-
-        final_lats, final_lons = [], []
-        for i in range(0, len(lats), step):
-            final_lats.append(lats[i])
-            final_lons.append(lons[i])
-        
-        if lats[-1] != final_lats[-1]:
-            final_lats.append(lats[-1])
-            final_lons.append(lons[-1])
-        
-        zipped_route = list(zip(final_lats, final_lons))
-
-        total_distance = 0
-        for i in range(1, len(zipped_route)):
-            total_distance += geodesic(zipped_route[i-1], zipped_route[i]).kilometers
-
-        route = {
-            "source": start,
-            "source_id": source_id,
-            "destination": end,
-            "destination_id": destination_id,
-            "route": zipped_route,
-            "source_coords": [final_lats[0], final_lons[0]],
-            "destination_coords": [final_lats[-1], final_lons[-1]],
-            "distance": round(total_distance, 1)
-        }
-
-        result = routes_collection.insert_one(route)
-
-        if result.inserted_id is not None:
-            return JSONResponse(status_code=201, content={"message": "Route added successfully."})
-        else:
-            return JSONResponse(status_code=500, content={"message": "Failed to add route."})
-
-    else:
-        return JSONResponse(status_code=400, content={"message": "Invalid file format"})
-        
-
-@router.post("/small_tasks_route")
-async def small_tasks(admin_password: str = Header(None)):
-
-    actual_password = os.getenv("ADMIN_PASSWORD")
-    if admin_password != actual_password:
-        return JSONResponse(status_code=403, content={"message": "Only admins can use this. Go away."})
-
-    database_name = "transports"
-    collection_name = "routes"
-
-    db = mongo_client[database_name]
-    if collection_name not in db.list_collection_names():
-        return JSONResponse(status_code=404, content={"message": f"{collection_name} Collection not found"})  # Use f-string for interpolation
-    
-    routes_collection = db[collection_name]
-
-    # For every doc, take the "route" field, calculate the distance and update the "distance" field
-    for doc in list(routes_collection.find()):
-        # print("Inside loop")
-        if "route" not in doc:
-            continue
-
-        route = doc["route"]
-        total_distance = 0
-        for i in range(1, len(route)):
-            total_distance += geodesic(route[i-1], route[i]).kilometers
-        
-        routes_collection.update_one({"_id": doc["_id"]}, {"$set": {"distance": round(total_distance, 2)}})
-        
-    return JSONResponse(status_code=200, content={"message": "All routes updated successfully"})
\ No newline at end of file
+from fastapi import APIRouter, Header, UploadFile, File, Form
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.transports_utils import weight_unit_conversion_table, direct_distance_calculator, Transport, calculate_transport_cost, calculate_good_weight
+from fastapi.responses import JSONResponse
+from backend.app.utils.gpx_utils import is_gpx_file, build_route_from_gpx
+from backend.app.utils.route_graph_utils import route_graph, refresh_route_graph, OPTIMIZE_OPTIONS
+from backend.app.utils.polyline_utils import route_storage_fields, encode_route_binary, ROUTE_ENCODINGS
+from backend.app.utils.route_jobs_utils import recompute_route_distances, get_route_job_status
+from backend.app.utils.cost_matrix_utils import get_cost_matrix, get_transport_methods, invalidate_transport_methods
+from backend.app.utils.geo_utils import polyline_length_km, build_route_levels, DISTANCE_METHODS, DEFAULT_DISTANCE_METHOD
+from backend.app.utils.caravan_utils import start_caravan, caravan_position, caravan_simulation
+from backend.app.utils.cargo_utils import CargoItem, plan_cargo
+from backend.app.utils.quote_utils import price_tables
+from typing import Optional
+import os, asyncio, datetime, time
+import pandas as pd
+from pymongo import UpdateOne
+
+router = APIRouter(
+    prefix="/transports",
+    tags=["Transports"]
+)
+
+#Points kept for the full resolution "route" of a new route. Smaller levels are derived from it, see geo_utils.build_route_levels
+FULL_ROUTE_POINT_COUNT = 5000
+
+@router.post("/add_transport_method") #Admin only
+async def add_edit_transport_method(transport: Transport, admin_password: str = Header(None)): #Last tested, 13/02/2025
+    actual_password = os.getenv("ADMIN_PASSWORD")
+
+    if admin_password != actual_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can add/edit transport methods. Go away."})
+    
+    database_name = "transports"
+    collection_name = "transport_methods"
+
+    transport_type = transport.name
+    is_it_an_edit = transport.edit
+
+    db = mongo_client[database_name]
+    if collection_name not in await db.list_collection_names():
+        await db.create_collection(collection_name)
+
+
+    collection = db[collection_name]
+    exists = await collection.find_one({"name": transport_type})
+
+    if is_it_an_edit:
+        if not exists:
+            return JSONResponse(status_code=400, content={"message": "Transport method does not exist."})
+
+        update_fields = {k: v for k, v in transport.model_dump().items() if v is not None}
+
+        if update_fields:
+            await collection.update_one({"name": transport_type}, {"$set": update_fields})
+            invalidate_transport_methods()
+            return JSONResponse(status_code=200, content={"message": f"Transport method {transport_type} updated successfully"})
+        else:
+            return JSONResponse(status_code=400, content={"message": "No fields to update"})
+
+    else:
+        if exists:
+            return JSONResponse(status_code=400, content={"message": "Transport method already exists. Use edit flag to update"})
+        await collection.insert_one(transport.model_dump())
+        invalidate_transport_methods()
+        return JSONResponse(status_code=200, content={"message": f"Transport method {transport_type} added successfully"})
+
+@router.delete("/delete_transport_method") #Admin only
+async def delete_transport_method(transport_type: str, admin_password: str = Header(None)): #Last tested, 13/02/2025
+    "Deletes a transport method upon the request of an admin"
+    actual_password = os.getenv("ADMIN_PASSWORD")
+
+    if admin_password != actual_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can delete transport methods. Go away."})
+    
+    database_name = "transports"
+    collection_name = "transport_methods"
+
+    if collection_name not in await mongo_client[database_name].list_collection_names():
+        return JSONResponse(status_code=404, content={"message": f"Collection {collection_name} not found in database {database_name}"})
+    
+    collection = mongo_client[database_name][collection_name]
+    exists = await collection.find_one({"name": transport_type})
+
+    if not exists:
+        return JSONResponse(status_code=404, content={"message": f"Transport method {transport_type} not found. Ensure spell check."})
+
+    await collection.delete_one({"name": transport_type})
+    invalidate_transport_methods()
+    return JSONResponse(status_code=200, content={"message": f"Transport method {transport_type} deleted successfully"})
+    
+@router.get("/weight_converter_sanity_check")
+async def weight_converter_sanity_check():
+    """This function checks if every good is either measured in KG or their unit has a conversion formula to KG."""
+    db = mongo_client["outposts"]
+    collection = db["goods"]
+
+    # Convert weight_unit_conversion_table into a set for O(1) lookup
+    conversion_set = {(entry["name"], entry["unit"]) for entry in weight_unit_conversion_table}
+
+    goods = collection.find({}, {"name": 1, "unit": 1})  # Fetch only required fields
+
+    errors = []
+    
+    async for good in goods:
+        name, unit = good.get("name"), good.get("unit")
+
+        # Direct kg check
+        if unit == "kg":
+            continue
+
+        # Check if the name and unit exist in the conversion table
+        if (name, unit) not in conversion_set:
+            errors.append(f"Missing conversion for {name} ({unit})")
+
+    if errors:
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Weight converter issues found", "errors": errors}
+        )
+
+    return JSONResponse(status_code=200, content={"message": "Weight converter is working fine"})
+
+
+
+# List all transport options
+@router.get("/")
+async def list_transport(): #Last tested. 13/02/2025
+    """Lists all transport methods available along with their details"""
+    database_name = "transports"
+    collection_name = "transport_methods"
+
+    if collection_name not in await mongo_client[database_name].list_collection_names():
+        return JSONResponse(status_code=404, content={"message": f"Collection {collection_name} not found in database {database_name}"})
+    
+    collection = mongo_client[database_name][collection_name]
+
+    transports = await collection.find({}, {"_id": 0}).to_list()
+    if not transports:
+        return JSONResponse(status_code=404, content={"message": "No transport methods found"})
+    
+    return JSONResponse(status_code=200, content={"transports": transports})
+
+@router.get("/transport_profile") #Tested. 12/02/2025 (Pre-pre-valentine's day)
+async def transport_profile(user_id: str):
+    """Routes leaving the user's current outpost, with cost and time of every transport method for the user's merchandise_weight.
+    One user lookup, routes come already oriented from the route graph cache and options from the cost matrix cache."""
+    result = {}
+
+    users_collection = mongo_client["users"]["metaverse_users"]
+    user = await users_collection.find_one({"username": user_id}, {"_id": 0, "current_outpost_id": 1, "merchandise_weight": 1})
+
+    if not user:
+        return JSONResponse(status_code=200, content={"message": f"User {user_id} not found"})
+    
+    #Weight calculation
+    # result["weight"] = user["merchandise_weight"]
+
+    #Distance calculation
+    current_outpost = user.get("current_outpost_id")
+    # print(current_outpost)
+    if current_outpost is None:
+        return JSONResponse(status_code=200, content={"message": f"User {user_id} has no current outpost. Choose spawn point."})
+
+    result["merchandise_weight"] = user.get("merchandise_weight", 0)
+
+    #Every route touching this outpost, with source_* already being the current outpost and without the polyline
+    routes = route_graph.routes_from(current_outpost)
+    if not routes:
+        return JSONResponse(status_code=200, content={"message": "No trade routes found for current outpost. You are stranded."})
+
+    #One vectorized lookup for all routes of this outpost, instead of a Python loop over routes x methods
+    cost_matrix = await get_cost_matrix()
+    route_options = cost_matrix.options_for_routes([(route["source_id"], route["destination_id"]) for route in routes], result["merchandise_weight"])
+    for route, options in zip(routes, route_options):
+        route["options"] = options
+
+    result["routes"] = routes
+    
+
+    return JSONResponse(status_code=200, content=result)
+
+@router.get("/plan_route")
+async def plan_route(user_id: str, destination_id: str, optimize: str = "distance"):
+    """Multi-hop journey from the user's current outpost to destination_id, over the cached route graph.
+    Every transport method is priced for the user's merchandise_weight, options sorted by `optimize` (distance, time or cost)."""
+    if optimize not in OPTIMIZE_OPTIONS:
+        return JSONResponse(status_code=400, content={"message": f"optimize must be one of {OPTIMIZE_OPTIONS}"})
+
+    user = await mongo_client["users"]["metaverse_users"].find_one({"username": user_id}, {"_id": 0, "current_outpost_id": 1, "merchandise_weight": 1})
+    if not user:
+        return JSONResponse(status_code=404, content={"message": f"User {user_id} not found"})
+
+    current_outpost = user.get("current_outpost_id")
+    if current_outpost is None:
+        return JSONResponse(status_code=400, content={"message": f"User {user_id} has no current outpost. Choose spawn point."})
+
+    transport_methods = await get_transport_methods()
+
+    plan = route_graph.plan(current_outpost, destination_id, user.get("merchandise_weight", 0), transport_methods, optimize)
+    if plan is None:
+        return JSONResponse(status_code=404, content={"message": f"No route from {current_outpost} to {destination_id}"})
+
+    return JSONResponse(status_code=200, content=plan)
+
+def _caravan_content(caravan: dict, position: dict = None):
+    content = {key: value.isoformat() if isinstance(value, datetime.datetime) else value for key, value in caravan.items() if key != "route_key"}
+    if position is not None:
+        content["position"] = position
+    return content
+
+@router.post("/depart")
+async def depart(user_id: str, destination_id: str, transport_name: str):
+    """Sends the user's caravan from their current outpost to destination_id (direct route) with the given transport method.
+    The user has no current outpost while travelling, the tick scheduler sets it to destination_id on arrival."""
+    user = await mongo_client["users"]["metaverse_users"].find_one({"username": user_id}, {"_id": 0, "current_outpost_id": 1, "caravan": 1, "merchandise_weight": 1})
+    if not user:
+        return JSONResponse(status_code=404, content={"message": f"User {user_id} not found"})
+    if user.get("caravan"):
+        return JSONResponse(status_code=400, content={"message": f"User {user_id} is already travelling to {user['caravan']['destination_id']}"})
+
+    current_outpost = user.get("current_outpost_id")
+    if current_outpost is None:
+        return JSONResponse(status_code=400, content={"message": f"User {user_id} has no current outpost. Choose spawn point."})
+
+    transport_method = next((method for method in await get_transport_methods() if method["name"] == transport_name), None)
+    if transport_method is None:
+        return JSONResponse(status_code=404, content={"message": f"Transport method {transport_name} not found"})
+    if transport_method.get("capacity") and user.get("merchandise_weight", 0) > transport_method["capacity"]:
+        return JSONResponse(status_code=400, content={"message": f"{transport_name} carries at most {transport_method['capacity']} kg, user {user_id} has {user.get('merchandise_weight', 0)} kg"})
+
+    caravan = await start_caravan(user_id, current_outpost, destination_id, transport_method)
+    if isinstance(caravan, str):
+        return JSONResponse(status_code=400, content={"message": caravan})
+
+    return JSONResponse(status_code=200, content={"message": f"Caravan departed for {destination_id}", "caravan": _caravan_content(caravan)})
+
+@router.get("/caravan")
+async def get_caravan(user_id: str):
+    """Where the user's caravan is right now, interpolated along the route polyline."""
+    user = await mongo_client["users"]["metaverse_users"].find_one({"username": user_id}, {"_id": 0, "current_outpost_id": 1, "caravan": 1})
+    if not user:
+        return JSONResponse(status_code=404, content={"message": f"User {user_id} not found"})
+    if not user.get("caravan"):
+        return JSONResponse(status_code=200, content={"message": f"User {user_id} is not travelling", "current_outpost_id": user.get("current_outpost_id")})
+
+    position = await caravan_position(user_id, user["caravan"])
+    return JSONResponse(status_code=200, content=_caravan_content(user["caravan"], position))
+
+@router.get("/caravans")
+async def list_caravans():
+    """Positions of every caravan on the road, for the map."""
+    return JSONResponse(status_code=200, content=caravan_simulation.positions(time.time()))
+
+@router.get("/cargo_plan")
+async def cargo_plan(user_id: str, destination_id: str, transport_name: str, budget: Optional[float] = None):
+    """Quantities of the goods of the user's current outpost to buy for selling at destination_id, maximizing expected profit
+    within the budget (default: all the user's money) and the free capacity of the transport method."""
+    user = await mongo_client["users"]["metaverse_users"].find_one({"username": user_id}, {"_id": 0, "current_outpost_id": 1, "money": 1, "merchandise_weight": 1})
+    if not user:
+        return JSONResponse(status_code=404, content={"message": f"User {user_id} not found"})
+    current_outpost = user.get("current_outpost_id")
+    if current_outpost is None:
+        return JSONResponse(status_code=400, content={"message": f"User {user_id} has no current outpost. Choose spawn point."})
+
+    transport_method = next((method for method in await get_transport_methods() if method["name"] == transport_name), None)
+    if transport_method is None:
+        return JSONResponse(status_code=404, content={"message": f"Transport method {transport_name} not found"})
+    distance = route_graph.distances.get(current_outpost, {}).get(destination_id)
+    if distance is None:
+        return JSONResponse(status_code=404, content={"message": f"No route from {current_outpost} to {destination_id}"})
+
+    carried = user.get("merchandise_weight", 0)
+    capacity = transport_method["capacity"] - carried if transport_method.get("capacity") else None
+    if capacity is not None and capacity < 0:
+        return JSONResponse(status_code=400, content={"message": f"{transport_name} carries at most {transport_method['capacity']} kg, user {user_id} has {carried} kg"})
+    budget = user.get("money", 0) if budget is None else min(budget, user.get("money", 0))
+    per_kg = (transport_method.get("base_cost_per_kg") or 0) * distance
+
+    source_table, destination_table = await asyncio.gather(price_tables.get(current_outpost), price_tables.get(destination_id))
+    items = []
+    for name, entry in source_table.items():
+        if name not in destination_table:
+            continue
+        weight = calculate_good_weight(name, entry["unit"], 1)
+        items.append(CargoItem(name, entry["unit"], entry["ask"], weight, destination_table[name]["bid"] - entry["ask"] - per_kg * weight, entry["quantity"]))
+
+    plan = await asyncio.to_thread(plan_cargo, items, budget, capacity)
+    #What the trip costs whatever is bought: the distance and the merchandise already carried
+    trip_cost = round((transport_method.get("base_cost_per_km") or 0) * distance + per_kg * carried, 2)
+    return JSONResponse(status_code=200, content={
+        "from": current_outpost,
+        "to": destination_id,
+        "transport_method": transport_name,
+        "distance": round(distance, 1),
+        "budget": budget,
+        "free_capacity": capacity,
+        **plan,
+        "trip_cost": trip_cost,
+        "net_profit": round(plan["profit"] - trip_cost, 2),
+    })
+
+# Get transport details
+@router.get("/{transport_id}")
+async def get_transport(transport_id: int):
+    return JSONResponse(status_code=200, content={"transport_id": transport_id, "type": "Caravan", "fee": 100})
+
+@router.post("/add_route") #Admin only
+async def add_route(file_path: str, start: str, end: str, admin_password: str = Header(None), distance_method: str = DEFAULT_DISTANCE_METHOD):
+    """Add coordinate of routes from one outpost to another. 
+    Input - relative file path of gpx file manually added from google maps
+    Output - list of coordinates for every route in MongoDB
+    Challenge - There is no direct route from Tobolsk to Hanzhou on modern google maps, I had to make two separate roads, one from Tobolsk to Mongolia, and another from Mongolia to Hanzhou."""
+
+    actual_password = os.getenv("ADMIN_PASSWORD")
+
+    if admin_password != actual_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can add routes. Go away."})
+
+    if distance_method not in DISTANCE_METHODS:
+        return JSONResponse(status_code=400, content={"message": f"Unknown distance method {distance_method}. Choose one of {DISTANCE_METHODS}"})
+    
+    # if not os.path.isfile(file_path):
+    #     return JSONResponse(status_code=404, content={"message":"File not found"})
+
+    database_name = "transports"
+    collection_name = "routes"
+
+    db = mongo_client[database_name]
+    if collection_name not in await db.list_collection_names():
+        await db.create_collection(collection_name)
+
+    routes_collection = db[collection_name]
+
+    database_name = "outposts"
+    collection_name = "spawn_points"
+
+    db = mongo_client[database_name]
+    if collection_name not in await db.list_collection_names():
+        return JSONResponse(status_code=404, content={"message": "{collection_name} Collection not found"})
+    
+    outpost_collection = db[collection_name]
+    source_doc = await outpost_collection.find_one({"name": start})
+    destination_doc = await outpost_collection.find_one({"name": end})
+
+    if not source_doc or not destination_doc:
+        return JSONResponse(status_code=404, content={"message": "Source or destination not found"})
+    
+    source_id = source_doc["id"]
+    destination_id = destination_doc["id"]
+
+    # Check for existing route in both directions
+    existing_route = await routes_collection.find_one(
+        {"$or": [
+            {"source": start, "destination": end},
+            {"source": end, "destination": start}
+        ]}
+    )
+
+    if existing_route:
+        return JSONResponse(status_code=400, content={"message": "Route already exists. Cannot insert duplicate."})
+
+    point_count = FULL_ROUTE_POINT_COUNT
+    if is_gpx_file(file_path) or os.path.isdir(file_path):
+        #A route can be a single .gpx/.gpx.gz file, or a directory of them that are chained in name order
+        if os.path.isdir(file_path):
+            gpx_files = sorted([os.path.join(file_path, file) for file in os.listdir(file_path) if is_gpx_file(file)])
+        else:
+            gpx_files = [file_path]
+
+        if not gpx_files:
+            return JSONResponse(status_code=400, content={"message": "No gpx files found"})
+
+        try:
+            #Files are streamed point by point, distance is summed over every point and only ~point_count points are kept.
+            #Parsing is CPU bound, so it runs in a worker thread to keep the event loop free.
+            zipped_route, total_distance = await asyncio.to_thread(build_route_from_gpx, gpx_files, point_count, distance_method)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"message": str(e)})
+
+        if len(zipped_route) < 2:
+            return JSONResponse(status_code=400, content={"message": "Not enough track points in gpx files"})
+        route_levels = build_route_levels(zipped_route)
+
+        # Insert the new route
+        result = await routes_collection.insert_one(
+            {
+                "source": start,
+                "source_id": source_id,
+                "destination": end,
+                "destination_id": destination_id,
+                **route_storage_fields(zipped_route),
+                "route_levels": route_levels,
+                "source_coords": list(zipped_route[0]),
+                "destination_coords": list(zipped_route[-1]),
+                "distance": round(total_distance, 1)
+            }
+        )
+
+        if result.inserted_id is not None:
+            await refresh_route_graph(changed=True)
+            return JSONResponse(status_code=201, content={"message": "Route added successfully."})
+        else:
+            return JSONResponse(status_code=500, content={"message": "Failed to add route."})
+
+    elif file_path.endswith(".csv"):
+        #One track point per row, in "latitude" and "longitude" columns
+        try:
+            df = await asyncio.to_thread(pd.read_csv, file_path, usecols=["latitude", "longitude"])
+        except (OSError, ValueError) as e:
+            return JSONResponse(status_code=400, content={"message": f"Invalid csv file: {e}"})
+        df = df.dropna()
+        zipped_route = list(zip(df["latitude"].astype(float).tolist(), df["longitude"].astype(float).tolist()))
+
+        if len(zipped_route) < 2:
+            return JSONResponse(status_code=400, content={"message": "Not enough track points in csv file"})
+
+        total_distance = polyline_length_km(zipped_route, distance_method)
+
+        result = await routes_collection.insert_one({
+            "source": start,
+            "source_id": source_id,
+            "destination": end,
+            "destination_id": destination_id,
+            **route_storage_fields(zipped_route),
+            "route_levels": build_route_levels(zipped_route),
+            "source_coords": list(zipped_route[0]),
+            "destination_coords": list(zipped_route[-1]),
+            "distance": round(total_distance, 1)})
+
+        if result.inserted_id is not None:
+            await refresh_route_graph(changed=True)
+            return JSONResponse(status_code=201, content={"message": "Route added successfully."})
+        else:
+            return JSONResponse(status_code=500, content={"message": "Failed to add route."})
+
+    else:
+        return JSONResponse(status_code=400, content={"message": "Invalid file format"})
+        
+
+@router.post("/small_tasks_route")
+async def small_tasks(admin_password: str = Header(None), distance_method: str = DEFAULT_DISTANCE_METHOD, resume: bool = True):
+    """Recomputes distance and simplified levels of every route. An interrupted run continues from its checkpoint, with the distance method it was started with, unless resume=false."""
+
+    actual_password = os.getenv("ADMIN_PASSWORD")
+    if admin_password != actual_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can use this. Go away."})
+
+    if distance_method not in DISTANCE_METHODS:
+        return JSONResponse(status_code=400, content={"message": f"Unknown distance method {distance_method}. Choose one of {DISTANCE_METHODS}"})
+
+    #Batch job: streamed cursor, process pool, unordered bulk writes, resumable checkpoint. See route_jobs_utils.
+    status = await recompute_route_distances(distance_method, resume=resume)
+    if status is None:
+        return JSONResponse(status_code=409, content={"message": "The job is already running, see /small_tasks_route/status"})
+
+    await refresh_route_graph(changed=True)
+    return JSONResponse(status_code=200, content={"message": f"All routes updated successfully ({status['processed']}/{status['total']}, {status['distance_method']})"})
+
+@router.get("/small_tasks_route/status")
+async def small_tasks_status(admin_password: str = Header(None)):
+    """Progress of the last (or running) small_tasks_route job."""
+    actual_password = os.getenv("ADMIN_PASSWORD")
+    if admin_password != actual_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can use this. Go away."})
+
+    status = await get_route_job_status()
+    if not status:
+        return JSONResponse(status_code=404, content={"message": "small_tasks_route never ran"})
+
+    return JSONResponse(status_code=200, content={k: str(v) if k == "last_id" or isinstance(v, datetime.datetime) else v for k, v in status.items()})
+
+@router.post("/pack_routes") #Admin only
+async def pack_routes(admin_password: str = Header(None), encoding: str = "float32", keep_arrays: bool = False):
+    """Migration to the compact route storage (see polyline_utils). Packs the "route" array of every route into "route_bin".
+    With keep_arrays=False (default) the old array is removed, which is where the space is saved."""
+    actual_password = os.getenv("ADMIN_PASSWORD")
+    if admin_password != actual_password:
+        return JSONResponse(status_code=403, content={"message": "Only admins can use this. Go away."})
+
+    if encoding not in ROUTE_ENCODINGS:
+        return JSONResponse(status_code=400, content={"message": f"Unknown route encoding {encoding}. Choose one of {ROUTE_ENCODINGS}"})
+
+    routes_collection = mongo_client["transports"]["routes"]
+
+    #Written in unordered batches, so only one batch of polylines is in memory at a time
+    packed, batch = 0, []
+    async for doc in routes_collection.find({"route": {"$exists": True}}, {"_id": 1, "route": 1}):
+        update = {"$set": {"route_bin": encode_route_binary(doc["route"], encoding), "route_encoding": encoding}}
+        if not keep_arrays:
+            update["$unset"] = {"route": ""}
+        batch.append(UpdateOne({"_id": doc["_id"]}, update))
+        if len(batch) == 500:
+            packed += (await routes_collection.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        packed += (await routes_collection.bulk_write(batch, ordered=False)).modified_count
+
+    return JSONResponse(status_code=200, content={"message": f"Packed {packed} routes as {encoding}"})
\ No newline at end of file
@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.route_graph_utils import route_graph
+from backend.app.utils.cost_matrix_utils import get_transport_methods, transport_methods_cache
+from backend.app.utils.quote_utils import QUOTE_SPREAD
+
+#Where to buy a good and where to sell it for the best profit after transport.
+#For every good, profit[src, dst] = (bid at dst - ask at src) * quantity - transport cost of the shortest path src -> dst,
+#computed as one (outposts x outposts) NumPy matrix. The best cells of every good go through a size-k heap.
+#
+#Transport cost is linear in distance: (base_cost_per_km + weight * base_cost_per_kg) * d, so the cheapest method for a weight is
+#the one with the lowest per-km rate and the cost matrix is that rate times the all-pairs distance matrix of the route graph.
+#The market (prices and stock of every good) is reloaded at most every ARBITRAGE_MARKET_SECONDS: it changes with every trade,
+#so keying on the price table version would reload it, and miss the results cache, on nearly every request.
+#Results are cached per (market load, route graph version, transport methods version, weight bucket, quantity, k).
+#The matrix work runs in a thread, off the event loop.
+
+WEIGHT_BUCKET_KG = 100
+ARBITRAGE_CACHE_SIZE = 256
+ARBITRAGE_MARKET_SECONDS = float(os.getenv("ARBITRAGE_MARKET_SECONDS", "30"))
+
+_market = None  #(loaded at, load number, {"outposts", "goods", "ask", "stock"})
+_market_loads = itertools.count(1)
+_market_lock = asyncio.Lock()  #one load at a time, the requests that arrive meanwhile wait for it
+_distances = None  #(route graph version, outposts, matrix)
+_results = OrderedDict()
+
+def weight_bucket(weight: float):
+    """Weights are rounded up to the next WEIGHT_BUCKET_KG, so players with similar cargo share cached results."""
+    return int(np.ceil(max(weight, 0) / WEIGHT_BUCKET_KG)) * WEIGHT_BUCKET_KG
+
+async def _load_market():
+    """(load number, market), reloaded when older than ARBITRAGE_MARKET_SECONDS."""
+    global _market
+    async with _market_lock:
+        if _market is not None and time.monotonic() - _market[0] < ARBITRAGE_MARKET_SECONDS:
+            return _market[1], _market[2]
+        _market = (time.monotonic(), next(_market_loads), await _read_market())
+        return _market[1], _market[2]
+
+async def _read_market():
+    goods = await mongo_client["outposts"]["goods"].find({}, {"_id": 0, "outpost_id": 1, "name": 1, "price": 1, "quantity": 1}).to_list()
+    outposts = sorted({good["outpost_id"] for good in goods})
+    names = sorted({good["name"] for good in goods})
+    outpost_index = {outpost_id: i for i, outpost_id in enumerate(outposts)}
+    good_index = {name: j for j, name in enumerate(names)}
+
+    ask = np.full((len(outposts), len(names)), np.nan)
+    stock = np.zeros((len(outposts), len(names)))
+    for good in goods:
+        i, j = outpost_index[good["outpost_id"]], good_index[good["name"]]
+        ask[i, j] = good.get("price", np.nan)
+        stock[i, j] = max(good.get("quantity", 0), 0)
+    return {"outposts": outposts, "goods": names, "ask": ask, "stock": stock}
+
+def _distance_matrix(outposts):
+    """All-pairs shortest distances between the given outposts (inf where not connected), cached per route graph version."""
+    global _distances
+    if _distances is not None and _distances[0] == route_graph.version and _distances[1] == outposts:
+        return _distances[2]
+    matrix = np.full((len(outposts), len(outposts)), np.inf)
+    index = {outpost_id: i for i, outpost_id in enumerate(outposts)}
+    for source, targets in route_graph.distances.items():
+        i = index.get(source)
+        if i is None:
+            continue
+        for target, distance in targets.items():
+            j = index.get(target)
+            if j is not None:
+                matrix[i, j] = distance
+    np.fill_diagonal(matrix, np.inf)  #Buying and selling at the same outpost is not a trip
+    _distances = (route_graph.version, outposts, matrix)
+    return matrix
+
+def _cheapest_method(transport_methods, weight: float):
+    """(name, cost per km) of the cheapest transport method for this weight, or (None, inf)."""
+    best = (None, np.inf)
+    for method in transport_methods:
+        if method.get("base_cost_per_km") is None or method.get("base_cost_per_kg") is None:
+            continue
+        rate = method["base_cost_per_km"] + weight * method["base_cost_per_kg"]
+        if rate < best[1]:
+            best = (method["name"], rate)
+    return best
+
+def top_opportunities(market, distances, method_name, rate, k: int, max_quantity: int):
+    """Top k (profit, src, dst, good) over every good, best first."""
+    ask, stock = market["ask"], market["stock"]
+    bid = ask * (1 - QUOTE_SPREAD)
+    transport_cost = np.round(distances * rate, 0)
+    heap = []  #min-heap of the k best so far
+    for j in range(ask.shape[1]):
+        sellers = np.flatnonzero(~np.isnan(ask[:, j]) & (stock[:, j] > 0))
+        buyers = np.flatnonzero(~np.isnan(bid[:, j]))
+        if len(sellers) == 0 or len(buyers) == 0:
+            continue
+        quantity = np.minimum(stock[sellers, j], max_quantity)[:, None]
+        profit = (bid[buyers, j][None, :] - ask[sellers, j][:, None]) * quantity - transport_cost[np.ix_(sellers, buyers)]
+        profit[~np.isfinite(profit)] = -np.inf
+
+        #Only the k best cells of this good can make it into the overall top k
+        flat = profit.ravel()
+        candidates = np.argpartition(flat, -k)[-k:] if flat.size > k else np.arange(flat.size)
+        for cell in candidates[flat[candidates] > 0].tolist():
+            src, dst = divmod(cell, len(buyers))
+            entry = (float(flat[cell]), int(sellers[src]), int(buyers[dst]), j, float(quantity[src, 0]))
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+    results = []
+    for profit, src, dst, j, quantity in sorted(heap, reverse=True):
+        source, destination = market["outposts"][src], market["outposts"][dst]
+        results.append({
+            "good_id": market["goods"][j],
+            "buy_at": source,
+            "sell_at": destination,
+            "buy_price": float(ask[src, j]),
+            "sell_price": round(float(bid[dst, j]), 2),
+            "quantity": int(quantity),
+            "distance": round(float(distances[src, dst]), 1),
+            "transport_method": method_name,
+            "transport_cost": float(transport_cost[src, dst]),
+            "profit": round(profit, 2),
+            "path": route_graph.path(source, destination),
+        })
+    return results
+
+def _opportunities(market, method_name, rate, k: int, max_quantity: int):
+    #Runs in a worker thread
+    return top_opportunities(market, _distance_matrix(market["outposts"]), method_name, rate, k, max_quantity)
+
+async def find_arbitrage(weight: float, k: int = 10, max_quantity: int = 100):
+    """Best k trades (buy at one outpost, carry, sell at another) for a player carrying `weight`."""
+    bucket = weight_bucket(weight)
+    market_load, market = await _load_market()
+    transport_methods = await get_transport_methods()
+    #Versions read after the awaits, so the key matches the data the results are computed from
+    key = (market_load, route_graph.version, transport_methods_cache.version, bucket, max_quantity, k)
+    if key in _results:
+        _results.move_to_end(key)
+        return _results[key]
+
+    method_name, rate = _cheapest_method(transport_methods, bucket)
+    if method_name is None or not market["outposts"]:
+        results = []
+    else:
+        results = await asyncio.to_thread(_opportunities, market, method_name, rate, k, max_quantity)
+
+    _results[key] = results
+    while len(_results) > ARBITRAGE_CACHE_SIZE:
+        _results.popitem(last=False)
+    return results
@@ -0,0 +1,141 @@
+import datetime
+
+from pymongo import UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#OHLCV candles per (outpost_id, good_id) in trades.candles, one document per interval bucket:
+#  {interval, outpost_id, good_id, start, open, high, low, close, volume, value, trade_count, open_at, close_at}
+#Prices are unit prices, volume is the quantity traded and value the money.
+# - Incremental: the trade ledgers (purchases and order book fills) call apply_candles with every inserted batch. The batch is
+#   reduced in Python to one pipeline upsert per touched candle. open_at/close_at keep open/close right when batches arrive
+#   out of order.
+# - Backfill: backfill_candles rebuilds a time range from the ledgers with $dateTrunc + $group and $merges it in.
+#Times are UTC: every datetime coming in (trade created_at, query ranges, stored starts) goes through as_utc first. Naive ones
+#are taken as UTC, which is what MongoDB stores and returns and what $dateTrunc buckets in.
+
+CANDLE_INTERVALS = {"1m": "minute", "1h": "hour", "1d": "day"}
+CANDLE_MAX_POINTS = 5000
+
+def candles_collection():
+    return mongo_client["trades"]["candles"]
+
+def as_utc(moment: datetime.datetime):
+    """Aware UTC datetime: naive datetimes are taken as UTC, aware ones are converted."""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.astimezone(datetime.timezone.utc)
+
+def bucket_start(moment: datetime.datetime, interval: str):
+    unit = CANDLE_INTERVALS[interval]
+    moment = as_utc(moment).replace(second=0, microsecond=0)
+    if unit in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if unit == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+def unit_price(trade: dict):
+    #Older ledger records only have the total "price"
+    if trade.get("unit_price") is not None:
+        return trade["unit_price"]
+    return trade["price"] / trade["quantity"] if trade.get("quantity") else trade.get("price", 0)
+
+def candle_updates(trades):
+    """One upsert per (interval, outpost, good, bucket) touched by the trades."""
+    candles = {}
+    trades = [(as_utc(trade["created_at"]), trade) for trade in trades]
+    for created_at, trade in sorted(trades, key=lambda entry: entry[0]):
+        if trade.get("outpost_id") is None or trade.get("good_id") is None or not trade.get("quantity"):
+            continue
+        price = unit_price(trade)
+        for interval in CANDLE_INTERVALS:
+            key = (interval, trade["outpost_id"], trade["good_id"], bucket_start(created_at, interval))
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = {"open": price, "high": price, "low": price, "close": price, "volume": trade["quantity"],
+                                "value": price * trade["quantity"], "trade_count": 1, "open_at": created_at, "close_at": created_at}
+                continue
+            candle["high"] = max(candle["high"], price)
+            candle["low"] = min(candle["low"], price)
+            candle["close"] = price
+            candle["close_at"] = created_at
+            candle["volume"] += trade["quantity"]
+            candle["value"] += price * trade["quantity"]
+            candle["trade_count"] += 1
+
+    updates = []
+    for (interval, outpost_id, good_id, start), candle in candles.items():
+        #Batch candle merged into the stored one. A missing stored candle takes the batch values ($ifNull).
+        earlier = {"$lt": [candle["open_at"], {"$ifNull": ["$open_at", candle["open_at"]]}]}
+        later = {"$gte": [candle["close_at"], {"$ifNull": ["$close_at", candle["close_at"]]}]}
+        updates.append(UpdateOne({"interval": interval, "outpost_id": outpost_id, "good_id": good_id, "start": start}, [{"$set": {
+            "open": {"$cond": [{"$or": [earlier, {"$eq": [{"$type": "$open"}, "missing"]}]}, candle["open"], "$open"]},
+            "open_at": {"$min": [{"$ifNull": ["$open_at", candle["open_at"]]}, candle["open_at"]]},
+            "close": {"$cond": [later, candle["close"], "$close"]},
+            "close_at": {"$max": [{"$ifNull": ["$close_at", candle["close_at"]]}, candle["close_at"]]},
+            "high": {"$max": [{"$ifNull": ["$high", candle["high"]]}, candle["high"]]},
+            "low": {"$min": [{"$ifNull": ["$low", candle["low"]]}, candle["low"]]},
+            "volume": {"$add": [{"$ifNull": ["$volume", 0]}, candle["volume"]]},
+            "value": {"$add": [{"$ifNull": ["$value", 0]}, candle["value"]]},
+            "trade_count": {"$add": [{"$ifNull": ["$trade_count", 0]}, candle["trade_count"]]},
+        }}], upsert=True))
+    return updates
+
+async def apply_candles(trades):
+    """Trade ledger hook, called with the trades of a batch that were actually inserted."""
+    updates = candle_updates(trades)
+    if updates:
+        await candles_collection().bulk_write(updates, ordered=False)
+
+async def backfill_candles(since: datetime.datetime = None, until: datetime.datetime = None):
+    """Rebuilds the candles of [since, until) from trades.purchases and trades.fills. Whole buckets should be given, partial ones are overwritten with partial data."""
+    since, until = as_utc(since), as_utc(until)
+    match = {"outpost_id": {"$ne": None}, "good_id": {"$ne": None}, "quantity": {"$gt": 0}}
+    if since is not None or until is not None:
+        match["created_at"] = {key: value for key, value in (("$gte", since), ("$lt", until)) if value is not None}
+
+    for interval, unit in CANDLE_INTERVALS.items():
+        cursor = await mongo_client["trades"]["purchases"].aggregate([
+            {"$match": match},
+            #Fill records carry the unit price in "price"
+            {"$unionWith": {"coll": "fills", "pipeline": [{"$match": match}, {"$set": {"unit_price": {"$ifNull": ["$unit_price", "$price"]}}}]}},
+            {"$set": {"unit_price": {"$ifNull": ["$unit_price", {"$divide": ["$price", "$quantity"]}]}}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": {"outpost_id": "$outpost_id", "good_id": "$good_id", "start": {"$dateTrunc": {"date": "$created_at", "unit": unit}}},
+                "open": {"$first": "$unit_price"},
+                "high": {"$max": "$unit_price"},
+                "low": {"$min": "$unit_price"},
+                "close": {"$last": "$unit_price"},
+                "volume": {"$sum": "$quantity"},
+                "value": {"$sum": {"$multiply": ["$unit_price", "$quantity"]}},
+                "trade_count": {"$sum": 1},
+                "open_at": {"$first": "$created_at"},
+                "close_at": {"$last": "$created_at"},
+            }},
+            {"$project": {"_id": 0, "interval": {"$literal": interval}, "outpost_id": "$_id.outpost_id", "good_id": "$_id.good_id", "start": "$_id.start",
+                          "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1, "value": 1, "trade_count": 1, "open_at": 1, "close_at": 1}},
+            {"$merge": {"into": "candles", "on": ["interval", "outpost_id", "good_id", "start"], "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ], allowDiskUse=True)
+        await cursor.to_list()
+
+async def get_candles(outpost_id: str, good_id: str, interval: str, since: datetime.datetime = None, until: datetime.datetime = None, limit: int = CANDLE_MAX_POINTS):
+    """Candles of a range, oldest first, as columns: {"t": [epoch seconds], "o", "h", "l", "c", "v": [...]}."""
+    since, until = as_utc(since), as_utc(until)
+    query = {"interval": interval, "outpost_id": outpost_id, "good_id": good_id}
+    if since is not None or until is not None:
+        query["start"] = {key: value for key, value in (("$gte", since), ("$lt", until)) if value is not None}
+    candles = await candles_collection().find(
+        query, {"_id": 0, "start": 1, "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}
+    ).sort("start", 1).limit(max(1, min(limit, CANDLE_MAX_POINTS))).to_list()
+    return {
+        "t": [int(as_utc(candle["start"]).timestamp()) for candle in candles],
+        "o": [candle["open"] for candle in candles],
+        "h": [candle["high"] for candle in candles],
+        "l": [candle["low"] for candle in candles],
+        "c": [candle["close"] for candle in candles],
+        "v": [candle["volume"] for candle in candles],
+    }
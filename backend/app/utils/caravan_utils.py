@@ -0,0 +1,192 @@
+import asyncio
+import datetime
+import heapq
+import os
+import time
+
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.geo_utils import segment_distances_km
+from backend.app.utils.polyline_utils import route_points
+
+load_dotenv()
+
+#Caravan travel. A player who departs gets a "caravan" field on their user document (route, speed, departure and arrival time)
+#and current_outpost_id is cleared until arrival. Position is never stored, it is a pure function of the clock:
+#travelled = speed * elapsed, mapped onto the route polyline by binary search over its cumulative distance array.
+#The only state change is arrival. The tick loop pops due caravans from a heap of arrival times and writes all of them in one
+#bulk_write, so a tick costs nothing for the thousands of caravans that are simply still on the road.
+
+#Game time runs faster than real time. Transport speed is km per game hour.
+GAME_HOURS_PER_SECOND = float(os.getenv("CARAVAN_GAME_HOURS_PER_SECOND", "1"))
+TICK_SECONDS = 1.0
+
+class Polyline:
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cumulative = np.concatenate([[0.0], np.cumsum(segment_distances_km(self.points))])
+        self.length = float(self.cumulative[-1])
+
+    def interpolate(self, fractions):
+        """(lat, lon) at the given fractions (0 = start, 1 = end) of the polyline length, as an (N, 2) array."""
+        fractions = np.clip(np.atleast_1d(np.asarray(fractions, dtype=np.float64)), 0, 1)
+        if len(self.points) == 1 or self.length == 0:
+            return np.repeat(self.points[:1], len(fractions), axis=0)
+        distances = fractions * self.length
+        upper = np.clip(np.searchsorted(self.cumulative, distances, side="right"), 1, len(self.points) - 1)
+        lower = upper - 1
+        span = self.cumulative[upper] - self.cumulative[lower]
+        weight = np.divide(distances - self.cumulative[lower], span, out=np.zeros_like(distances), where=span > 0)[:, None]
+        return self.points[lower] + weight * (self.points[upper] - self.points[lower])
+
+class CaravanSimulation:
+    def __init__(self):
+        self.caravans = {}  #username -> caravan dict (same shape as the "caravan" field of the user document, times as epoch seconds)
+        self.arrivals = []  #heap of (arrival_at, username)
+        self.polylines = {} #route key -> Polyline, oriented in the direction of travel
+
+    def add(self, username: str, caravan: dict, polyline: Polyline):
+        self.polylines.setdefault(caravan["route_key"], polyline)
+        self.caravans[username] = caravan
+        heapq.heappush(self.arrivals, (caravan["arrival_at"], username))
+
+    def pop_arrivals(self, now: float):
+        """Caravans whose arrival time has passed. They are removed from the simulation."""
+        arrived = []
+        while self.arrivals and self.arrivals[0][0] <= now:
+            arrival_at, username = heapq.heappop(self.arrivals)
+            caravan = self.caravans.get(username)
+            if caravan is not None and caravan["arrival_at"] == arrival_at:
+                arrived.append((username, self.caravans.pop(username)))
+        return arrived
+
+    def positions(self, now: float, usernames=None):
+        """{username: {"latitude", "longitude", "progress"}} for the given (default all) caravans. One searchsorted per route."""
+        usernames = list(self.caravans) if usernames is None else [u for u in usernames if u in self.caravans]
+        by_route = {}
+        for username in usernames:
+            by_route.setdefault(self.caravans[username]["route_key"], []).append(username)
+
+        result = {}
+        for route_key, route_usernames in by_route.items():
+            departed = np.array([self.caravans[u]["departed_at"] for u in route_usernames])
+            arrival = np.array([self.caravans[u]["arrival_at"] for u in route_usernames])
+            progress = np.clip((now - departed) / np.maximum(arrival - departed, 1e-9), 0, 1)
+            points = self.polylines[route_key].interpolate(progress)
+            for username, (latitude, longitude), fraction in zip(route_usernames, points.tolist(), progress.tolist()):
+                result[username] = {"latitude": latitude, "longitude": longitude, "progress": round(fraction, 4)}
+        return result
+
+caravan_simulation = CaravanSimulation()
+
+def _route_key(route_document: dict, reverse: bool):
+    return f"{route_document['_id']}:{'reverse' if reverse else 'forward'}"
+
+def _to_epoch(value):
+    return value.timestamp() if isinstance(value, datetime.datetime) else value
+
+async def load_polyline(route_key: str):
+    """Polyline of a route in the direction of travel, from the simulation cache or MongoDB."""
+    if route_key in caravan_simulation.polylines:
+        return caravan_simulation.polylines[route_key]
+    route_id, direction = route_key.rsplit(":", 1)
+    routes_collection = mongo_client["transports"]["routes"]
+    route_document = await routes_collection.find_one({"_id": _object_id(route_id)}, {"route": 1, "route_bin": 1, "route_encoding": 1})
+    points = route_points(route_document) if route_document else np.zeros((0, 2))
+    return Polyline(points[::-1] if direction == "reverse" else points)
+
+def _object_id(value: str):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+async def start_caravan(username: str, source_id: str, destination_id: str, transport_method: dict):
+    """
+    Sends the user's caravan from source to destination along the direct route. Returns the caravan, or an error message string.
+    The departure is a guarded update on current_outpost_id, so a player can't depart twice or from the wrong outpost.
+    """
+    routes_collection = mongo_client["transports"]["routes"]
+    route_document = await routes_collection.find_one(
+        {"$or": [{"source_id": source_id, "destination_id": destination_id}, {"source_id": destination_id, "destination_id": source_id}]},
+        {"_id": 1, "source_id": 1, "distance": 1, "route": 1, "route_bin": 1, "route_encoding": 1}
+    )
+    if not route_document:
+        return f"No direct route from {source_id} to {destination_id}"
+    if not transport_method.get("speed"):
+        return f"Transport method {transport_method['name']} has no speed"
+
+    reverse = route_document["source_id"] != source_id
+    route_key = _route_key(route_document, reverse)
+    points = route_points(route_document)
+    polyline = caravan_simulation.polylines.get(route_key) or Polyline(points[::-1] if reverse else points)
+
+    departed_at = time.time()
+    travel_hours = route_document["distance"] / transport_method["speed"]
+    caravan = {
+        "route_key": route_key,
+        "source_id": source_id,
+        "destination_id": destination_id,
+        "transport": transport_method["name"],
+        "speed": transport_method["speed"],
+        "distance": route_document["distance"],
+        "departed_at": datetime.datetime.fromtimestamp(departed_at),
+        "arrival_at": datetime.datetime.fromtimestamp(departed_at + travel_hours / GAME_HOURS_PER_SECOND),
+    }
+
+    result = await mongo_client["users"]["metaverse_users"].update_one(
+        {"username": username, "current_outpost_id": source_id, "caravan": {"$exists": False}},
+        {"$set": {"current_outpost_id": None, "caravan": caravan, "updated_at": datetime.datetime.now()}}
+    )
+    if result.matched_count == 0:
+        return f"User {username} is not at outpost {source_id} or is already travelling"
+
+    caravan_simulation.add(username, {**caravan, "departed_at": departed_at, "arrival_at": _to_epoch(caravan["arrival_at"])}, polyline)
+    return caravan
+
+async def caravan_position(username: str, caravan: dict):
+    """Position of one caravan. Works from the user document alone, so any worker can answer even if another one started it."""
+    if username not in caravan_simulation.caravans:
+        polyline = await load_polyline(caravan["route_key"])
+        caravan_simulation.add(username, {**caravan, "departed_at": _to_epoch(caravan["departed_at"]), "arrival_at": _to_epoch(caravan["arrival_at"])}, polyline)
+    return caravan_simulation.positions(time.time(), [username]).get(username)
+
+async def process_arrivals(now: float = None):
+    """One tick. Moves every caravan that has arrived to its destination outpost with a single bulk_write."""
+    arrived = caravan_simulation.pop_arrivals(time.time() if now is None else now)
+    if not arrived:
+        return 0
+    update_time = datetime.datetime.now()
+    try:
+        await mongo_client["users"]["metaverse_users"].bulk_write([
+            UpdateOne(
+                {"username": username, "caravan.route_key": caravan["route_key"]},
+                {"$set": {"current_outpost_id": caravan["destination_id"], "updated_at": update_time}, "$unset": {"caravan": ""}}
+            )
+            for username, caravan in arrived
+        ], ordered=False)
+    except Exception:
+        #Put them back, the next tick retries (the update is idempotent)
+        for username, caravan in arrived:
+            caravan_simulation.add(username, caravan, caravan_simulation.polylines[caravan["route_key"]])
+        raise
+    return len(arrived)
+
+async def load_caravans():
+    """Puts every caravan that is still on the road (user documents with a "caravan" field) back into the simulation."""
+    users_collection = mongo_client["users"]["metaverse_users"]
+    async for user in users_collection.find({"caravan": {"$exists": True}}, {"_id": 0, "username": 1, "caravan": 1}):
+        caravan = user["caravan"]
+        polyline = await load_polyline(caravan["route_key"])
+        caravan_simulation.add(user["username"], {**caravan, "departed_at": _to_epoch(caravan["departed_at"]), "arrival_at": _to_epoch(caravan["arrival_at"])}, polyline)
+
+async def run_caravan_ticks():
+    """Tick scheduler, started in the app lifespan."""
+    await load_caravans()
+    while True:
+        try:
+            await process_arrivals()
+        except Exception as e:
+            print(f"Caravan tick failed: {e}")
+        await asyncio.sleep(TICK_SECONDS)
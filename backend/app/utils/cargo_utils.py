@@ -0,0 +1,145 @@
+import math
+import time
+
+import numpy as np
+
+#Cargo planner: how much of each good to buy at the current outpost to sell at a destination, within a money budget and the
+#free capacity of the transport. A bounded knapsack with two constraints (money and weight).
+# - Profit per unit = bid at destination - ask here - per kg transport cost of the unit's weight over the trip.
+# - DP with scaling: money and weight are scaled to a grid of at most GRID_SIZE steps each (item costs rounded up, so every DP
+#   solution is feasible), bounded quantities are split into powers of two, and the 0/1 DP runs one NumPy pass per piece.
+#   The grid shrinks when there are many pieces, so the DP stays within the time budget.
+# - Greedy by profit per unit of the scarcer resource, then topping up the DP solution greedily with what rounding left over.
+#   The better of the two plans is returned.
+
+GRID_SIZE = 256
+TIME_BUDGET_SECONDS = 0.2
+DP_CELL_BUDGET = 2e7  #pieces x grid cells the DP may visit (and bytes of its choice table)
+
+class CargoItem:
+    __slots__ = ("name", "unit", "cost", "weight", "profit", "max_quantity")
+
+    def __init__(self, name, unit, cost, weight, profit, max_quantity):
+        self.name = name
+        self.unit = unit
+        self.cost = cost          #money per unit
+        self.weight = weight      #kg per unit
+        self.profit = profit      #expected profit per unit
+        self.max_quantity = max_quantity
+
+def _totals(items, quantities):
+    cost = sum(item.cost * quantity for item, quantity in zip(items, quantities))
+    weight = sum(item.weight * quantity for item, quantity in zip(items, quantities))
+    profit = sum(item.profit * quantity for item, quantity in zip(items, quantities))
+    return cost, weight, profit
+
+def _top_up(items, quantities, budget, capacity):
+    """Adds units greedily (best profit per scarce resource first) while budget and capacity allow."""
+    cost, weight, _ = _totals(items, quantities)
+    def density(index):
+        item = items[index]
+        use = item.cost / budget if budget > 0 else 0
+        if capacity is not None and capacity > 0:
+            use = max(use, item.weight / capacity)
+        return item.profit / use if use > 0 else math.inf
+    for index in sorted(range(len(items)), key=density, reverse=True):
+        item = items[index]
+        room = item.max_quantity - quantities[index]
+        if item.cost > 0:
+            room = min(room, math.floor((budget - cost) / item.cost + 1e-9))
+        if capacity is not None and item.weight > 0:
+            room = min(room, math.floor((capacity - weight) / item.weight + 1e-9))
+        if room > 0:
+            quantities[index] += room
+            cost += room * item.cost
+            weight += room * item.weight
+    return quantities
+
+def greedy_plan(items, budget, capacity):
+    return _top_up(items, [0] * len(items), budget, capacity)
+
+def dp_plan(items, budget, capacity, grid_size: int = GRID_SIZE, deadline: float = None):
+    """Scaled 2D bounded knapsack. Returns the quantities, or None if the deadline passed."""
+    #Split every bounded quantity into 1, 2, 4, ..., rest pieces, so any quantity is a 0/1 choice of pieces
+    pieces = []
+    for index, item in enumerate(items):
+        remaining, size = item.max_quantity, 1
+        while remaining > 0:
+            take = min(size, remaining)
+            pieces.append((index, take))
+            remaining -= take
+            size *= 2
+    if not pieces:
+        return [0] * len(items)
+
+    #Coarser grid when there are many pieces, to stay within the cell budget
+    weighted = capacity is not None
+    cells_per_piece = DP_CELL_BUDGET / len(pieces)
+    grid = int(min(grid_size, math.sqrt(cells_per_piece) if weighted else cells_per_piece))
+    grid = max(grid, 8)
+    #Prices are whole numbers, so a small enough budget gets an exact money axis (step 1)
+    if all(float(item.cost).is_integer() for item in items):
+        money_step = float(max(1, math.ceil(budget / grid)))
+    else:
+        money_step = budget / grid
+    weight_step = capacity / grid if weighted and capacity > 0 else None
+
+    money_size = int(budget / money_step + 1e-9) + 1
+    weight_size = grid + 1 if weight_step else 1
+    best = np.zeros((money_size, weight_size))
+    taken = np.zeros((len(pieces), money_size, weight_size), dtype=bool)
+
+    for p, (index, quantity) in enumerate(pieces):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        item = items[index]
+        money = math.ceil(item.cost * quantity / money_step - 1e-9) if money_step > 0 else 0
+        weight = math.ceil(item.weight * quantity / weight_step - 1e-9) if weight_step else 0
+        if money >= money_size or weight >= weight_size:
+            continue
+        candidate = best[:money_size - money, :weight_size - weight] + item.profit * quantity
+        target = best[money:, weight:]
+        better = candidate > target
+        taken[p, money:, weight:] = better
+        best[money:, weight:] = np.where(better, candidate, target)
+
+    #Walk back from the full budget/capacity cell
+    quantities = [0] * len(items)
+    money, weight = money_size - 1, weight_size - 1
+    for p in range(len(pieces) - 1, -1, -1):
+        if taken[p, money, weight]:
+            index, quantity = pieces[p]
+            item = items[index]
+            quantities[index] += quantity
+            money -= math.ceil(item.cost * quantity / money_step - 1e-9) if money_step > 0 else 0
+            weight -= math.ceil(item.weight * quantity / weight_step - 1e-9) if weight_step else 0
+    return quantities
+
+def plan_cargo(items, budget: float, capacity: float = None, time_budget: float = TIME_BUDGET_SECONDS):
+    """
+    Best quantities of the given items (only profitable ones are considered) for the budget and the free capacity (None = unlimited).
+    Returns {"quantities": {name: quantity}, "cost", "weight", "profit", "method"}.
+    """
+    items = [item for item in items if item.profit > 0 and item.max_quantity > 0]
+    for item in items:
+        if item.cost > 0:
+            item.max_quantity = min(item.max_quantity, math.floor(budget / item.cost + 1e-9))
+        if capacity is not None and item.weight > 0:
+            item.max_quantity = min(item.max_quantity, math.floor(capacity / item.weight + 1e-9))
+    items = [item for item in items if item.max_quantity > 0]
+
+    candidates = [("greedy", greedy_plan(items, budget, capacity))]
+    if budget > 0 and (capacity is None or capacity > 0):
+        quantities = dp_plan(items, budget, capacity, deadline=time.perf_counter() + time_budget)
+        if quantities is not None:
+            candidates.append(("dp", _top_up(items, quantities, budget, capacity)))
+
+    method, quantities = max(candidates, key=lambda candidate: _totals(items, candidate[1])[2])
+    cost, weight, profit = _totals(items, quantities)
+    return {
+        "quantities": {item.name: quantity for item, quantity in zip(items, quantities) if quantity > 0},
+        "cost": round(cost, 2),
+        "weight": round(weight, 3),
+        "profit": round(profit, 2),
+        "method": method,
+    }
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import time
+import uuid
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#In-process cache of the catalog: the entities read on nearly every request that rarely change (transport methods, spawn
+#point metadata, the goods table of every outpost).
+# - Every CatalogCache is bounded by a TTL and an LRU size, and versioned: invalidate() bumps the version, so a load that
+#   started before an invalidation is not kept, and caches derived from an entity can key on its version (see cost_matrix_utils).
+# - Write paths invalidate explicitly. The TTL only bounds how long writes made outside the app stay invisible.
+# - With CATALOG_PUBSUB set ("239.255.42.42:47474"), invalidations are multicast on the loopback interface to the other uvicorn
+#   workers of the host, which drop the same entries. Without it, a worker only sees its own invalidations (and the TTL).
+# - Hits, misses, evictions and invalidations of every cache are in catalog.metrics() (GET /catalog/metrics).
+
+load_dotenv()
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+CATALOG_MAX_ENTRIES = int(os.getenv("CATALOG_MAX_ENTRIES", "1024"))
+CATALOG_PUBSUB = os.getenv("CATALOG_PUBSUB")
+
+class CatalogCache:
+    def __init__(self, name: str, loader, ttl: float = CATALOG_TTL_SECONDS, max_entries: int = CATALOG_MAX_ENTRIES):
+        self.name = name
+        self.loader = loader  #async loader(key), key None for entities cached as a whole
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.entries = OrderedDict()  #key -> (expires_at, value), least recently used first
+        self.catalog = None
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    async def get(self, key=None):
+        cached = self.entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        version = self.version
+        value = await self.loader(key)
+        #Don't keep the result if the entity was invalidated while it was loading
+        if version == self.version:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, key=None, publish: bool = True):
+        """Drops one entry, or all of them when key is None, and tells the other workers."""
+        self.version += 1
+        self.invalidations += 1
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+        if publish and self.catalog is not None:
+            self.catalog.publish(self.name, key)
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class _PubSubProtocol(asyncio.DatagramProtocol):
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def datagram_received(self, data, address):
+        self.catalog.receive(data)
+
+class Catalog:
+    def __init__(self):
+        self.caches = {}
+        self.worker_id = uuid.uuid4().hex
+        self.group = None
+        self.transport = None
+        self.published = self.received = 0
+
+    def register(self, cache: CatalogCache):
+        self.caches[cache.name] = cache
+        cache.catalog = self
+        return cache
+
+    def publish(self, name: str, key):
+        if self.transport is None:
+            return
+        self.transport.sendto(json.dumps({"worker": self.worker_id, "cache": name, "key": key}).encode(), self.group)
+        self.published += 1
+
+    def receive(self, data: bytes):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("worker") == self.worker_id:
+            return  #Multicast loops back to the sender too
+        cache = self.caches.get(message.get("cache"))
+        if cache is not None:
+            self.received += 1
+            cache.invalidate(message.get("key"), publish=False)
+
+    async def start_pubsub(self, address: str = CATALOG_PUBSUB):
+        """Joins the multicast group of address ("group:port") on the loopback interface. No address, no pub/sub."""
+        if not address or self.transport is not None:
+            return
+        group, port = address.rsplit(":", 1)
+        self.group = (group, int(port))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", self.group[1]))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("127.0.0.1")))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton("127.0.0.1"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.setblocking(False)
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: _PubSubProtocol(self), sock=sock)
+
+    def stop_pubsub(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def metrics(self):
+        return {
+            "caches": {name: cache.metrics() for name, cache in self.caches.items()},
+            "pubsub": {"group": f"{self.group[0]}:{self.group[1]}" if self.transport else None, "published": self.published, "received": self.received},
+        }
+
+catalog = Catalog()
+
+#Spawn point metadata, without the goods arrays (see stock_utils) and the trade routes. Key None is the list of all of them.
+SPAWN_POINT_PROJECTION = {"_id": 0, "goods_available": 0, "goods_demanded": 0, "trade_routes": 0}
+
+async def _load_spawn_points(spawn_id):
+    collection = mongo_client["outposts"]["spawn_points"]
+    if spawn_id is None:
+        return await collection.find({}, SPAWN_POINT_PROJECTION).to_list()
+    return await collection.find_one({"id": spawn_id}, SPAWN_POINT_PROJECTION)
+
+spawn_points_cache = catalog.register(CatalogCache("spawn_points", _load_spawn_points))
+
+async def get_spawn_points():
+    return await spawn_points_cache.get()
+
+async def get_spawn_point(spawn_id: str):
+    """Metadata of a spawn point (None if it does not exist). Shared by every caller, do not modify it."""
+    return await spawn_points_cache.get(spawn_id)
@@ -0,0 +1,94 @@
+import numpy as np
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.route_graph_utils import route_graph
+from backend.app.utils.catalog_cache_utils import catalog, CatalogCache
+
+#Cost/time of every route for every transport method, precomputed as NumPy arrays.
+#cost = base_cost_per_km * d + base_cost_per_kg * weight * d, so per route and method it is per_km_cost + weight * per_kg_cost.
+#Both terms are cached, a request only scales the per_kg rows it needs by the player's weight and rounds.
+#
+#The matrix is keyed by (transport methods version, route graph version). add/edit/delete of a transport method bumps the first
+#(invalidate_transport_methods), adding or recomputing routes refreshes the route graph which bumps the second.
+#Transport methods are kept in the catalog cache (catalog_cache_utils), so the first also moves when another worker changes them.
+
+_cost_matrix = None
+_cost_matrix_key = None
+
+class TransportCostMatrix:
+    def __init__(self, routes, transport_methods):
+        self.method_names = [method["name"] for method in transport_methods]
+        self.route_index = {}
+        for row, route in enumerate(routes):
+            self.route_index[(route["source_id"], route["destination_id"])] = row
+            self.route_index[(route["destination_id"], route["source_id"])] = row
+
+        distances = np.array([route["distance"] for route in routes], dtype=np.float64).reshape(-1, 1)
+        base_cost_per_km = self._column(transport_methods, "base_cost_per_km")
+        base_cost_per_kg = self._column(transport_methods, "base_cost_per_kg")
+        speed = self._column(transport_methods, "speed")
+
+        #(routes, methods) each, computed in one pass
+        self.per_km_cost = distances * base_cost_per_km
+        self.per_kg_cost = distances * base_cost_per_kg
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.time = np.round(distances / speed, 0)
+
+    @staticmethod
+    def _column(transport_methods, field):
+        #Missing values become NaN and come out as None in the options
+        return np.array([[method.get(field) if method.get(field) is not None else np.nan for method in transport_methods]], dtype=np.float64)
+
+    def costs(self, weight: float, rows=None):
+        """Cost of the given route rows (all routes if None) for every method, shape (rows, methods)."""
+        if rows is None:
+            return np.round(self.per_km_cost + weight * self.per_kg_cost, 0)
+        return np.round(self.per_km_cost[rows] + weight * self.per_kg_cost[rows], 0)
+
+    def options_for_routes(self, route_pairs, weight: float):
+        """Same output as calculate_transport_cost, for a list of (source_id, destination_id) at once. Unknown routes get None."""
+        rows = [self.route_index.get(pair) for pair in route_pairs]
+        known = [row for row in rows if row is not None]
+        costs = self.costs(weight, known).tolist()
+        times = self.time[known].tolist()
+
+        results, position = [], 0
+        for row in rows:
+            if row is None:
+                results.append(None)
+                continue
+            results.append([
+                {"name": name, "cost": _json_number(cost), "time": _json_number(time)}
+                for name, cost, time in zip(self.method_names, costs[position], times[position])
+            ])
+            position += 1
+        return results
+
+def _json_number(value):
+    return None if value != value or value in (float("inf"), float("-inf")) else value
+
+async def _load_transport_methods(key=None):
+    return await mongo_client["transports"]["transport_methods"].find({}, {"_id": 0}).to_list()
+
+transport_methods_cache = catalog.register(CatalogCache("transport_methods", _load_transport_methods))
+
+async def get_transport_methods():
+    """All transport methods (without _id), from the catalog cache until invalidate_transport_methods is called or the TTL runs out."""
+    return await transport_methods_cache.get()
+
+def invalidate_transport_methods():
+    transport_methods_cache.invalidate()
+
+async def get_cost_matrix():
+    global _cost_matrix, _cost_matrix_key
+    version = transport_methods_cache.version
+    transport_methods = await get_transport_methods()
+    #The key is read after the await: an invalidation during it would otherwise leave a stale matrix under the new version
+    key = (transport_methods_cache.version, route_graph.version)
+    if _cost_matrix is not None and _cost_matrix_key == key:
+        return _cost_matrix
+    cost_matrix = TransportCostMatrix(route_graph.routes, transport_methods)
+    #Only kept if transport_methods are the ones of that version (no invalidation while they were loading)
+    if version == key[0]:
+        _cost_matrix, _cost_matrix_key = cost_matrix, key
+    return cost_matrix
@@ -0,0 +1,175 @@
+import numpy as np
+from geographiclib.geodesic import Geodesic
+
+#Distance engine for routes. Every distance is computed over whole arrays of points in one pass instead of one geopy call per pair.
+#Methods:
+# - "haversine" : spherical earth, fastest, ~0.5% error
+# - "vincenty"  : WGS-84 ellipsoid, vectorized iteration, sub-millimetre agreement with geopy.geodesic
+# - "karney"    : geographiclib, exact (same algorithm as geopy.geodesic), one call per pair, slowest. Kept as reference.
+DISTANCE_METHODS = ("haversine", "vincenty", "karney")
+DEFAULT_DISTANCE_METHOD = "vincenty"
+
+EARTH_MEAN_RADIUS_KM = 6371.0088
+
+#WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_MEAN_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def _karney_km(lat1, lon1, lat2, lon2):
+    inverse = Geodesic.WGS84.Inverse
+    return np.array([inverse(a, b, c, d, Geodesic.DISTANCE)["s12"] for a, b, c, d in zip(lat1, lon1, lat2, lon2)], dtype=np.float64) / 1000
+
+def _vincenty_km(lat1, lon1, lat2, lon2, max_iterations=200, tolerance=1e-12):
+    f, a, b = WGS84_F, WGS84_A, WGS84_B
+
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    for _ in range(max_iterations):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt((cos_U2 * sin_lam) ** 2 + (cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lam) ** 2)
+        cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        #Coincident points give sin_sigma == 0, equatorial lines give cos2_alpha == 0. Divide by 1 there, the numerators are 0 anyway.
+        sin_alpha = cos_U1 * cos_U2 * sin_lam / np.where(sin_sigma == 0, 1, sin_sigma)
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sigma_m = np.where(cos2_alpha == 0, 0, cos_sigma - 2 * sin_U1 * sin_U2 / np.where(cos2_alpha == 0, 1, cos2_alpha))
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_previous = lam
+        lam = L + (1 - C) * f * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        converged = np.abs(lam - lam_previous) < tolerance
+        if converged.all():
+            break
+
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                                   - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distance = b * A * (sigma - delta_sigma) / 1000
+
+    #Vincenty does not converge for nearly antipodal points, those few pairs go through geographiclib
+    if not converged.all():
+        stuck = ~converged
+        distance[stuck] = _karney_km(lat1[stuck], lon1[stuck], lat2[stuck], lon2[stuck])
+    return distance
+
+_DISTANCE_FUNCTIONS = {
+    "haversine": _haversine_km,
+    "vincenty": _vincenty_km,
+    "karney": _karney_km,
+}
+
+def pairwise_distance_km(lats1, lons1, lats2, lons2, method: str = DEFAULT_DISTANCE_METHOD):
+    """Distance in km between (lats1[i], lons1[i]) and (lats2[i], lons2[i]) for every i, as a numpy array."""
+    if method not in _DISTANCE_FUNCTIONS:
+        raise ValueError(f"Unknown distance method {method}. Choose one of {DISTANCE_METHODS}")
+    arrays = [np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (lats1, lons1, lats2, lons2)]
+    return _DISTANCE_FUNCTIONS[method](*arrays)
+
+def segment_distances_km(points, method: str = DEFAULT_DISTANCE_METHOD):
+    """Length in km of every segment of a polyline given as [[lat, lon], ...]. Returns len(points) - 1 values."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 2:
+        return np.zeros(0, dtype=np.float64)
+    return pairwise_distance_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1], method)
+
+def polyline_length_km(points, method: str = DEFAULT_DISTANCE_METHOD):
+    """Total length in km of a polyline given as [[lat, lon], ...], in one batched pass."""
+    return float(segment_distances_km(points, method).sum())
+
+#Route simplification. Every route is stored at full resolution ("route") plus a few simplified levels of detail ("route_levels"),
+#so the map can ask for the level that fits its zoom instead of always downloading every point.
+ROUTE_DETAIL_LEVELS = (50, 500) #Max points per level, "full" is the stored route itself
+
+def _to_local_metres(points):
+    #Sinusoidal projection, x scaled by cos(lat) of each point. Good enough for cross-track distances between nearby route points.
+    lat = np.radians(points[:, 0])
+    lon = np.radians(points[:, 1])
+    return np.column_stack([EARTH_MEAN_RADIUS_KM * 1000 * lon * np.cos(lat), EARTH_MEAN_RADIUS_KM * 1000 * lat])
+
+def douglas_peucker_significance(points):
+    """
+    Runs Douglas-Peucker once over the whole polyline and returns, for every point, the tolerance in metres below which it is kept.
+    End points get infinity. Keeping the points with significance > tolerance gives the usual Douglas-Peucker result for that tolerance,
+    and keeping the n most significant points gives the best n-point shape, so one pass serves every level of detail.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    significance = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return significance
+    significance[0] = significance[-1] = np.inf
+    xy = _to_local_metres(points)
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, parent_significance = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        inner = xy[first + 1:last]
+        segment = end - start
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+        else:
+            distances = np.abs(segment[0] * (inner[:, 1] - start[1]) - segment[1] * (inner[:, 0] - start[0])) / length
+        farthest = int(np.argmax(distances))
+        index = first + 1 + farthest
+        #A point can not be more significant than the split that exposed it, this keeps the levels nested
+        significance[index] = min(distances[farthest], parent_significance)
+        stack.append((first, index, significance[index]))
+        stack.append((index, last, significance[index]))
+    return significance
+
+def simplify_route(points, max_points: int = None, tolerance_m: float = None, significance=None):
+    """
+    Shape-preserving simplification of [[lat, lon], ...]. Give max_points, tolerance_m or both (the stricter one wins).
+    Returns (simplified points, tolerance in metres actually achieved).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 2:
+        return points.tolist(), 0.0
+    if significance is None:
+        significance = douglas_peucker_significance(points)
+    keep = np.ones(len(points), dtype=bool) if tolerance_m is None else significance > tolerance_m
+    keep[[0, -1]] = True
+    if max_points is not None and keep.sum() > max_points:
+        #The max_points most significant points, equal significances in route order, so a tie can't go over the cap
+        ranked = np.argsort(-significance, kind="stable")[:max(max_points, 2)]
+        in_top = np.zeros(len(points), dtype=bool)
+        in_top[ranked] = True
+        keep &= in_top
+    achieved_tolerance = float(significance[~keep].max()) if (~keep).any() else 0.0
+    return points[keep].tolist(), achieved_tolerance
+
+def build_route_levels(points):
+    """Simplified levels for a route, stored on the route document as {"50": {"route": [...], "tolerance_m": ...}, "500": ...}."""
+    significance = douglas_peucker_significance(points)
+    levels = {}
+    for max_points in ROUTE_DETAIL_LEVELS:
+        route, tolerance = simplify_route(points, max_points=max_points, significance=significance)
+        levels[str(max_points)] = {"route": route, "tolerance_m": round(tolerance, 1)}
+    return levels
+
+def route_level_for_zoom(zoom: int = None):
+    """Which stored level a map at this (Leaflet/OSM) zoom should get. None means the full route."""
+    if zoom is None:
+        return None
+    if zoom <= 4:
+        return str(ROUTE_DETAIL_LEVELS[0])
+    if zoom <= 8:
+        return str(ROUTE_DETAIL_LEVELS[1])
+    return None
@@ -0,0 +1,82 @@
+import datetime
+
+from pymongo import UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#Bulk writes of outpost goods (outposts.goods) from the spawn points, in batches of unordered upserts instead of a find_one +
+#update_one/insert_one round trip per good.
+# - sync: adds the quantities of spawn_points.goods_available to the goods ($inc), creating the missing goods.
+# - reseed: sets the goods to exactly what the spawn points list and deletes the goods no spawn point has any more.
+#bulk_upsert_goods takes any (outpost_id, good) source, so a world can be reseeded from something else than the spawn points.
+#goods_available is only written by admins, never from goods (the stock view is derived at read time, see stock_utils), so a
+#sync adds the seed quantities and nothing else.
+
+SYNC_BATCH_SIZE = 1000
+
+def goods_collection():
+    return mongo_client["outposts"]["goods"]
+
+def good_upsert(outpost_id: str, good: dict, now, replace: bool = False):
+    fields = {field: value for field, value in good.items() if field not in ("name", "quantity", "outpost_id", "type", "_id")}
+    fields["last_updated"] = now
+    if "price" in fields:
+        fields.setdefault("base_price", fields["price"])  #the seed price is the base of the dynamic pricing (see pricing_utils)
+    quantity = good.get("quantity", 0)
+    if replace:
+        update = {"$set": {**fields, "quantity": quantity}}
+    else:
+        update = {"$set": fields, "$inc": {"quantity": quantity}}
+    #Filtered on the unique (outpost_id, name) key only, see add_goods
+    update["$setOnInsert"] = {"type": "good"}
+    return UpdateOne({"name": good["name"], "outpost_id": outpost_id}, update, upsert=True)
+
+async def spawn_goods(batch_size: int = SYNC_BATCH_SIZE):
+    """Streams (outpost_id, good) for every good listed in spawn_points.goods_available."""
+    cursor = mongo_client["outposts"]["spawn_points"].find({}, {"_id": 0, "id": 1, "goods_available": 1}).batch_size(batch_size)
+    async for spawn_point in cursor:
+        for good in spawn_point.get("goods_available") or []:
+            yield spawn_point["id"], good
+
+async def bulk_upsert_goods(source, replace: bool = False, batch_size: int = SYNC_BATCH_SIZE):
+    """
+    Upserts the goods of an async iterable of (outpost_id, good) in unordered bulk writes of batch_size.
+    replace=False adds the quantities to the stored ones, replace=True overwrites them.
+    Returns the counts of the bulk results: {"goods", "matched", "modified", "upserted"}.
+    """
+    counts = {"goods": 0, "matched": 0, "modified": 0, "upserted": 0}
+    batch = {}  #(outpost_id, name) -> good, the same good twice in a batch is merged so the unordered upserts do not race
+
+    async def flush():
+        if not batch:
+            return
+        now = datetime.datetime.now()
+        result = await goods_collection().bulk_write([good_upsert(outpost_id, good, now, replace) for (outpost_id, _), good in batch.items()], ordered=False)
+        counts["matched"] += result.matched_count
+        counts["modified"] += result.modified_count
+        counts["upserted"] += result.upserted_count
+        batch.clear()
+
+    async for outpost_id, good in source:
+        counts["goods"] += 1
+        key = (outpost_id, good["name"])
+        if key in batch and not replace:
+            batch[key] = {**good, "quantity": batch[key].get("quantity", 0) + good.get("quantity", 0)}
+        else:
+            batch[key] = dict(good)
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    return counts
+
+async def sync_goods_from_spawns(batch_size: int = SYNC_BATCH_SIZE):
+    return await bulk_upsert_goods(spawn_goods(batch_size), replace=False, batch_size=batch_size)
+
+async def reseed_goods(source=None, batch_size: int = SYNC_BATCH_SIZE):
+    """Full world reseed: the goods become exactly the source (default: the spawn points), the goods not in it are deleted."""
+    started = datetime.datetime.now()
+    counts = await bulk_upsert_goods(source if source is not None else spawn_goods(batch_size), replace=True, batch_size=batch_size)
+    #Every good of the source was just written with a newer last_updated
+    result = await goods_collection().delete_many({"type": "good", "$or": [{"last_updated": {"$lt": started}}, {"last_updated": None}]})
+    counts["deleted"] = result.deleted_count
+    return counts
@@ -1,19 +1,26 @@
-from pydantic import BaseModel, Field, field_validator
-import datetime
-
-class Good(BaseModel):
-    # id: str | None = None
-    name: str
-    # description: str | None = None
-    price: int = Field(gt=0)
-    quantity: int = Field(gt=0)
-    unit: str
-    outpost_id: str
-    last_updated: datetime.datetime | None = None
-
-    # @field_validator("id", mode="before")
-    # @classmethod
-    # def empty_string_to_none(cls, v):
-    #     return v if v != "" else None
-
-
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Union
+import datetime
+
+class Good(BaseModel):
+    # id: str | None = None
+    name: str
+    # description: str | None = None
+    price: int = Field(gt=0)
+    quantity: int = Field(gt=0)
+    unit: str
+    outpost_id: str
+    last_updated: datetime.datetime | None = None
+
+    # @field_validator("id", mode="before")
+    # @classmethod
+    # def empty_string_to_none(cls, v):
+    #     return v if v != "" else None
+
+class MarketEvent(BaseModel):
+    name: str = Field(..., description="Name of the event, e.g. war, drought")
+    region: str = Field(..., description="Region of the spawn points affected")
+    goods: Union[List[str], str] = Field(..., description="Names of the goods affected, or \"*\" for all goods")
+    multiplier: float = Field(..., gt=0, description="Price multiplier while the event is active")
+    starts_at: Optional[datetime.datetime] = None
+    ends_at: Optional[datetime.datetime] = None
@@ -0,0 +1,99 @@
+import gzip
+import itertools
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from backend.app.utils.geo_utils import segment_distances_km, DEFAULT_DISTANCE_METHOD
+
+#Streaming GPX reader. gpxpy.parse builds the whole document in memory, a 500 MB export is several GB of Python objects.
+#Here the XML is parsed incrementally and every track point is thrown away as soon as it is read.
+
+GPX_EXTENSIONS = (".gpx", ".gpx.gz")
+
+def is_gpx_file(file_path: str):
+    return file_path.endswith(GPX_EXTENSIONS)
+
+def _open_gpx(file_path: str):
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rb")
+    return open(file_path, "rb")
+
+def iter_gpx_points(file_path: str):
+    """Yields (latitude, longitude) of every track point (<trkpt>) of a .gpx or .gpx.gz file, in file order."""
+    with _open_gpx(file_path) as f:
+        open_elements = []
+        for event, element in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            if element.tag.rsplit("}", 1)[-1] == "trkpt": #Strip the GPX namespace
+                yield float(element.get("lat")), float(element.get("lon"))
+            #Every finished element is detached from its parent, so at most one branch of the tree is alive at a time
+            if open_elements:
+                open_elements[-1].remove(element)
+
+def iter_gpx_files_points(file_paths):
+    """Chains the points of several GPX files, e.g. a route split over many files of a directory."""
+    for file_path in file_paths:
+        yield from iter_gpx_points(file_path)
+
+
+class RouteAccumulator:
+    """
+    Builds a route from a stream of points in bounded memory.
+
+    - Distance is accumulated chunk by chunk with the vectorized engine, on every point of the stream.
+    - The stored shape is an evenly spaced sample. Points are kept every `stride` points, and when the sample hits 2 * point_count
+      every other point is dropped and the stride doubles. So the sample always has between point_count and 2 * point_count points
+      (fewer for short tracks, which are kept whole), without knowing the total length in advance.
+    - First and last points are always kept.
+    """
+    def __init__(self, point_count: int = 100, method: str = DEFAULT_DISTANCE_METHOD, chunk_size: int = 10000):
+        self.point_count = max(point_count, 2)
+        self.method = method
+        self.chunk_size = chunk_size
+        self.total_distance = 0.0
+        self.total_points = 0
+        self.stride = 1
+        self.sample = []
+        self.last_point = None
+
+    def add_points(self, points):
+        points = iter(points)
+        while True:
+            chunk = list(itertools.islice(points, self.chunk_size))
+            if not chunk:
+                break
+            self._add_chunk(chunk)
+        return self
+
+    def _add_chunk(self, chunk):
+        array = np.asarray(chunk, dtype=np.float64)
+        if self.last_point is not None:
+            array = np.vstack([self.last_point, array])
+        self.total_distance += float(segment_distances_km(array, self.method).sum())
+
+        for point in chunk:
+            if self.total_points % self.stride == 0:
+                self.sample.append(point)
+                if len(self.sample) >= 2 * self.point_count:
+                    self.sample = self.sample[::2]
+                    self.stride *= 2
+            self.total_points += 1
+        self.last_point = chunk[-1]
+
+    def route(self):
+        """Sampled route as a list of (lat, lon), ending on the last point of the stream."""
+        if self.last_point is None:
+            return []
+        if self.sample[-1] != self.last_point:
+            return self.sample + [self.last_point]
+        return list(self.sample)
+
+def build_route_from_gpx(file_paths, point_count: int = 100, method: str = DEFAULT_DISTANCE_METHOD):
+    """Streams the given GPX files into a RouteAccumulator. Returns (sampled route, distance in km over all points)."""
+    accumulator = RouteAccumulator(point_count=point_count, method=method)
+    accumulator.add_points(iter_gpx_files_points(file_paths))
+    return accumulator.route(), accumulator.total_distance
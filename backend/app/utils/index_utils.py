@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+
+from pymongo.errors import OperationFailure
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#Every index the app relies on, in one place, created once at startup (ensure_indexes in the app lifespan) instead of inside
+#request handlers. create_index is a no-op for an index that already exists with the same spec.
+#An index that can't be built (duplicates under a unique spec, an index of the same name with other options) does not stop the
+#app: it is reported, and the report command below shows it until it is fixed by hand.
+#
+#Report: python -m backend.app.utils.index_utils [--apply] lists the missing/conflicting indexes and the ones not in the
+#registry, and runs explain() on the hot query of every router to check it is an IXSCAN (and whether it is covered).
+
+INDEXES = [
+    #users
+    {"db": "users", "collection": "metaverse_users", "keys": [("username", 1)], "unique": True},
+    {"db": "users", "collection": "inventory", "keys": [("username", 1), ("good_id", 1)], "unique": True},
+    {"db": "users", "collection": "avatars", "keys": [("id", 1)], "unique": True},
+    #outposts - goods is the source of truth of the stock (see stock_utils), one document per good and outpost
+    {"db": "outposts", "collection": "goods", "keys": [("outpost_id", 1), ("name", 1)], "unique": True},
+    {"db": "outposts", "collection": "spawn_points", "keys": [("id", 1)], "unique": True},
+    #transports - routes are looked up in both directions, each branch of the $or uses the same index
+    {"db": "transports", "collection": "routes", "keys": [("source_id", 1), ("destination_id", 1)]},
+    {"db": "transports", "collection": "transport_methods", "keys": [("name", 1)], "unique": True},
+    #trades - keyset pagination of the history (see trade_history_utils) and candles (see candles_utils)
+    {"db": "trades", "collection": "purchases", "keys": [("username", 1), ("created_at", -1), ("_id", -1)]},
+    {"db": "trades", "collection": "purchases", "keys": [("outpost_id", 1), ("created_at", -1), ("_id", -1)]},
+    {"db": "trades", "collection": "purchases", "keys": [("good_id", 1), ("created_at", -1), ("_id", -1)]},
+    {"db": "trades", "collection": "purchases", "keys": [("created_at", -1), ("_id", -1)]},
+    {"db": "trades", "collection": "candles", "keys": [("interval", 1), ("outpost_id", 1), ("good_id", 1), ("start", 1)], "unique": True},
+    #trades - used quote tokens, dropped by MongoDB once expired (see quote_utils)
+    {"db": "trades", "collection": "used_quotes", "keys": [("expires_at", 1)], "expire_after_seconds": 0},
+    #trades - fills logged after an order book snapshot, replayed on startup (see order_book_utils)
+    {"db": "trades", "collection": "fills", "keys": [("outpost_id", 1), ("good_id", 1), ("fill_sequence", 1)]},
+]
+
+#The query each router runs the most, as the code runs it (filter, projection, sort, limit)
+HOT_QUERIES = [
+    {"router": "users/transports", "db": "users", "collection": "metaverse_users", "filter": {"username": "explain"},
+     "projection": {"_id": 0, "current_outpost_id": 1, "money": 1, "merchandise_weight": 1}},
+    {"router": "users", "db": "users", "collection": "inventory", "filter": {"username": "explain", "good_id": "explain", "quantity": {"$gte": 1}}},
+    {"router": "users", "db": "users", "collection": "avatars", "filter": {"id": "explain"}, "projection": {"_id": 0, "created_at": 0}},
+    {"router": "trades", "db": "outposts", "collection": "goods", "filter": {"name": "explain", "outpost_id": "explain", "quantity": {"$gte": 1}},
+     "projection": {"_id": 0, "price": 1, "unit": 1}},
+    {"router": "goods", "db": "outposts", "collection": "goods", "filter": {"outpost_id": "explain"},
+     "projection": {"_id": 0, "name": 1, "price": 1, "unit": 1, "quantity": 1}},
+    {"router": "outposts", "db": "outposts", "collection": "spawn_points", "filter": {"id": "explain"}},
+    {"router": "transports", "db": "transports", "collection": "routes",
+     "filter": {"$or": [{"source_id": "a", "destination_id": "b"}, {"source_id": "b", "destination_id": "a"}]}},
+    {"router": "transports", "db": "transports", "collection": "transport_methods", "filter": {"name": "explain"}},
+    {"router": "trades", "db": "trades", "collection": "purchases", "filter": {"username": "explain"},
+     "sort": [("created_at", -1), ("_id", -1)], "limit": 51},
+    {"router": "trades", "db": "trades", "collection": "candles", "filter": {"interval": "1h", "outpost_id": "explain", "good_id": "explain"},
+     "projection": {"_id": 0, "start": 1, "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}, "sort": [("start", 1)], "limit": 5000},
+]
+
+def index_name(keys):
+    #Same name MongoDB would generate
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def _same_spec(existing: dict, spec: dict):
+    #index_information may give directions as floats (1.0)
+    keys = [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in existing.get("key", [])]
+    return (keys == [tuple(key) for key in spec["keys"]] and bool(existing.get("unique")) == bool(spec.get("unique"))
+            and existing.get("expireAfterSeconds") == spec.get("expire_after_seconds"))
+
+async def ensure_indexes(specs=INDEXES):
+    """Creates the registered indexes. Returns [{"index", "status": "exists" | "created" | "failed", "message"}]."""
+    results = []
+    for spec in specs:
+        collection = mongo_client[spec["db"]][spec["collection"]]
+        name = index_name(spec["keys"])
+        label = f"{spec['db']}.{spec['collection']}.{name}"
+        try:
+            existing = (await collection.index_information()).get(name)
+            if existing is not None and _same_spec(existing, spec):
+                results.append({"index": label, "status": "exists"})
+                continue
+            options = {"expireAfterSeconds": spec["expire_after_seconds"]} if spec.get("expire_after_seconds") is not None else {}
+            await collection.create_index(spec["keys"], name=name, unique=bool(spec.get("unique")), **options)
+            results.append({"index": label, "status": "created"})
+        except OperationFailure as e:
+            #Duplicate keys under a unique spec, or the same name/keys with other options
+            print(f"Index {label} could not be created: {e}")
+            results.append({"index": label, "status": "failed", "message": str(e)})
+    return results
+
+async def missing_indexes(specs=INDEXES):
+    """Registered indexes that are absent or differ from the registry, and existing indexes that are not registered."""
+    missing, unregistered = [], []
+    collections = {}
+    for spec in specs:
+        collections.setdefault((spec["db"], spec["collection"]), []).append(spec)
+    for (db, collection_name), collection_specs in collections.items():
+        information = await mongo_client[db][collection_name].index_information()
+        for spec in collection_specs:
+            existing = information.get(index_name(spec["keys"]))
+            if existing is None:
+                missing.append({"index": f"{db}.{collection_name}.{index_name(spec['keys'])}", "problem": "missing"})
+            elif not _same_spec(existing, spec):
+                missing.append({"index": f"{db}.{collection_name}.{index_name(spec['keys'])}", "problem": "different options", "existing": existing})
+        registered = {index_name(spec["keys"]) for spec in collection_specs} | {"_id_"}
+        unregistered += [f"{db}.{collection_name}.{name}" for name in information if name not in registered]
+    return missing, unregistered
+
+def _plan_stages(plan, stages):
+    """Stage names and index names of a winning plan, depth first."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append((plan["stage"], plan.get("indexName")))
+        for key in ("queryPlan", "inputStage", "inputStages", "outerStage", "innerStage"):
+            if key in plan:
+                _plan_stages(plan[key], stages)
+    elif isinstance(plan, list):
+        for item in plan:
+            _plan_stages(item, stages)
+    return stages
+
+async def explain_query(query: dict):
+    cursor = mongo_client[query["db"]][query["collection"]].find(query["filter"], query.get("projection"))
+    if query.get("sort"):
+        cursor = cursor.sort(query["sort"])
+    if query.get("limit"):
+        cursor = cursor.limit(query["limit"])
+    explanation = await cursor.explain()
+    stages = _plan_stages(explanation["queryPlanner"]["winningPlan"], [])
+    names = [stage for stage, _ in stages]
+    ixscan = any(stage in ("IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "EXPRESS_IDHACK") for stage in names)
+    return {
+        "router": query["router"],
+        "collection": f"{query['db']}.{query['collection']}",
+        "filter": query["filter"],
+        "stages": names,
+        "indexes": sorted({index for _, index in stages if index}),
+        "ixscan": ixscan and "COLLSCAN" not in names,
+        #Covered: answered from the index alone, no document fetched
+        "covered": ixscan and "FETCH" not in names and "COLLSCAN" not in names,
+    }
+
+async def index_report(apply: bool = False):
+    created = await ensure_indexes() if apply else None
+    missing, unregistered = await missing_indexes()
+    queries = [await explain_query(query) for query in HOT_QUERIES]
+    return {"applied": created, "missing": missing, "unregistered": unregistered, "queries": queries}
+
+async def _main(apply: bool):
+    try:
+        report = await index_report(apply)
+    finally:
+        await mongo_client.close()
+    for problem in report["missing"]:
+        print(f"MISSING     {problem['index']} ({problem['problem']})")
+    for name in report["unregistered"]:
+        print(f"UNREGISTERED {name} (not in the registry, can be dropped if nothing uses it)")
+    for query in report["queries"]:
+        verdict = "COVERED" if query["covered"] else "IXSCAN " if query["ixscan"] else "NO INDEX"
+        print(f"{verdict:8s} {query['router']:16s} {query['collection']:28s} {' > '.join(query['stages'])} {query['indexes']} {json.dumps(query['filter'], default=str)}")
+    return 1 if report["missing"] or not all(query["ixscan"] for query in report["queries"]) else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports missing indexes and explains the hot query of every router.")
+    parser.add_argument("--apply", action="store_true", help="create the missing indexes first")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(_main(args.apply)))
@@ -0,0 +1,123 @@
+import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#Player inventory, one document per (username, good_id) in users.inventory:
+#  {username, good_id, quantity, average_price, unit, recent_trade_ids, created_at, updated_at, inventory_migrated}
+#Trades only touch the row of the good traded, with $inc, so their cost does not depend on how much the player owns.
+#recent_trade_ids keeps the last RECENT_TRADES_WINDOW trades only, the full lineage is in the trade ledger (trades.purchases).
+#Money and merchandise_weight stay on the user document.
+
+RECENT_TRADES_WINDOW = 20
+MIGRATION_BATCH_SIZE = 500
+
+def inventory_collection():
+    return mongo_client["users"]["inventory"]
+
+def add_to_inventory(username: str, good_id: str, quantity: int, total_price: float, unit: str, trade_id: str, now):
+    """
+    Upsert adding bought goods to an inventory row. average_price is recomputed server side from the stored quantity/average_price,
+    so concurrent buys of the same good stay correct.
+    """
+    previous_quantity = {"$ifNull": ["$quantity", 0]}
+    new_quantity = {"$add": [previous_quantity, quantity]}
+    recent_trade_ids = {"$ifNull": ["$recent_trade_ids", []]}
+    if trade_id is not None:
+        recent_trade_ids = {"$slice": [{"$concatArrays": [recent_trade_ids, [trade_id]]}, -RECENT_TRADES_WINDOW]}
+    return UpdateOne({"username": username, "good_id": good_id}, [{"$set": {
+        "quantity": new_quantity,
+        "average_price": {"$divide": [{"$add": [{"$multiply": [previous_quantity, {"$ifNull": ["$average_price", 0]}]}, total_price]}, new_quantity]},
+        "unit": {"$ifNull": ["$unit", {"$literal": unit}]},
+        "recent_trade_ids": recent_trade_ids,
+        "created_at": {"$ifNull": ["$created_at", now]},
+        "updated_at": now,
+    }}], upsert=True)
+
+def take_from_inventory(quantity: int, trade_id: str, now):
+    """Update part of a guarded take, to use with the filter {"username", "good_id", "quantity": {"$gte": quantity}}."""
+    update = {"$inc": {"quantity": -quantity}, "$set": {"updated_at": now}}
+    if trade_id is not None:
+        update["$push"] = {"recent_trade_ids": {"$each": [trade_id], "$slice": -RECENT_TRADES_WINDOW}}
+    return update
+
+def inventory_filter(username: str, good_id: str, quantity: int = 0):
+    return {"username": username, "good_id": good_id, "quantity": {"$gte": quantity}}
+
+async def get_inventory(username: str):
+    """{good_id: row} of a player, without the empty rows."""
+    rows = await inventory_collection().find({"username": username, "quantity": {"$gt": 0}}, {"_id": 0, "username": 0, "inventory_migrated": 0}).to_list()
+    return {row.pop("good_id"): row for row in rows}
+
+def merge_inventory_item(username: str, good_id: str, item: dict, now):
+    """
+    Upsert merging an embedded inventory item into the row of the good: the quantities add up and average_price is the weighted
+    average of both. The row is marked inventory_migrated, a row already marked is left as is, so a rerun does not add twice.
+    """
+    quantity = item.get("quantity", 0)
+    average_price = item.get("average_price", 0)
+    migrated = {"$eq": [{"$ifNull": ["$inventory_migrated", False]}, True]}
+    previous_quantity = {"$ifNull": ["$quantity", 0]}
+    new_quantity = {"$add": [previous_quantity, quantity]}
+    new_average_price = {"$cond": [
+        {"$gt": [new_quantity, 0]},
+        {"$divide": [{"$add": [{"$multiply": [previous_quantity, {"$ifNull": ["$average_price", 0]}]}, quantity * average_price]}, new_quantity]},
+        {"$ifNull": ["$average_price", average_price]}
+    ]}
+    #The embedded trades are older than the ones of the row
+    recent_trade_ids = {"$slice": [{"$concatArrays": [{"$literal": item.get("trade_ids") or []}, {"$ifNull": ["$recent_trade_ids", []]}]}, -RECENT_TRADES_WINDOW]}
+    return UpdateOne({"username": username, "good_id": good_id}, [{"$set": {
+        "quantity": {"$cond": [migrated, "$quantity", new_quantity]},
+        "average_price": {"$cond": [migrated, "$average_price", new_average_price]},
+        "unit": {"$ifNull": ["$unit", {"$literal": item.get("unit", "kg")}]},
+        "recent_trade_ids": {"$cond": [migrated, "$recent_trade_ids", recent_trade_ids]},
+        "created_at": {"$ifNull": ["$created_at", item.get("created_at", now)]},
+        "updated_at": {"$cond": [migrated, "$updated_at", now]},
+        "inventory_migrated": True,
+    }}], upsert=True)
+
+async def migrate_inventory(batch_size: int = MIGRATION_BATCH_SIZE):
+    """
+    Merges the embedded "inventory" dict of every user document into the users.inventory rows (see merge_inventory_item) and
+    removes it from the user once all the rows of the user are written. Safe to rerun: users whose rows failed keep their
+    "inventory" and are retried, and rows already merged are not merged twice.
+    """
+    #Rows rely on the unique (username, good_id) index, created at startup (see index_utils)
+    users_collection = mongo_client["users"]["metaverse_users"]
+
+    migrated_users, migrated_rows, failed_users = 0, 0, 0
+    rows, row_users, user_ids = [], [], []  #row_users[i] is the _id of the user of rows[i]
+
+    async def flush():
+        nonlocal migrated_users, migrated_rows, failed_users
+        failed = set()
+        if rows:
+            try:
+                await inventory_collection().bulk_write(rows, ordered=False)
+            except BulkWriteError as e:
+                failed = {row_users[error["index"]] for error in e.details.get("writeErrors", [])}
+                if e.details.get("writeConcernErrors"):
+                    failed = set(user_ids)
+        done = [user_id for user_id in user_ids if user_id not in failed]
+        if done:
+            await users_collection.update_many({"_id": {"$in": done}}, {"$unset": {"inventory": ""}})
+        migrated_users += len(done)
+        migrated_rows += sum(1 for user_id in row_users if user_id not in failed)
+        failed_users += len(failed)
+        rows.clear()
+        row_users.clear()
+        user_ids.clear()
+
+    cursor = users_collection.find({"inventory": {"$exists": True}}, {"_id": 1, "username": 1, "inventory": 1}).batch_size(batch_size)
+    async for user in cursor:
+        now = datetime.datetime.now()
+        for good_id, item in (user.get("inventory") or {}).items():
+            rows.append(merge_inventory_item(user["username"], good_id, item, now))
+            row_users.append(user["_id"])
+        user_ids.append(user["_id"])
+        if len(user_ids) >= batch_size:
+            await flush()
+    await flush()
+    return {"users": migrated_users, "rows": migrated_rows, "failed_users": failed_users}
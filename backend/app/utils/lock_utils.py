@@ -0,0 +1,35 @@
+import datetime
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#Leases shared by the uvicorn workers (and the scripts run next to them), one document per lock in jobs.locks:
+#  {_id: name, owner, expires_at}
+#A lease is taken if it does not exist, has expired, or is already held by the same owner (which extends it). Taking a lease
+#held by someone else fails on the unique _id of the upsert, so two workers can never both get it. A lease that is not released
+#(crashed worker) frees itself at expires_at.
+
+WORKER_ID = uuid.uuid4().hex  #owner of the leases taken by this process
+
+def locks_collection():
+    return mongo_client["jobs"]["locks"]
+
+async def acquire_lock(name: str, seconds: float, owner: str = WORKER_ID):
+    """Takes or extends the lease name for seconds. Returns False if another owner holds it."""
+    now = datetime.datetime.now()
+    try:
+        await locks_collection().update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lte": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + datetime.timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def release_lock(name: str, owner: str = WORKER_ID):
+    """Gives the lease back, if owner still holds it."""
+    result = await locks_collection().delete_one({"_id": name, "owner": owner})
+    return result.deleted_count == 1
@@ -1,26 +1,36 @@
-# import pymongo
-import os
-from dotenv import load_dotenv
-from pymongo import MongoClient
-
-load_dotenv()
-#From this env file .env, read mongodb user and password
-mongodb_username = os.getenv("MONGODB_USERNAME")
-mongodb_password = os.getenv("MONGODB_PASSWORD")
-
-def get_mongo_client():
-    # print("confirmation mongo_utils")
-    try:
-        mongo_client = MongoClient(
-                                    host = "mongodb://mongodb-metaverse:27017/",
-                                   username = mongodb_username,
-                                   password = mongodb_password,
-                                   authSource='admin',
-                                    )
-        print("MongoDB connection successful")
-        return mongo_client
-    except Exception as e:
-        print(e)
-        return None
-
-mongo_client = get_mongo_client()    
\ No newline at end of file
+# import pymongo
+import os
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient
+
+load_dotenv()
+#From this env file .env, read mongodb user and password
+mongodb_username = os.getenv("MONGODB_USERNAME")
+mongodb_password = os.getenv("MONGODB_PASSWORD")
+
+def get_mongo_client():
+    # print("confirmation mongo_utils")
+    #AsyncMongoClient does not touch the network until the first operation, so it is safe to build at import time.
+    #The actual connect/close is done once in the app lifespan (see main.py), every router shares this client.
+    try:
+        mongo_client = AsyncMongoClient(
+                                    host = "mongodb://mongodb-metaverse:27017/",
+                                   username = mongodb_username,
+                                   password = mongodb_password,
+                                   authSource='admin',
+                                    )
+        return mongo_client
+    except Exception as e:
+        print(e)
+        return None
+
+async def connect_mongo_client():
+    #Called on app startup. Forces the connection pool to come up before the first request arrives.
+    await mongo_client.admin.command("ping")
+    print("MongoDB connection successful")
+
+async def close_mongo_client():
+    #Called on app shutdown.
+    await mongo_client.close()
+
+mongo_client = get_mongo_client()
@@ -0,0 +1,349 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import os
+import time
+import uuid
+
+from dotenv import load_dotenv
+from pymongo import ReplaceOne, UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.trade_ledger_utils import TradeLedger
+from backend.app.utils.transports_utils import calculate_good_weight
+from backend.app.utils.inventory_utils import add_to_inventory
+from backend.app.utils.candles_utils import apply_candles
+from backend.app.utils.lock_utils import acquire_lock, release_lock, WORKER_ID
+
+load_dotenv()
+
+#Limit order book per (outpost_id, good) with price-time priority.
+# - Bids and asks are heaps of (price key, sequence, order). Best price first, then the oldest order at that price.
+# - Cancel is O(1): the order is flagged and dropped from the index, its heap entry is skipped when it reaches the top
+#   (and the heap is compacted once stale entries outnumber live ones).
+# - A fill is at the resting (maker) order's price. A buyer whose limit was higher gets the difference back.
+#
+#Persistence: every fill goes to the append-only trades.fills log (write-behind, see trade_ledger_utils), and the books are
+#snapshotted to trades.order_books every ORDER_BOOK_SNAPSHOT_SECONDS, on shutdown, and by the order endpoints before they answer
+#(so the escrow of a resting order is not lost in a crash). Every fill carries the book's fill_sequence and the snapshot the
+#last one it includes: on startup the books are rebuilt from the snapshots, then the fills logged after them are replayed, so an
+#order filled after its snapshot can't fill a second time.
+#
+#One worker: the books live in the memory of one process. The worker holding the "order_books" lease (see lock_utils) loads and
+#serves them, the order endpoints of the other workers answer 503. The holder renews the lease every third of
+#ORDER_BOOK_LEASE_SECONDS and counts it as lost as soon as a renewal is late, before anyone else can take it. The other workers
+#keep trying to take it, so the books move to another worker (rebuilt from the snapshots and fills) when their holder is gone.
+#
+#Fills are trades between two players and are only kept in trades.fills: they feed the candles (apply_candles hook, and
+#backfill_candles reads both logs), but not trades.purchases, so they are not in the trade history and rollups of trade_history_utils.
+
+ORDER_SIDES = ("buy", "sell")
+ORDER_BOOK_SNAPSHOT_SECONDS = float(os.getenv("ORDER_BOOK_SNAPSHOT_SECONDS", "1"))
+ORDER_BOOK_LEASE_SECONDS = float(os.getenv("ORDER_BOOK_LEASE_SECONDS", "30"))
+ORDER_BOOK_LEASE = "order_books"
+
+class Order:
+    __slots__ = ("order_id", "username", "side", "price", "quantity", "remaining", "unit", "sequence", "created_at", "active")
+
+    def __init__(self, order_id, username, side, price, quantity, unit, sequence, created_at, remaining=None):
+        self.order_id = order_id
+        self.username = username
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.remaining = quantity if remaining is None else remaining
+        self.unit = unit
+        self.sequence = sequence
+        self.created_at = created_at
+        self.active = True
+
+    def to_dict(self):
+        return {"order_id": self.order_id, "username": self.username, "side": self.side, "price": self.price, "quantity": self.quantity,
+                "remaining": self.remaining, "unit": self.unit, "sequence": self.sequence, "created_at": self.created_at}
+
+class OrderBook:
+    def __init__(self, outpost_id: str, good: str):
+        self.outpost_id = outpost_id
+        self.good = good
+        self.bids = []    #heap of (-price, sequence, order)
+        self.asks = []    #heap of (price, sequence, order)
+        self.orders = {}  #order_id -> live resting order
+        self.stale = 0    #cancelled or filled entries still sitting in the heaps
+        self.fill_sequence = 0  #number of the last fill of this book
+
+    def _best(self, heap):
+        while heap and not heap[0][2].active:
+            heapq.heappop(heap)
+            self.stale -= 1
+        return heap[0][2] if heap else None
+
+    def best_bid(self):
+        return self._best(self.bids)
+
+    def best_ask(self):
+        return self._best(self.asks)
+
+    def _rest(self, order):
+        heap = self.bids if order.side == "buy" else self.asks
+        heapq.heappush(heap, (-order.price if order.side == "buy" else order.price, order.sequence, order))
+        self.orders[order.order_id] = order
+
+    def submit(self, order: Order, now=None):
+        """Matches the order against the opposite side, rests what is left. Returns the fills, oldest first."""
+        fills = []
+        buying = order.side == "buy"
+        opposite = self.asks if buying else self.bids
+        while order.remaining > 0:
+            best = self._best(opposite)
+            if best is None or (best.price > order.price if buying else best.price < order.price):
+                break
+            quantity = min(order.remaining, best.remaining)
+            order.remaining -= quantity
+            best.remaining -= quantity
+            buy, sell = (order, best) if buying else (best, order)
+            self.fill_sequence += 1
+            fills.append({
+                "trade_id": uuid.uuid4().hex,
+                "outpost_id": self.outpost_id,
+                "good_id": self.good,
+                "price": best.price,
+                "unit_price": best.price,
+                "quantity": quantity,
+                "buy_order_id": buy.order_id,
+                "sell_order_id": sell.order_id,
+                "buyer": buy.username,
+                "seller": sell.username,
+                "buyer_limit": buy.price,
+                "unit": sell.unit or buy.unit,
+                "taker_side": order.side,
+                "fill_sequence": self.fill_sequence,
+                "created_at": now,
+            })
+            if best.remaining == 0:
+                best.active = False
+                del self.orders[best.order_id]
+                heapq.heappop(opposite)
+        if order.remaining > 0:
+            self._rest(order)
+        else:
+            order.active = False
+        return fills
+
+    def replay_fill(self, fill: dict):
+        """Applies a logged fill that the snapshot does not include: the resting orders it filled lose its quantity."""
+        for order_id in (fill.get("buy_order_id"), fill.get("sell_order_id")):
+            order = self.orders.get(order_id)
+            if order is None:
+                continue
+            order.remaining -= fill["quantity"]
+            if order.remaining <= 0:
+                self.cancel(order_id)
+        self.fill_sequence = max(self.fill_sequence, fill.get("fill_sequence", 0))
+
+    def cancel(self, order_id: str):
+        """Removes a resting order. Returns it (with what was left unfilled), or None if it is not resting in this book."""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        order.active = False
+        self.stale += 1
+        if self.stale > len(self.orders):
+            self._compact()
+        return order
+
+    def _compact(self):
+        self.bids = [entry for entry in self.bids if entry[2].active]
+        self.asks = [entry for entry in self.asks if entry[2].active]
+        heapq.heapify(self.bids)
+        heapq.heapify(self.asks)
+        self.stale = 0
+
+    def depth(self, levels: int = 10):
+        """Aggregated quantity per price level, best first, for both sides."""
+        def side_levels(side):
+            by_price = {}
+            for order in self.orders.values():
+                if order.side == side:
+                    by_price[order.price] = by_price.get(order.price, 0) + order.remaining
+            prices = sorted(by_price, reverse=side == "buy")[:levels]
+            return [{"price": price, "quantity": by_price[price]} for price in prices]
+        return {"bids": side_levels("buy"), "asks": side_levels("sell")}
+
+    def snapshot(self):
+        return {
+            "_id": f"{self.outpost_id}:{self.good}",
+            "outpost_id": self.outpost_id,
+            "good_id": self.good,
+            "fill_sequence": self.fill_sequence,
+            "orders": [order.to_dict() for order in sorted(self.orders.values(), key=lambda order: order.sequence)],
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict):
+        book = cls(snapshot["outpost_id"], snapshot["good_id"])
+        book.fill_sequence = snapshot.get("fill_sequence", 0)
+        for order in snapshot.get("orders", []):
+            book._rest(Order(order["order_id"], order["username"], order["side"], order["price"], order["quantity"], order.get("unit"),
+                             order["sequence"], order.get("created_at"), remaining=order["remaining"]))
+        return book
+
+class OrderBooks:
+    """Every order book of the process, plus the sequence counter that gives price-time priority across restarts."""
+    def __init__(self):
+        self.books = {}   #(outpost_id, good) -> OrderBook
+        self.dirty = set()
+        self.sequence = itertools.count(1)
+        self.saving = asyncio.Lock()  #snapshots are built and written one save at a time, so an older one never overwrites a newer one
+        self.fill_ledger = TradeLedger(collection_name="fills", on_written=(apply_candles,), spill_path=os.getenv("FILL_LEDGER_SPILL_PATH", "fill_ledger_spill.jsonl"))
+        self.lease_expires = 0  #time.monotonic() until which this worker surely holds the order_books lease
+
+    def serving(self):
+        """True while this worker holds the order_books lease, so its books are the ones in use."""
+        return time.monotonic() < self.lease_expires
+
+    def book(self, outpost_id: str, good: str):
+        key = (outpost_id, good)
+        if key not in self.books:
+            self.books[key] = OrderBook(outpost_id, good)
+        return self.books[key]
+
+    def new_order(self, username: str, side: str, price: float, quantity: int, unit: str = None, now=None):
+        return Order(uuid.uuid4().hex, username, side, price, quantity, unit, next(self.sequence), now)
+
+    def submit(self, outpost_id: str, good: str, order: Order, now=None):
+        """Matches the order and queues its fills for the fill log. Synchronous, so no other request interleaves with a match."""
+        fills = self.book(outpost_id, good).submit(order, now)
+        self.dirty.add((outpost_id, good))
+        for fill in fills:
+            self.fill_ledger.record(dict(fill))
+        return fills
+
+    def cancel(self, outpost_id: str, good: str, order_id: str):
+        book = self.books.get((outpost_id, good))
+        order = book.cancel(order_id) if book else None
+        if order is not None:
+            self.dirty.add((outpost_id, good))
+        return order
+
+    async def save_snapshots(self):
+        """Snapshots the books changed since the last call, one bulk_write."""
+        async with self.saving:
+            if not self.dirty:
+                return 0
+            dirty, self.dirty = self.dirty, set()
+            now = datetime.datetime.now()
+            try:
+                await mongo_client["trades"]["order_books"].bulk_write(
+                    [ReplaceOne({"_id": f"{outpost_id}:{good}"}, {**self.books[(outpost_id, good)].snapshot(), "updated_at": now}, upsert=True)
+                     for outpost_id, good in dirty],
+                    ordered=False
+                )
+            except Exception:
+                self.dirty |= dirty
+                raise
+            return len(dirty)
+
+    async def load_snapshots(self):
+        #Whatever this worker had in memory is dropped, the snapshots are the latest state
+        self.books, self.dirty = {}, set()
+        last_sequence = 0
+        async for snapshot in mongo_client["trades"]["order_books"].find({}):
+            book = OrderBook.from_snapshot(snapshot)
+            self.books[(book.outpost_id, book.good)] = book
+            last_sequence = max([last_sequence] + [order["sequence"] for order in snapshot.get("orders", [])])
+        self.sequence = itertools.count(last_sequence + 1)
+        await self.replay_fills()
+        return len(self.books)
+
+    async def replay_fills(self, chunk_size: int = 100):
+        """Replays the fills logged after the snapshot of every book (fill_sequence above the snapshot's). Returns how many."""
+        fills_collection = mongo_client["trades"]["fills"]
+        books = list(self.books.values())
+        replayed = 0
+        for start in range(0, len(books), chunk_size):
+            chunk = books[start:start + chunk_size]
+            query = {"$or": [{"outpost_id": book.outpost_id, "good_id": book.good, "fill_sequence": {"$gt": book.fill_sequence}} for book in chunk]}
+            async for fill in fills_collection.find(query).sort("fill_sequence", 1):
+                book = self.books[(fill["outpost_id"], fill["good_id"])]
+                if fill["fill_sequence"] > book.fill_sequence:
+                    book.replay_fill(fill)
+                    self.dirty.add((book.outpost_id, book.good))
+                    replayed += 1
+        if replayed:
+            print(f"Order books: replayed {replayed} fills logged after the last snapshots")
+        return replayed
+
+order_books = OrderBooks()
+
+def settlement_updates(fills, now):
+    """
+    (metaverse_users updates, users.inventory updates) that settle fills. Money and goods of an order are escrowed when it is
+    placed, so a fill only pays out: the seller gets price * quantity, the buyer gets the goods plus the refund of
+    (limit - fill price) * quantity.
+    """
+    user_updates, inventory_updates = [], []
+    for fill in fills:
+        good_id, quantity, price, unit = fill["good_id"], fill["quantity"], fill["price"], fill["unit"] or "kg"
+        inventory_updates.append(add_to_inventory(fill["buyer"], good_id, quantity, price * quantity, unit, fill["trade_id"], now))
+        user_updates.append(UpdateOne({"username": fill["buyer"]}, {"$inc": {
+            "money": (fill["buyer_limit"] - price) * quantity,
+            "merchandise_weight": calculate_good_weight(good_id, unit, quantity)
+        }}))
+        user_updates.append(UpdateOne({"username": fill["seller"]}, {"$inc": {"money": price * quantity}}))
+    return user_updates, inventory_updates
+
+def refund_updates(good_id: str, order: Order, now):
+    """(metaverse_users updates, users.inventory updates) giving back the escrow of the unfilled part of a cancelled order."""
+    if order.side == "buy":
+        return [UpdateOne({"username": order.username}, {"$inc": {"money": order.price * order.remaining}})], []
+    return (
+        [UpdateOne({"username": order.username}, {"$inc": {"merchandise_weight": calculate_good_weight(good_id, order.unit or "kg", order.remaining)}})],
+        [UpdateOne({"username": order.username, "good_id": good_id}, {"$inc": {"quantity": order.remaining}, "$set": {"updated_at": now}}, upsert=True)]
+    )
+
+async def renew_order_books_lease():
+    """Takes or renews the order_books lease. A worker that takes it loads the books. Returns whether this worker serves them."""
+    started = time.monotonic()
+    serving = order_books.serving()
+    if not await acquire_lock(ORDER_BOOK_LEASE, ORDER_BOOK_LEASE_SECONDS):
+        if serving:
+            print("Order books: lease taken by another worker, order endpoints disabled")
+        order_books.lease_expires = 0
+        return False
+    if not serving:
+        #The fill ledger goes first: its spill replay puts the fills of the last run in trades.fills before the books replay them
+        if order_books.fill_ledger.queue is None:
+            await order_books.fill_ledger.start()
+        await order_books.load_snapshots()
+        await order_books.save_snapshots()
+        print(f"Order books: lease taken by worker {WORKER_ID}, {len(order_books.books)} books loaded")
+    #Counted from before the request, so this worker stops serving before the lease can expire in MongoDB
+    order_books.lease_expires = started + ORDER_BOOK_LEASE_SECONDS
+    return True
+
+async def run_order_book_snapshots():
+    """Snapshot and lease loop, started in the app lifespan."""
+    renew_at = time.monotonic() + ORDER_BOOK_LEASE_SECONDS / 3
+    while True:
+        await asyncio.sleep(ORDER_BOOK_SNAPSHOT_SECONDS)
+        try:
+            if time.monotonic() >= renew_at:
+                renew_at = time.monotonic() + ORDER_BOOK_LEASE_SECONDS / 3
+                await renew_order_books_lease()
+            #Once the lease is lost the books are stale, saving them would overwrite the new holder's snapshots
+            if order_books.serving():
+                await order_books.save_snapshots()
+        except Exception as e:
+            print(f"Order book snapshot failed: {e}")
+
+async def start_order_books():
+    if not await renew_order_books_lease():
+        print("Order books: served by another worker, order endpoints disabled here")
+
+async def stop_order_books():
+    if order_books.serving():
+        await order_books.save_snapshots()
+        order_books.lease_expires = 0
+        await release_lock(ORDER_BOOK_LEASE)
+    await order_books.fill_ledger.stop()
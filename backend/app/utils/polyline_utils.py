@@ -0,0 +1,77 @@
+import os
+import numpy as np
+from bson.binary import Binary
+from dotenv import load_dotenv
+
+load_dotenv()
+
+#Compact storage for route polylines. A BSON array of [lat, lon] pairs costs ~40 bytes a point and is decoded point by point.
+#The packed forms are one BSON Binary field ("route_bin", format in "route_encoding") at 8 bytes a point:
+# - "float32"     : interleaved little-endian float32 lat/lon, decodes zero-copy with np.frombuffer (~1 m precision)
+# - "delta_int32" : first point then deltas, as little-endian int32 micro-degrees (~0.1 m precision), decodes with one cumsum
+#Clients can also get a Google encoded polyline string, see encode_google_polyline.
+
+ROUTE_ENCODINGS = ("float32", "delta_int32")
+MICRO_DEGREES = 1_000_000
+
+#Encoding for new routes. Unset keeps the plain "route" array.
+ROUTE_ENCODING = os.getenv("ROUTE_ENCODING")
+
+def encode_route_binary(points, encoding: str = "float32"):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if encoding == "float32":
+        return Binary(points.astype("<f4").tobytes())
+    if encoding == "delta_int32":
+        micro = np.round(points * MICRO_DEGREES).astype(np.int64)
+        deltas = np.diff(micro, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        return Binary(deltas.astype("<i4").tobytes())
+    raise ValueError(f"Unknown route encoding {encoding}. Choose one of {ROUTE_ENCODINGS}")
+
+def decode_route_binary(data: bytes, encoding: str = "float32"):
+    """(N, 2) array of lat/lon. For float32 this is a read-only view over `data`, no copy is made."""
+    if encoding == "float32":
+        return np.frombuffer(data, dtype="<f4").reshape(-1, 2)
+    if encoding == "delta_int32":
+        return np.cumsum(np.frombuffer(data, dtype="<i4").reshape(-1, 2), axis=0, dtype=np.int64) / MICRO_DEGREES
+    raise ValueError(f"Unknown route encoding {encoding}. Choose one of {ROUTE_ENCODINGS}")
+
+def route_points(route_document: dict):
+    """Points of a route document as an (N, 2) array, whether it stores the packed "route_bin" or the plain "route" array."""
+    if route_document.get("route_bin") is not None:
+        return decode_route_binary(route_document["route_bin"], route_document.get("route_encoding", "float32"))
+    return np.asarray(route_document.get("route", []), dtype=np.float64).reshape(-1, 2)
+
+def route_storage_fields(points):
+    """Fields to store a route's points with, packed if ROUTE_ENCODING is set."""
+    if ROUTE_ENCODING in ROUTE_ENCODINGS:
+        return {"route_bin": encode_route_binary(points, ROUTE_ENCODING), "route_encoding": ROUTE_ENCODING}
+    return {"route": [list(point) for point in points]}
+
+def encode_google_polyline(points, precision: int = 5):
+    """Google encoded polyline algorithm format (what Leaflet/Google maps plugins decode)."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return ""
+    scaled = np.round(points * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    #Zigzag, so small negative numbers stay small
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+
+    chunks = []
+    for value in values:
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+def decode_google_polyline(polyline: str, precision: int = 5):
+    values, value, shift = [], 0, 0
+    for char in polyline:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    return (np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision).tolist()
@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.quote_utils import price_tables
+from backend.app.utils.lock_utils import acquire_lock
+
+load_dotenv()
+
+#Dynamic prices. Every PRICING_INTERVAL_SECONDS the price of every good at every outpost is recomputed in one NumPy pass over
+#(outposts x goods) arrays, from:
+# - stock: goods.quantity against the average stock of that good over the outposts that have it (scarce -> dearer)
+# - demand: the good is in the outpost's goods_demanded (its "quantity", if given, scales the premium)
+# - season: from the date and the outpost's hemisphere, with optional per-good "seasonal_factors" on the goods documents
+# - events: active documents of outposts.market_events (war, drought...) multiply the price of some goods in a region
+#Everything is relative to goods.base_price, the admin-set price: add_goods/update_good (and the spawn sync) set it with the
+#price, goods that predate it take their current price the first time they are repriced.
+#Only changed prices are written back, with a bulk update of goods (goods_available is derived from goods, see stock_utils).
+#The schedule runs in every worker but one pass per interval is made: the worker that takes the "pricing" lease (see lock_utils),
+#held for PRICING_INTERVAL_SECONDS, reprices, the others poll every PRICING_POLL_SECONDS in case it went away.
+
+PRICING_INTERVAL_SECONDS = float(os.getenv("PRICING_INTERVAL_SECONDS", "3600"))
+PRICING_POLL_SECONDS = min(float(os.getenv("PRICING_POLL_SECONDS", "60")), PRICING_INTERVAL_SECONDS)
+STOCK_ELASTICITY = 0.5     #price ~ (average stock / stock) ** elasticity
+DEMAND_PREMIUM = 0.25      #+25% where the good is demanded
+PRICE_BOUNDS = (0.2, 5.0)  #price stays within these multiples of base_price
+
+SEASONS = ("winter", "spring", "summer", "autumn")
+SEASONAL_FACTORS = {"winter": 1.1, "spring": 1.0, "summer": 0.95, "autumn": 1.0}
+
+def season_index(date: datetime.date, latitudes):
+    """Season of every outpost (index into SEASONS), southern hemisphere shifted by half a year."""
+    northern = (date.month % 12) // 3  #Dec-Feb winter, Mar-May spring...
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    return np.where(latitudes < 0, (northern + 2) % 4, northern)
+
+def compute_prices(base_price, stock, present, demand, season_factor, event_factor,
+                   elasticity: float = STOCK_ELASTICITY, demand_premium: float = DEMAND_PREMIUM, bounds=PRICE_BOUNDS):
+    """
+    New prices, all arguments are (outposts, goods) arrays (or broadcastable to it).
+    present is False where the outpost does not sell the good, the price there is 0.
+    demand is 0 where the good is not demanded, 1 for a plain demand, more for a larger demanded quantity.
+    """
+    stock = np.where(present, np.maximum(stock, 0), 0).astype(np.float64)
+    sellers = present.sum(axis=0)
+    average_stock = np.divide(stock.sum(axis=0), sellers, out=np.zeros(stock.shape[1]), where=sellers > 0)
+
+    scarcity = np.power((average_stock + 1) / (stock + 1), elasticity)
+    multiplier = np.clip(scarcity * (1 + demand_premium * demand) * season_factor * event_factor, *bounds)
+    return np.where(present, np.maximum(np.rint(base_price * multiplier), 1), 0).astype(np.int64)
+
+async def _active_events(now):
+    events_collection = mongo_client["outposts"]["market_events"]
+    return await events_collection.find(
+        {"$and": [{"$or": [{"starts_at": None}, {"starts_at": {"$lte": now}}]}, {"$or": [{"ends_at": None}, {"ends_at": {"$gt": now}}]}]},
+        {"_id": 0, "region": 1, "goods": 1, "multiplier": 1}
+    ).to_list()
+
+async def reprice_goods(now: datetime.datetime = None):
+    """Recomputes and writes every price. Returns the number of prices that changed."""
+    now = now or datetime.datetime.now()
+    outposts_db = mongo_client["outposts"]
+    goods_collection = outposts_db["goods"]
+    spawn_collection = outposts_db["spawn_points"]
+
+    spawn_points, goods, events = await asyncio.gather(
+        spawn_collection.find({}, {"_id": 0, "id": 1, "region": 1, "latitude": 1, "goods_demanded": 1}).to_list(),
+        goods_collection.find({}, {"_id": 1, "outpost_id": 1, "name": 1, "quantity": 1, "price": 1, "base_price": 1, "seasonal_factors": 1}).to_list(),
+        _active_events(now)
+    )
+    if not spawn_points or not goods:
+        return 0
+
+    outpost_index = {spawn_point["id"]: i for i, spawn_point in enumerate(spawn_points)}
+    good_names = sorted({good["name"] for good in goods})
+    good_index = {name: j for j, name in enumerate(good_names)}
+    shape = (len(spawn_points), len(good_names))
+
+    #Dense (outposts, goods) inputs
+    base_price = np.zeros(shape)
+    stock = np.zeros(shape)
+    current = np.zeros(shape)
+    present = np.zeros(shape, dtype=bool)
+    seasonal = np.ones((len(good_names), len(SEASONS))) * [SEASONAL_FACTORS[season] for season in SEASONS]
+    document_ids = {}
+    for good in goods:
+        i = outpost_index.get(good["outpost_id"])
+        if i is None:
+            continue
+        j = good_index[good["name"]]
+        present[i, j] = True
+        stock[i, j] = good.get("quantity", 0)
+        current[i, j] = good.get("price", 0)
+        base_price[i, j] = good.get("base_price", good.get("price", 0))
+        document_ids[(i, j)] = (good["_id"], None if "base_price" in good else good.get("price", 0))
+        for season, factor in (good.get("seasonal_factors") or {}).items():
+            if season in SEASONS:
+                seasonal[j, SEASONS.index(season)] = factor
+
+    demand = np.zeros(shape)
+    for i, spawn_point in enumerate(spawn_points):
+        for demanded in spawn_point.get("goods_demanded") or []:
+            j = good_index.get(demanded.get("name"))
+            if j is not None:
+                demand[i, j] = 1 + np.log1p(max(demanded.get("quantity", 0), 0)) / 10
+
+    seasons = season_index(now.date(), [spawn_point.get("latitude", 0) for spawn_point in spawn_points])
+    season_factor = seasonal[:, seasons].T
+
+    regions = sorted({spawn_point.get("region") for spawn_point in spawn_points if spawn_point.get("region")})
+    region_index = {region: r for r, region in enumerate(regions)}
+    region_events = np.ones((len(regions) + 1, len(good_names)))  #last row: outposts without a region
+    for event in events:
+        r = region_index.get(event.get("region"))
+        if r is None:
+            continue
+        columns = [good_index[name] for name in event.get("goods") or [] if name in good_index] if event.get("goods") != "*" else slice(None)
+        region_events[r, columns] *= event.get("multiplier", 1)
+    event_factor = region_events[[region_index.get(spawn_point.get("region"), len(regions)) for spawn_point in spawn_points]]
+
+    prices = compute_prices(base_price, stock, present, demand, season_factor, event_factor)
+
+    changed_i, changed_j = np.nonzero(present & (prices != current))
+    if len(changed_i) == 0:
+        return 0
+
+    goods_updates = []
+    for i, j, price in zip(changed_i.tolist(), changed_j.tolist(), prices[changed_i, changed_j].tolist()):
+        _id, seed_base_price = document_ids[(i, j)]
+        update = {"price": price, "last_priced": now}
+        if seed_base_price is not None:
+            update["base_price"] = seed_base_price
+        goods_updates.append(UpdateOne({"_id": _id}, {"$set": update}))
+
+    await goods_collection.bulk_write(goods_updates, ordered=False)
+    price_tables.invalidate()
+    return len(goods_updates)
+
+async def run_pricing():
+    """Pricing schedule, started in the app lifespan of every worker. Only the holder of the lease of the interval reprices."""
+    while True:
+        try:
+            #A new owner for every attempt, so the holder does not extend the lease: it only frees itself after the interval
+            if await acquire_lock("pricing", PRICING_INTERVAL_SECONDS, owner=uuid.uuid4().hex):
+                changed = await reprice_goods()
+                print(f"Pricing: {changed} prices changed")
+        except Exception as e:
+            print(f"Pricing failed: {e}")
+        await asyncio.sleep(PRICING_POLL_SECONDS)
@@ -0,0 +1,82 @@
+import datetime
+import hashlib
+import hmac
+import os
+import time
+import uuid
+
+import jwt
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.security_utils import SECRET_KEY, ALGORITHM
+from backend.app.utils.catalog_cache_utils import catalog, CatalogCache
+
+load_dotenv()
+
+#Price quotes. The ask is the outpost's posted price (what purchase_goods charges), the bid (what sell_goods pays) is the ask
+#minus QUOTE_SPREAD. Per-outpost price tables are cached for QUOTE_TTL_SECONDS in the catalog cache (catalog_cache_utils),
+#trade writes to an outpost drop its table.
+#
+#Every quoted good comes with a quote token, a signed JWT of (username, outpost, good, bid) valid for QUOTE_TOKEN_SECONDS.
+#sell_goods takes the token instead of a price, the signature is the validation, so the sell path does no read of the price.
+# - /trades/quote is not authenticated, so a quote token must never pass for a session token: it is signed with its own key
+#   (QUOTE_SECRET_KEY, by default derived from JWT_SECRET_KEY) and carries aud "quote", which PyJWT rejects where no audience
+#   is expected (the access token checks) and which verify_quote_token requires.
+# - A token is good for one sale: its jti is recorded in trades.used_quotes by use_quote_token (a TTL index drops it after exp).
+
+QUOTE_TTL_SECONDS = float(os.getenv("QUOTE_TTL_SECONDS", "30"))
+QUOTE_TOKEN_SECONDS = int(os.getenv("QUOTE_TOKEN_SECONDS", "60"))
+QUOTE_SPREAD = float(os.getenv("QUOTE_SPREAD", "0.1"))
+QUOTE_AUDIENCE = "quote"
+QUOTE_SECRET_KEY = os.getenv("QUOTE_SECRET_KEY") or hmac.new(str(SECRET_KEY).encode(), b"quote tokens", hashlib.sha256).hexdigest()
+
+async def _load_price_table(outpost_id: str):
+    """{good: {"ask", "bid", "unit", "quantity"}} of an outpost."""
+    goods = await mongo_client["outposts"]["goods"].find(
+        {"outpost_id": outpost_id}, {"_id": 0, "name": 1, "price": 1, "unit": 1, "quantity": 1}
+    ).to_list()
+    return {good["name"]: price_entry(good) for good in goods}
+
+#version is bumped on every invalidation, for caches derived from prices (see arbitrage_utils)
+price_tables = catalog.register(CatalogCache("goods", _load_price_table, ttl=QUOTE_TTL_SECONDS))
+
+def price_entry(good: dict):
+    ask = good.get("price", 0)
+    return {"ask": ask, "bid": round(ask * (1 - QUOTE_SPREAD), 2), "unit": good.get("unit", "kg"), "quantity": good.get("quantity", 0)}
+
+def create_quote_token(username: str, outpost_id: str, good_id: str, entry: dict):
+    return jwt.encode({
+        "typ": "quote", "aud": QUOTE_AUDIENCE, "jti": uuid.uuid4().hex, "sub": username, "outpost_id": outpost_id, "good_id": good_id,
+        "bid": entry["bid"], "ask": entry["ask"], "unit": entry["unit"],
+        "exp": int(time.time()) + QUOTE_TOKEN_SECONDS
+    }, QUOTE_SECRET_KEY, algorithm=ALGORITHM)
+
+def verify_quote_token(token: str, username: str, outpost_id: str, good_id: str):
+    """Claims of a valid quote token for this sale, or None if it is expired, forged or for another user, outpost or good."""
+    try:
+        claims = jwt.decode(token, QUOTE_SECRET_KEY, algorithms=[ALGORITHM], audience=QUOTE_AUDIENCE, options={"require": ["exp", "jti"]})
+    except jwt.InvalidTokenError:
+        return None
+    if claims.get("typ") != "quote" or (claims.get("sub"), claims.get("outpost_id"), claims.get("good_id")) != (username, outpost_id, good_id):
+        return None
+    return claims
+
+def used_quotes_collection():
+    return mongo_client["trades"]["used_quotes"]
+
+async def use_quote_token(claims: dict):
+    """Marks a verified quote token as used. Returns False if it already was."""
+    try:
+        await used_quotes_collection().insert_one({
+            "_id": claims["jti"], "username": claims["sub"],
+            "expires_at": datetime.datetime.fromtimestamp(claims["exp"], tz=datetime.timezone.utc)
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def release_quote_token(claims: dict):
+    """Gives a quote token back when the sale it was used for did not happen."""
+    await used_quotes_collection().delete_one({"_id": claims["jti"]})
@@ -0,0 +1,71 @@
+import base64
+import datetime
+from decimal import Decimal
+from typing import Optional
+
+import orjson
+from bson import ObjectId, Decimal128
+from fastapi.responses import JSONResponse, StreamingResponse
+
+#JSON responses straight from MongoDB documents, with orjson.
+# - BSONResponse is the app's default response class. ObjectId becomes its hex string, datetime an ISO 8601 string,
+#   Decimal128 a float, bytes base64. NumPy arrays and scalars are serialized natively.
+# - projection_from_fields turns a "fields=name,price" query parameter into a MongoDB projection, so unused fields never
+#   leave the database.
+# - NDJSONResponse streams a cursor as one document per line, without holding the result in memory.
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+NDJSON_CHUNK_SIZE = 500  #documents per chunk written to the socket
+
+def bson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content):
+    return orjson.dumps(content, default=bson_default, option=ORJSON_OPTIONS)
+
+class BSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def projection_from_fields(fields: Optional[str], allowed=None, default: dict = None):
+    """
+    MongoDB projection for a comma separated list of fields ("name,price,quantity"). _id is left out unless asked for.
+    Fields not in `allowed` (when given) are ignored. No fields -> `default` (None = whole documents without _id).
+    """
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    if allowed is not None:
+        names = [name for name in names if name in allowed]
+    if not names:
+        return default if default is not None else {"_id": 0}
+    projection = {name: 1 for name in names}
+    if "_id" not in projection:
+        projection["_id"] = 0
+    return projection
+
+async def ndjson_lines(cursor, chunk_size: int = NDJSON_CHUNK_SIZE):
+    chunk = []
+    async for document in cursor:
+        chunk.append(dumps(document))
+        if len(chunk) >= chunk_size:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+class NDJSONResponse(StreamingResponse):
+    media_type = "application/x-ndjson"
+
+    def __init__(self, cursor, status_code: int = 200, chunk_size: int = NDJSON_CHUNK_SIZE, **kwargs):
+        super().__init__(ndjson_lines(cursor, chunk_size), status_code=status_code, media_type=self.media_type, **kwargs)
@@ -0,0 +1,188 @@
+import asyncio
+import heapq
+import math
+import os
+from typing import List
+
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.transports_utils import calculate_transport_cost
+
+#In-memory graph of the trade routes (transports.routes). Outposts are nodes, every route is an undirected edge weighted by its distance.
+#
+#Time (distance / speed) and cost (base_cost_per_km * d + base_cost_per_kg * weight * d) are both linear in distance for a given
+#transport method and cargo weight. So the shortest path by distance is also the fastest and the cheapest one for every method and
+#weight, and all-pairs shortest paths only need to be computed once per change of the routes collection. A request just reads the
+#cached path and prices its legs.
+#
+#Every uvicorn worker has its own graph. A write to the routes bumps the routes version in transports.route_graph
+#(refresh_route_graph(changed=True), or routes_changed() for scripts), and every worker compares it with the version its graph
+#was built from every ROUTE_GRAPH_CHECK_SECONDS (run_route_graph_checks), rebuilding when it is behind.
+
+load_dotenv()
+
+OPTIMIZE_OPTIONS = ("distance", "time", "cost")
+ROUTE_GRAPH_CHECK_SECONDS = float(os.getenv("ROUTE_GRAPH_CHECK_SECONDS", "5"))
+
+class RouteGraph:
+    def __init__(self):
+        self.version = 0
+        self.routes_version = None  #routes version in MongoDB the graph was built from
+        self.routes = []       #route documents the graph was built from, without the polylines
+        self.outpost_routes = {} #outpost_id -> routes touching it, oriented so that source_* is that outpost
+        self.names = {}        #outpost_id -> outpost name
+        self.adjacency = {}    #outpost_id -> {neighbour_id: distance}
+        self.distances = {}    #source_id -> {target_id: shortest distance}
+        self.predecessors = {} #source_id -> {target_id: previous outpost on the shortest path}
+
+    def build(self, routes: List[dict]):
+        """Rebuilds the graph, the per-outpost route lists and the all-pairs cache from route documents."""
+        names, adjacency, outpost_routes = {}, {}, {}
+        for route in routes:
+            source, destination, distance = route["source_id"], route["destination_id"], route["distance"]
+            names[source] = route.get("source") or names.get(source, source)
+            names[destination] = route.get("destination") or names.get(destination, destination)
+            #Keep the shortest if two routes link the same pair of outposts
+            for a, b in ((source, destination), (destination, source)):
+                neighbours = adjacency.setdefault(a, {})
+                neighbours[b] = min(distance, neighbours.get(b, float("inf")))
+
+            outpost_routes.setdefault(source, []).append(route)
+            if destination != source:
+                outpost_routes.setdefault(destination, []).append(self._reversed(route))
+
+        distances, predecessors = {}, {}
+        for source in adjacency:
+            distances[source], predecessors[source] = self._dijkstra(adjacency, source)
+
+        #Swap everything in at once, so a request running during a refresh never sees half a graph
+        self.routes, self.outpost_routes, self.names = routes, outpost_routes, names
+        self.adjacency, self.distances, self.predecessors = adjacency, distances, predecessors
+        self.version += 1
+        return self
+
+    @staticmethod
+    def _reversed(route):
+        reversed_route = dict(route)
+        for a, b in (("source_id", "destination_id"), ("source", "destination"), ("source_coords", "destination_coords")):
+            if a in route or b in route:
+                reversed_route[a], reversed_route[b] = route.get(b), route.get(a)
+        return reversed_route
+
+    def routes_from(self, outpost_id: str):
+        """Copies of the cached routes leaving outpost_id (callers are free to add fields to them)."""
+        return [dict(route) for route in self.outpost_routes.get(outpost_id, [])]
+
+    @staticmethod
+    def _dijkstra(adjacency, source):
+        distances, predecessors = {source: 0}, {}
+        heap = [(0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            for neighbour, edge in adjacency[node].items():
+                candidate = distance + edge
+                if candidate < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = candidate
+                    predecessors[neighbour] = node
+                    heapq.heappush(heap, (candidate, neighbour))
+        return distances, predecessors
+
+    def path(self, source_id: str, target_id: str):
+        """Outpost ids from source to target (both included) along the shortest path, or None if they are not connected."""
+        if target_id not in self.distances.get(source_id, {}):
+            return None
+        predecessors = self.predecessors[source_id]
+        path = [target_id]
+        while path[-1] != source_id:
+            path.append(predecessors[path[-1]])
+        return path[::-1]
+
+    def plan(self, source_id: str, target_id: str, weight: float, transport_methods: List[dict], optimize: str = "distance"):
+        """
+        Multi-hop journey from source to target. Returns None if there is no path.
+        Every transport method is priced leg by leg with calculate_transport_cost (same rounding as transport_profile) and
+        the options are sorted by the `optimize` metric. A method with missing cost fields gets None cost or time, sorted last.
+        """
+        path = self.path(source_id, target_id)
+        if path is None:
+            return None
+
+        legs = [{"source_id": a, "source": self.names.get(a, a), "destination_id": b, "destination": self.names.get(b, b),
+                 "distance": self.adjacency[a][b]} for a, b in zip(path, path[1:])]
+
+        priced_methods = [_priced_method(method) for method in transport_methods]
+        totals = {method["name"]: {"name": method["name"], "cost": 0, "time": 0} for method in transport_methods}
+        for leg in legs:
+            for option in calculate_transport_cost(leg["distance"], weight, priced_methods):
+                totals[option["name"]]["cost"] += option["cost"]
+                totals[option["name"]]["time"] += option["time"]
+
+        options = [{**option, "cost": _json_number(option["cost"]), "time": _json_number(option["time"])} for option in totals.values()]
+        if optimize in ("time", "cost"):
+            options.sort(key=lambda option: (option[optimize] is None, option[optimize] or 0))
+
+        return {
+            "path": path,
+            "legs": legs,
+            "distance": round(self.distances[source_id][target_id], 1),
+            "options": options,
+        }
+
+def _priced_method(method: dict):
+    #Same rule as the cost matrix (cost_matrix_utils): a missing or non-numeric cost field, or a zero speed, counts as NaN,
+    #so the cost or time it feeds comes out as None instead of failing the whole plan
+    priced = dict(method)
+    for field in ("base_cost_per_km", "base_cost_per_kg", "speed"):
+        value = method.get(field)
+        usable = isinstance(value, (int, float)) and not (field == "speed" and value == 0)
+        priced[field] = value if usable else math.nan
+    return priced
+
+def _json_number(value):
+    return None if math.isnan(value) or math.isinf(value) else value
+
+route_graph = RouteGraph()
+
+def _versions_collection():
+    return mongo_client["transports"]["route_graph"]
+
+async def _stored_routes_version():
+    document = await _versions_collection().find_one({"_id": "version"})
+    return document["version"] if document else 0
+
+async def routes_changed():
+    """Bumps the routes version, the graph of every worker is rebuilt on its next check. Returns the new version."""
+    document = await _versions_collection().find_one_and_update(
+        {"_id": "version"}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return document["version"]
+
+async def refresh_route_graph(changed: bool = False):
+    """
+    Reloads the graph from MongoDB. Called on startup, by the version checks, and with changed=True by every endpoint that adds
+    or changes routes, so the other workers rebuild theirs too.
+    """
+    if changed:
+        await routes_changed()
+    #Read before the routes: a change made meanwhile leaves the graph behind the stored version, and the next check rebuilds it
+    routes_version = await _stored_routes_version()
+    routes_collection = mongo_client["transports"]["routes"]
+    #Everything but the polylines, transport_profile serves these documents as they are
+    routes = await routes_collection.find({}, {"_id": 0, "route": 0, "route_bin": 0, "route_levels": 0}).to_list()
+    route_graph.build(routes)
+    route_graph.routes_version = routes_version
+    return route_graph
+
+async def run_route_graph_checks():
+    """Rebuilds the graph when the routes changed in another worker (or a script), started in the app lifespan."""
+    while True:
+        await asyncio.sleep(ROUTE_GRAPH_CHECK_SECONDS)
+        try:
+            if await _stored_routes_version() != route_graph.routes_version:
+                await refresh_route_graph()
+        except Exception as e:
+            print(f"Route graph check failed: {e}")
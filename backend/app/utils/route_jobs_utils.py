@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import datetime
+import multiprocessing
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo import UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.geo_utils import polyline_length_km, build_route_levels, DEFAULT_DISTANCE_METHOD, DISTANCE_METHODS
+from backend.app.utils.polyline_utils import route_points
+from backend.app.utils.lock_utils import acquire_lock, release_lock
+from backend.app.utils.route_graph_utils import routes_changed
+
+#Batch job that recomputes "distance" and "route_levels" of every route (used by /transports/small_tasks_route).
+# - The routes cursor is streamed in _id order with a projection, never loaded whole.
+# - Distance/levels are computed in a process pool, a few batches in flight at once.
+# - Results are written with unordered bulk_write, one per batch.
+# - Progress and the last fully written _id are kept in transports.jobs, so an interrupted run resumes where it stopped.
+# - One run at a time over all the workers: a run holds the lease JOB_ID (see lock_utils), renewed after every written batch,
+#   so two runs never write the same checkpoint.
+# - The pool uses the "spawn" start method: forking a uvicorn worker would copy its event loop, MongoDB client and threads.
+#Can also be run outside the app: python -m backend.app.utils.route_jobs_utils [--method vincenty] [--restart]. It bumps the
+#routes version at the end, so the workers of the app rebuild their route graph (see route_graph_utils).
+
+JOB_ID = "recompute_route_distances"
+BATCH_SIZE = 200
+JOB_LOCK_SECONDS = 300  #a run that writes nothing for this long loses its lease
+
+def _recompute_batch(documents, distance_method):
+    #Runs in a worker process
+    results = []
+    for document in documents:
+        points = route_points(document)
+        results.append((document["_id"], round(polyline_length_km(points, distance_method), 2), build_route_levels(points)))
+    return results
+
+async def get_route_job_status():
+    return await mongo_client["transports"]["jobs"].find_one({"_id": JOB_ID}, {"_id": 0})
+
+async def recompute_route_distances(distance_method: str, resume: bool = True, batch_size: int = BATCH_SIZE):
+    """
+    Runs the job and returns its final status document. With resume=True an unfinished previous run continues from its checkpoint,
+    with the distance_method of that run (so every route ends up measured the same way), whatever distance_method is given.
+    Returns None without doing anything if another run is in progress.
+    """
+    run_id = uuid.uuid4().hex
+    if not await acquire_lock(JOB_ID, JOB_LOCK_SECONDS, owner=run_id):
+        return None
+    try:
+        return await _recompute_route_distances(distance_method, resume, batch_size, run_id)
+    finally:
+        await release_lock(JOB_ID, owner=run_id)
+
+async def _recompute_route_distances(distance_method: str, resume: bool, batch_size: int, run_id: str):
+    routes_collection = mongo_client["transports"]["routes"]
+    jobs_collection = mongo_client["transports"]["jobs"]
+
+    query = {"$or": [{"route": {"$exists": True}}, {"route_bin": {"$exists": True}}]}
+    previous = await get_route_job_status()
+    processed = 0
+    if resume and previous and previous.get("status") == "running" and previous.get("last_id") is not None:
+        query = {"$and": [query, {"_id": {"$gt": previous["last_id"]}}]}
+        processed = previous.get("processed", 0)
+        distance_method = previous.get("distance_method", distance_method)
+        print(f"{JOB_ID}: resuming after {previous['last_id']} ({processed} routes already done, distance method {distance_method})")
+
+    total = processed + await routes_collection.count_documents(query)
+    await jobs_collection.update_one(
+        {"_id": JOB_ID},
+        {"$set": {"status": "running", "distance_method": distance_method, "processed": processed, "total": total,
+                  "started_at": datetime.datetime.now(), "updated_at": datetime.datetime.now()}},
+        upsert=True
+    )
+
+    loop = asyncio.get_running_loop()
+    workers = os.cpu_count() or 1
+    in_flight = deque()
+
+    async def write_oldest():
+        #Batches are written in the order they were read, so the checkpoint always means "everything up to last_id is done"
+        nonlocal processed
+        results = await in_flight.popleft()
+        if not await acquire_lock(JOB_ID, JOB_LOCK_SECONDS, owner=run_id):
+            raise RuntimeError(f"{JOB_ID}: lease lost to another run, stopping before the checkpoint")
+        await routes_collection.bulk_write(
+            [UpdateOne({"_id": _id}, {"$set": {"distance": distance, "route_levels": levels}}) for _id, distance, levels in results],
+            ordered=False
+        )
+        processed += len(results)
+        await jobs_collection.update_one(
+            {"_id": JOB_ID},
+            {"$set": {"last_id": results[-1][0], "processed": processed, "updated_at": datetime.datetime.now()}}
+        )
+        print(f"{JOB_ID}: {processed}/{total} routes")
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        batch = []
+        cursor = routes_collection.find(query, {"_id": 1, "route": 1, "route_bin": 1, "route_encoding": 1}).sort("_id", 1).batch_size(batch_size)
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) < batch_size:
+                continue
+            in_flight.append(loop.run_in_executor(pool, _recompute_batch, batch, distance_method))
+            batch = []
+            if len(in_flight) >= 2 * workers:
+                await write_oldest()
+
+        if batch:
+            in_flight.append(loop.run_in_executor(pool, _recompute_batch, batch, distance_method))
+        while in_flight:
+            await write_oldest()
+
+    await jobs_collection.update_one(
+        {"_id": JOB_ID},
+        {"$set": {"status": "done", "last_id": None, "finished_at": datetime.datetime.now(), "updated_at": datetime.datetime.now()}}
+    )
+    return await get_route_job_status()
+
+async def _main(distance_method: str, resume: bool):
+    try:
+        status = await recompute_route_distances(distance_method, resume=resume)
+        if status is not None:
+            await routes_changed()
+    finally:
+        await mongo_client.close()
+    print(status if status is not None else f"{JOB_ID}: another run is in progress")
+    return 0 if status is not None else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recomputes distance and route_levels of every route.")
+    parser.add_argument("--method", default=DEFAULT_DISTANCE_METHOD, choices=DISTANCE_METHODS)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an unfinished run")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(_main(args.method, not args.restart)))
@@ -0,0 +1,66 @@
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.quote_utils import price_tables
+
+#Outpost stock has a single source of truth: outposts.goods, one document per (outpost_id, name). Trades, the admin endpoints
+#and the pricing engine only write there.
+#The goods available at an outpost are derived from it at read time, never stored:
+# - goods_available(outpost_id) is assembled from the cached price table of the outpost (quote_utils), and
+#   all_goods_available() (GET /goods/available) from one $group over goods, cached until the next stock or price change
+#   (price_tables.version).
+#spawn_points.goods_available is not a view of the stock: it is the seed list of /goods/sync_goods (see goods_sync_utils).
+#check_stock_consistency looks for what can still go wrong in goods itself: the same good twice in an outpost (the unique index
+#missing), goods of outposts without a spawn point, and spawn points without goods.
+
+CONSISTENCY_BATCH_SIZE = 500
+PROBLEM_SAMPLE_SIZE = 50
+
+_all_goods_available = None  #(price version, {outpost_id: [good]})
+
+def _available_entry(good: dict):
+    return {"name": good["name"], "price": good.get("price"), "quantity": good.get("quantity", 0), "unit": good.get("unit", "kg")}
+
+async def goods_available(outpost_id: str):
+    """[{"name", "price", "quantity", "unit"}] of an outpost, sorted by name."""
+    table = await price_tables.get(outpost_id)
+    return [{"name": name, "price": entry["ask"], "quantity": entry["quantity"], "unit": entry["unit"]} for name, entry in sorted(table.items())]
+
+async def all_goods_available(cached: bool = True):
+    """{outpost_id: goods_available} of every outpost that has goods."""
+    global _all_goods_available
+    version = price_tables.version
+    if cached and _all_goods_available is not None and _all_goods_available[0] == version:
+        return _all_goods_available[1]
+    cursor = await mongo_client["outposts"]["goods"].aggregate([
+        {"$sort": {"outpost_id": 1, "name": 1}},
+        {"$group": {"_id": "$outpost_id", "goods": {"$push": {"name": "$name", "price": "$price", "quantity": "$quantity", "unit": "$unit"}}}}
+    ], allowDiskUse=True)
+    derived = {group["_id"]: [_available_entry(good) for good in group["goods"]] async for group in cursor}
+    if version == price_tables.version:
+        _all_goods_available = (version, derived)
+    return derived
+
+async def check_stock_consistency(batch_size: int = CONSISTENCY_BATCH_SIZE):
+    """
+    Checks outposts.goods against itself and the spawn points.
+    Returns {"checked", "duplicates" (a sample of {"outpost_id", "name", "count"}), "orphan_outposts" (goods of outposts
+    without a spawn point), "empty_outposts" (spawn points without goods, a sample)}.
+    """
+    goods_collection = mongo_client["outposts"]["goods"]
+    cursor = await goods_collection.aggregate([
+        {"$group": {"_id": {"outpost_id": "$outpost_id", "name": "$name"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": PROBLEM_SAMPLE_SIZE}
+    ], allowDiskUse=True)
+    duplicates = [{"outpost_id": group["_id"].get("outpost_id"), "name": group["_id"].get("name"), "count": group["count"]} async for group in cursor]
+    outposts_with_goods = set(await goods_collection.distinct("outpost_id"))
+
+    report = {"checked": 0, "duplicates": duplicates, "orphan_outposts": [], "empty_outposts": []}
+    seen = set()
+    cursor = mongo_client["outposts"]["spawn_points"].find({}, {"_id": 0, "id": 1}).batch_size(batch_size)
+    async for spawn_point in cursor:
+        report["checked"] += 1
+        seen.add(spawn_point["id"])
+        if spawn_point["id"] not in outposts_with_goods and len(report["empty_outposts"]) < PROBLEM_SAMPLE_SIZE:
+            report["empty_outposts"].append(spawn_point["id"])
+    report["orphan_outposts"] = sorted(outpost_id for outpost_id in outposts_with_goods if outpost_id not in seen and outpost_id is not None)
+    return report
@@ -0,0 +1,121 @@
+import base64
+import datetime
+
+from bson import json_util, ObjectId
+from pymongo import UpdateOne
+
+from backend.app.utils.mongo_utils import mongo_client
+
+#Reading the trade ledger (trades.purchases). Order book fills are logged apart, in trades.fills (see order_book_utils).
+# - History is keyset paginated on (created_at, _id), newest first. The cursor is the last row's key, so page N costs the same
+#   as page 1 (no skip), and every filter combination has an index starting with its equality field (see index_utils).
+# - Rollups per user (trades.user_rollups) and per outpost (trades.outpost_rollups) are kept up to date by the trade ledger:
+#   after every insert_many batch, the batch is summed in Python and applied with one bulk $inc per collection.
+#   rebuild_rollups recomputes them from the ledger with $group, for repairs.
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_FILTERS = ("username", "outpost_id", "good_id")
+
+def trades_collection():
+    return mongo_client["trades"]["purchases"]
+
+def encode_cursor(trade: dict):
+    #json_util keeps the BSON types (older trades have ObjectId _ids, newer ones their trade_id string)
+    return base64.urlsafe_b64encode(json_util.dumps({"created_at": trade["created_at"], "_id": trade["_id"]}).encode()).decode()
+
+def decode_cursor(cursor: str):
+    """(created_at, _id) of a cursor from encode_cursor. Raises ValueError for anything else."""
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at, last_id = key["created_at"], key["_id"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("invalid cursor") from e
+    #Only the types encode_cursor writes, an operator document as _id would change the query
+    if not isinstance(created_at, datetime.datetime) or not isinstance(last_id, (str, ObjectId)):
+        raise ValueError("invalid cursor")
+    return created_at, last_id
+
+async def trade_history(filters: dict, since: datetime.datetime = None, until: datetime.datetime = None, cursor: str = None, limit: int = HISTORY_PAGE_SIZE):
+    """One page of trades, newest first, and the cursor of the next page (None on the last page)."""
+    query = {field: value for field, value in filters.items() if field in HISTORY_FILTERS and value is not None}
+    created_at = {}
+    if since is not None:
+        created_at["$gte"] = since
+    if until is not None:
+        created_at["$lt"] = until
+    if created_at:
+        query["created_at"] = created_at
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [{"created_at": {"$lt": last_created_at}}, {"created_at": last_created_at, "_id": {"$lt": last_id}}]}]}
+
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    #One extra row tells whether there is a next page
+    trades = await trades_collection().find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list()
+    next_cursor = encode_cursor(trades[limit - 1]) if len(trades) > limit else None
+    return trades[:limit], next_cursor
+
+def _rollup_increments(trade: dict):
+    selling = trade.get("type") == "sell"
+    money = trade.get("price", 0)
+    return {
+        "trade_count": 1,
+        "purchase_count": 0 if selling else 1,
+        "sell_count": 1 if selling else 0,
+        "bought_volume": 0 if selling else money,
+        "sold_volume": money if selling else 0,
+        "quantity_bought": 0 if selling else trade.get("quantity", 0),
+        "quantity_sold": trade.get("quantity", 0) if selling else 0,
+        "realized_pnl": trade.get("realized_pnl", 0),
+    }
+
+def rollup_updates(trades, key_field: str):
+    """Updates applying a batch of trades to the rollups keyed by key_field, one per key however many trades it has."""
+    rollups = {}
+    for trade in trades:
+        key = trade.get(key_field)
+        if key is None:
+            continue
+        rollup = rollups.setdefault(key, {"$inc": {}, "$min": {"first_trade_at": trade["created_at"]}, "$max": {"last_trade_at": trade["created_at"]}})
+        for field, value in _rollup_increments(trade).items():
+            rollup["$inc"][field] = rollup["$inc"].get(field, 0) + value
+        rollup["$min"]["first_trade_at"] = min(rollup["$min"]["first_trade_at"], trade["created_at"])
+        rollup["$max"]["last_trade_at"] = max(rollup["$max"]["last_trade_at"], trade["created_at"])
+    return [UpdateOne({"_id": key}, update, upsert=True) for key, update in rollups.items()]
+
+async def apply_rollups(trades):
+    """Trade ledger hook, called with the trades of a batch that were actually inserted."""
+    trades_db = mongo_client["trades"]
+    for collection_name, key_field in (("user_rollups", "username"), ("outpost_rollups", "outpost_id")):
+        updates = rollup_updates(trades, key_field)
+        if updates:
+            await trades_db[collection_name].bulk_write(updates, ordered=False)
+
+async def rebuild_rollups():
+    """Recomputes both rollup collections from the whole ledger ($group + $merge, nothing goes through the app)."""
+    selling = {"$eq": ["$type", "sell"]}
+    group_fields = {
+        "trade_count": {"$sum": 1},
+        "purchase_count": {"$sum": {"$cond": [selling, 0, 1]}},
+        "sell_count": {"$sum": {"$cond": [selling, 1, 0]}},
+        "bought_volume": {"$sum": {"$cond": [selling, 0, {"$ifNull": ["$price", 0]}]}},
+        "sold_volume": {"$sum": {"$cond": [selling, {"$ifNull": ["$price", 0]}, 0]}},
+        "quantity_bought": {"$sum": {"$cond": [selling, 0, {"$ifNull": ["$quantity", 0]}]}},
+        "quantity_sold": {"$sum": {"$cond": [selling, {"$ifNull": ["$quantity", 0]}, 0]}},
+        "realized_pnl": {"$sum": {"$ifNull": ["$realized_pnl", 0]}},
+        "first_trade_at": {"$min": "$created_at"},
+        "last_trade_at": {"$max": "$created_at"},
+    }
+    trades_db = mongo_client["trades"]
+    for collection_name, key_field in (("user_rollups", "username"), ("outpost_rollups", "outpost_id")):
+        await trades_db[collection_name].delete_many({})
+        cursor = await trades_collection().aggregate([
+            {"$match": {key_field: {"$ne": None}}},
+            {"$group": {"_id": f"${key_field}", **group_fields}},
+            {"$merge": {"into": collection_name, "whenMatched": "replace"}}
+        ])
+        await cursor.to_list()
+
+async def get_rollup(collection_name: str, key: str):
+    return await mongo_client["trades"][collection_name].find_one({"_id": key})
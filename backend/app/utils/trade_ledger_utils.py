@@ -0,0 +1,220 @@
+import asyncio
+import os
+import threading
+
+from bson import json_util
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+
+from backend.app.utils.mongo_utils import mongo_client
+from backend.app.utils.trade_history_utils import apply_rollups
+from backend.app.utils.candles_utils import apply_candles
+
+load_dotenv()
+
+#Write-behind ledger for trades.purchases (and trades.fills, see order_book_utils). Trade endpoints call trade_ledger.record(...), which only puts the record in a bounded
+#in-memory queue, and a background writer flushes the queue with insert_many once batch_size records are waiting or every
+#flush_interval seconds. The audit log is then off the request path.
+#
+#Nothing is dropped:
+# - queue full (MongoDB slow or down): the record is handed to a spill task that appends it to a local spill file and fsyncs it
+# - insert_many failed: the batch goes to the spill file
+# - shutdown: what is still queued is flushed, or spilled if that fails
+#File writes run in a thread (asyncio.to_thread), never on the event loop, which is busy enough while MongoDB is slow.
+#The spill file is replayed on startup, and by the writer once an insert_many succeeds again (at most every
+#TRADE_LEDGER_REPLAY_SECONDS), so spilled trades reach purchases, history, rollups and candles without a restart.
+#Records use trade_id as _id, so a replay of already written records is a no-op.
+
+TRADE_LEDGER_SPILL_PATH = os.getenv("TRADE_LEDGER_SPILL_PATH", "trade_ledger_spill.jsonl")
+TRADE_LEDGER_QUEUE_SIZE = int(os.getenv("TRADE_LEDGER_QUEUE_SIZE", "10000"))
+TRADE_LEDGER_BATCH_SIZE = int(os.getenv("TRADE_LEDGER_BATCH_SIZE", "500"))
+TRADE_LEDGER_FLUSH_SECONDS = float(os.getenv("TRADE_LEDGER_FLUSH_SECONDS", "0.5"))
+TRADE_LEDGER_REPLAY_SECONDS = float(os.getenv("TRADE_LEDGER_REPLAY_SECONDS", "30"))
+
+DUPLICATE_KEY_ERROR = 11000
+
+class TradeLedger:
+    def __init__(self, collection_name: str = "purchases", on_written=(), database_name: str = "trades", spill_path: str = TRADE_LEDGER_SPILL_PATH, queue_size: int = TRADE_LEDGER_QUEUE_SIZE,
+                 batch_size: int = TRADE_LEDGER_BATCH_SIZE, flush_interval: float = TRADE_LEDGER_FLUSH_SECONDS):
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.on_written = on_written  #async hooks called with the records of every batch that were actually inserted
+        self.spill_path = spill_path
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.writer = None
+        self.in_flight = []
+        self.spill_pending = []   #records waiting for the spill task
+        self.spiller = None
+        self.spill_lock = threading.Lock()  #one writer of the spill file at a time (spill task, failed flushes)
+        self.needs_replay = False  #something was spilled since the last successful replay
+        self.replayer = None
+        self.next_replay = 0
+        self.stats = {"recorded": 0, "written": 0, "spilled": 0, "replayed": 0}
+
+    @property
+    def collection(self):
+        return mongo_client[self.database_name][self.collection_name]
+
+    def record(self, trade: dict):
+        """
+        Queues a trade record for writing. Never waits on MongoDB. If the queue is full the record is spilled to disk instead.
+        Before start() (or after stop()) every record is spilled at once, and replayed by the next start() with the same spill_path.
+        """
+        trade.setdefault("_id", trade["trade_id"])
+        self.stats["recorded"] += 1
+        if self.queue is None:
+            self._spill([trade])
+            return
+        try:
+            self.queue.put_nowait(trade)
+        except asyncio.QueueFull:
+            self.spill_pending.append(trade)
+            if self.spiller is None or self.spiller.done():
+                self.spiller = asyncio.create_task(self._spill_pending())
+
+    async def _spill_pending(self):
+        while self.spill_pending:
+            trades, self.spill_pending = self.spill_pending, []
+            await asyncio.to_thread(self._spill, trades)
+
+    def _spill(self, trades):
+        with self.spill_lock, open(self.spill_path, "a", encoding="utf-8") as spill_file:
+            for trade in trades:
+                spill_file.write(json_util.dumps(trade) + "\n")
+            spill_file.flush()
+            os.fsync(spill_file.fileno())
+        self.stats["spilled"] += len(trades)
+        self.needs_replay = True
+
+    async def _insert(self, trades):
+        """insert_many, treating already written records (duplicate _id) as written. Runs the on_written hooks with the new ones."""
+        inserted = trades
+        try:
+            await self.collection.insert_many(trades, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])) or e.details.get("writeConcernErrors"):
+                raise
+            duplicates = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted = [trade for index, trade in enumerate(trades) if index not in duplicates]
+        for hook in self.on_written if inserted else ():
+            try:
+                await hook(inserted)
+            except Exception as e:
+                #The records are written, only the derived data is behind. Not a reason to spill them.
+                print(f"Trade ledger: {hook.__name__} failed for {len(inserted)} trades ({e})")
+
+    async def _flush(self, trades):
+        """Writes a batch, or spills it. Returns True if it was written."""
+        try:
+            await self._insert(trades)
+            self.stats["written"] += len(trades)
+            return True
+        except Exception as e:
+            print(f"Trade ledger: insert of {len(trades)} trades failed ({e}), spilling to {self.spill_path}")
+            await asyncio.to_thread(self._spill, trades)
+            return False
+
+    def _maybe_replay(self):
+        #MongoDB takes writes again: replay what was spilled meanwhile, in the background so the queue keeps flushing
+        now = asyncio.get_running_loop().time()
+        if not self.needs_replay or now < self.next_replay or (self.replayer is not None and not self.replayer.done()):
+            return
+        self.next_replay = now + TRADE_LEDGER_REPLAY_SECONDS
+        self.replayer = asyncio.create_task(self._replay_in_background())
+
+    async def _replay_in_background(self):
+        self.needs_replay = False
+        try:
+            replayed = await self.replay_spill()
+            if replayed:
+                print(f"Trade ledger: replayed {replayed} spilled trades")
+        except Exception as e:
+            self.needs_replay = True
+            print(f"Trade ledger: spill replay failed ({e}), will retry")
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            #Kept until written, so stop() can flush it again if the writer is cancelled mid insert (a rewrite is a no-op)
+            self.in_flight = batch
+            if await self._flush(batch):
+                self._maybe_replay()
+            self.in_flight = []
+
+    @staticmethod
+    def _read_replay(replay_path):
+        with open(replay_path, encoding="utf-8") as replay_file:
+            return [json_util.loads(line) for line in replay_file if line.strip()]
+
+    async def replay_spill(self):
+        """Writes the records of previous spill files to MongoDB. The file is renamed first, so records spilled meanwhile are kept."""
+        replay_path = f"{self.spill_path}.replay"
+        replayed = 0
+        #A .replay file left by an interrupted replay goes first, then the current spill file
+        while os.path.exists(replay_path) or os.path.exists(self.spill_path):
+            if not os.path.exists(replay_path):
+                os.replace(self.spill_path, replay_path)
+            trades = await asyncio.to_thread(self._read_replay, replay_path)
+            for start in range(0, len(trades), self.batch_size):
+                await self._insert(trades[start:start + self.batch_size])
+            os.remove(replay_path)
+            replayed += len(trades)
+        self.stats["replayed"] += replayed
+        return replayed
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        try:
+            replayed = await self.replay_spill()
+            if replayed:
+                print(f"Trade ledger: replayed {replayed} spilled trades")
+        except Exception as e:
+            self.needs_replay = True
+            print(f"Trade ledger: spill replay failed ({e}), will retry once MongoDB takes writes")
+        self.writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the writer and flushes whatever is still queued (spilled if MongoDB can't take it)."""
+        if self.replayer is not None:
+            #An interrupted replay leaves its .replay file, the next start replays it first
+            self.replayer.cancel()
+            try:
+                await self.replayer
+            except asyncio.CancelledError:
+                pass
+            self.replayer = None
+        if self.writer is not None:
+            self.writer.cancel()
+            try:
+                await self.writer
+            except asyncio.CancelledError:
+                pass
+            self.writer = None
+        remaining, self.in_flight = self.in_flight, []
+        while self.queue is not None and not self.queue.empty():
+            remaining.append(self.queue.get_nowait())
+        self.queue = None
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        if self.spiller is not None:
+            await self.spiller
+            self.spiller = None
+
+trade_ledger = TradeLedger(on_written=(apply_rollups, apply_candles))
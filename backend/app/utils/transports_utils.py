@@ -1,101 +1,110 @@
-from typing import List
-from geopy.distance import geodesic
-from pydantic import Field
-# import networkx as nx
-
-from pydantic import BaseModel
-from typing import Optional
-#import optional
-
-class Transport(BaseModel):
-    name: str
-    speed: Optional[int] = Field(None, gt=0)
-    capacity: Optional[int] = Field(None, gt=0)
-    base_cost_per_km: Optional[float] = Field(None, gt=0)
-    base_cost_per_kg: Optional[float] = Field(None, gt=0)
-    edit: bool = False
-
-weight_unit_conversion_table = [
-    {
-        "name": "Silk",
-        "unit": "meter",
-        "per_unit_mass": 0.04 #40 grams/meter
-    },
-    {
-        "name": "Gems",
-        "unit": "carat",
-        "per_unit_mass": 0.0002
-    },
-    {
-        "name": "Textiles",
-        "unit": "meter",
-        "per_unit_mass": 0.15
-    },
-    {
-        "name": "Gold",
-        "unit": "ounce",
-        "per_unit_mass": 0.028
-    },
-    {
-        "name": "Paper",
-        "unit": "sheet",
-        "per_unit_mass": 0.005
-    },
-    {
-        "name": "Glassware", #Assume a glass cup
-        "unit": "piece",
-        "per_unit_mass": 0.3
-    },
-    {
-        "name": "Perfume",
-        "unit": "bottle",
-        "per_unit_mass": 0.2 #Assuming a 100ml bottle
-    },
-    {
-        "name": "Cotton",
-        "unit": "meter",
-        "per_unit_mass": 0.15
-    },
-    {
-        "name": "Lacquerware",
-        "unit": "piece",
-        "per_unit_mass": 0.05 #50 gms
-    },
-    {
-        "name": "Porcelain",
-        "unit": "piece",
-        "per_unit_mass": 0.250 #250 gms
-    },
-    {
-        "name": "Timber",
-        "unit": "meter",
-        "per_unit_mass": 15
-    },
-    {
-        "name": "Wine",
-        "unit": "liter",
-        "per_unit_mass": 1 #for trade purposes, I'll keep it at 1.
-    },
-    {
-        "name": "Honey",
-        "unit": "liter",
-        "per_unit_mass": 1.4
-    }
-]
-
-
-def direct_distance_calculator(coords1, coords2):
-    return round(geodesic(coords1, coords2).km, 1)
-
-def calculate_transport_cost(distance: int, weight: int, transport_methods: List[Transport]):
-    options = []
-    for method in transport_methods:
-        cost = round(method["base_cost_per_km"] * distance + method["base_cost_per_kg"] * weight * distance, 0)
-        time = round(distance / method["speed"], 0)
-        options.append({
-            "name": method["name"],
-            "cost": cost,
-            "time": time
-        })
-    
-    return options
+from typing import List
+from backend.app.utils.geo_utils import pairwise_distance_km, DEFAULT_DISTANCE_METHOD
+from pydantic import Field
+# import networkx as nx
+
+from pydantic import BaseModel
+from typing import Optional
+#import optional
+
+class Transport(BaseModel):
+    name: str
+    speed: Optional[int] = Field(None, gt=0)
+    capacity: Optional[int] = Field(None, gt=0)
+    base_cost_per_km: Optional[float] = Field(None, gt=0)
+    base_cost_per_kg: Optional[float] = Field(None, gt=0)
+    edit: bool = False
+
+weight_unit_conversion_table = [
+    {
+        "name": "Silk",
+        "unit": "meter",
+        "per_unit_mass": 0.04 #40 grams/meter
+    },
+    {
+        "name": "Gems",
+        "unit": "carat",
+        "per_unit_mass": 0.0002
+    },
+    {
+        "name": "Textiles",
+        "unit": "meter",
+        "per_unit_mass": 0.15
+    },
+    {
+        "name": "Gold",
+        "unit": "ounce",
+        "per_unit_mass": 0.028
+    },
+    {
+        "name": "Paper",
+        "unit": "sheet",
+        "per_unit_mass": 0.005
+    },
+    {
+        "name": "Glassware", #Assume a glass cup
+        "unit": "piece",
+        "per_unit_mass": 0.3
+    },
+    {
+        "name": "Perfume",
+        "unit": "bottle",
+        "per_unit_mass": 0.2 #Assuming a 100ml bottle
+    },
+    {
+        "name": "Cotton",
+        "unit": "meter",
+        "per_unit_mass": 0.15
+    },
+    {
+        "name": "Lacquerware",
+        "unit": "piece",
+        "per_unit_mass": 0.05 #50 gms
+    },
+    {
+        "name": "Porcelain",
+        "unit": "piece",
+        "per_unit_mass": 0.250 #250 gms
+    },
+    {
+        "name": "Timber",
+        "unit": "meter",
+        "per_unit_mass": 15
+    },
+    {
+        "name": "Wine",
+        "unit": "liter",
+        "per_unit_mass": 1 #for trade purposes, I'll keep it at 1.
+    },
+    {
+        "name": "Honey",
+        "unit": "liter",
+        "per_unit_mass": 1.4
+    }
+]
+
+
+#The table is part of the code, so it is indexed once at import instead of going through the catalog cache
+unit_mass_index = {(entry["name"], entry["unit"]): entry["per_unit_mass"] for entry in weight_unit_conversion_table}
+
+def calculate_good_weight(name: str, unit: str, quantity: float):
+    """Weight in kg of `quantity` units of a good. Goods measured in kg are taken as is, others go through weight_unit_conversion_table (0 if no entry)."""
+    if unit == "kg":
+        return quantity
+    return quantity * unit_mass_index.get((name, unit), 0)
+
+def direct_distance_calculator(coords1, coords2, method: str = DEFAULT_DISTANCE_METHOD):
+    return round(float(pairwise_distance_km(coords1[0], coords1[1], coords2[0], coords2[1], method)[0]), 1)
+
+def calculate_transport_cost(distance: int, weight: int, transport_methods: List[Transport]):
+    options = []
+    for method in transport_methods:
+        cost = round(method["base_cost_per_km"] * distance + method["base_cost_per_kg"] * weight * distance, 0)
+        time = round(distance / method["speed"], 0)
+        options.append({
+            "name": method["name"],
+            "cost": cost,
+            "time": time
+        })
+    
+    return options
@@ -0,0 +1,28 @@
+#Cost of an uncached arbitrage query (see arbitrage_utils) over a synthetic market, no MongoDB.
+#Usage: python -m backend.benchmarks.bench_arbitrage --outposts 200 --goods 500 --k 10
+import argparse, time
+import numpy as np
+
+from backend.app.utils.arbitrage_utils import top_opportunities
+
+def run(outposts, goods, k):
+    rng = np.random.default_rng(0)
+    ask = np.where(rng.random((outposts, goods)) < 0.6, rng.integers(1, 500, (outposts, goods)).astype(np.float64), np.nan)
+    market = {"outposts": [f"outpost{i}" for i in range(outposts)], "goods": [f"good{j}" for j in range(goods)],
+              "ask": ask, "stock": rng.integers(0, 1000, (outposts, goods)).astype(np.float64)}
+    coords = rng.uniform(0, 3000, (outposts, 2))
+    distances = np.linalg.norm(coords[:, None] - coords[None, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+
+    start = time.perf_counter()
+    results = top_opportunities(market, distances, "caravan", 2.5, k, 100)
+    elapsed = time.perf_counter() - start
+    print(f"{outposts} outposts x {goods} goods ({outposts * outposts * goods:,} candidate trades): {elapsed * 1000:.1f} ms, best profit {results[0]['profit'] if results else None}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outposts", type=int, default=200)
+    parser.add_argument("--goods", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    run(args.outposts, args.goods, args.k)
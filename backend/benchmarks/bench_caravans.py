@@ -0,0 +1,44 @@
+#Cost of the caravan tick scheduler and of position interpolation (see caravan_utils), with synthetic routes and no MongoDB.
+#Usage: python -m backend.benchmarks.bench_caravans --caravans 50000 --routes 200
+import argparse, time
+import numpy as np
+
+from backend.app.utils.caravan_utils import CaravanSimulation, Polyline
+
+def run(caravans, routes, points, ticks):
+    rng = np.random.default_rng(0)
+    polylines = [Polyline(np.cumsum(rng.normal(0, 0.01, (points, 2)), axis=0) + [45.0, 80.0]) for _ in range(routes)]
+
+    simulation = CaravanSimulation()
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(caravans):
+        route = int(rng.integers(routes))
+        departed_at = now - rng.uniform(0, 3600)
+        simulation.add(f"user{i}", {"route_key": f"{route}:forward", "destination_id": str(route),
+                                    "departed_at": departed_at, "arrival_at": departed_at + rng.uniform(60, 7200)}, polylines[route])
+    print(f"add {caravans} caravans: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    #Every caravan's position, as /transports/caravans computes it
+    start = time.perf_counter()
+    positions = simulation.positions(now)
+    print(f"positions of {len(positions)} caravans on {routes} routes of {points} points: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    #One tick a second of game clock, only arrived caravans are touched
+    durations, arrived = [], 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        arrived += len(simulation.pop_arrivals(now + tick))
+        durations.append(time.perf_counter() - start)
+    durations = np.array(durations) * 1000
+    print(f"{ticks} ticks: {arrived} arrivals, {len(simulation.caravans)} still travelling, "
+          f"tick p50 {np.percentile(durations, 50):.3f} ms, p99 {np.percentile(durations, 99):.3f} ms, max {durations.max():.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--caravans", type=int, default=50000)
+    parser.add_argument("--routes", type=int, default=200)
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=3600)
+    args = parser.parse_args()
+    run(args.caravans, args.routes, args.points, args.ticks)
@@ -0,0 +1,39 @@
+#Cargo planner (see cargo_utils) on synthetic outposts: time and profit of the greedy plan alone vs plan_cargo (DP + top up), no MongoDB.
+#Usage: python -m backend.benchmarks.bench_cargo --goods 20 50 200 --runs 20
+import argparse, time
+import numpy as np
+
+from backend.app.utils.cargo_utils import CargoItem, greedy_plan, plan_cargo, _totals
+
+def synthetic_items(rng, goods):
+    return [CargoItem(f"good{j}", "kg", float(rng.integers(1, 400)), float(rng.uniform(0.05, 40)), float(rng.uniform(-20, 120)), int(rng.integers(1, 500)))
+            for j in range(goods)]
+
+def run(goods_counts, runs):
+    rng = np.random.default_rng(0)
+    for goods in goods_counts:
+        greedy_times, plan_times, gains = [], [], []
+        for _ in range(runs):
+            seed = int(rng.integers(1 << 31))
+            budget, capacity = float(rng.integers(500, 20000)), float(rng.integers(100, 3000))
+
+            items = [item for item in synthetic_items(np.random.default_rng(seed), goods) if item.profit > 0]
+            start = time.perf_counter()
+            greedy_profit = _totals(items, greedy_plan(items, budget, capacity))[2]
+            greedy_times.append(time.perf_counter() - start)
+
+            items = synthetic_items(np.random.default_rng(seed), goods)
+            start = time.perf_counter()
+            plan = plan_cargo(items, budget, capacity)
+            plan_times.append(time.perf_counter() - start)
+            gains.append(plan["profit"] / greedy_profit if greedy_profit > 0 else 1)
+
+        print(f"{goods} goods: greedy {np.median(greedy_times) * 1000:.2f} ms, plan_cargo {np.median(plan_times) * 1000:.1f} ms "
+              f"(max {max(plan_times) * 1000:.1f} ms), profit vs greedy: mean x{np.mean(gains):.3f}, best x{max(gains):.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--goods", type=int, nargs="+", default=[20, 50, 200])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    run(args.goods, args.runs)
@@ -0,0 +1,36 @@
+#Concurrency benchmark for the API. Fires N concurrent clients at one endpoint and prints requests/sec.
+#Run it once against the old sync-pymongo build and once against the async build to compare.
+#Usage: python -m backend.benchmarks.bench_concurrency --url "http://localhost:8004/transports/transport_profile?user_id=test" --clients 200 --requests 5000
+import argparse, asyncio, time
+import httpx
+
+async def worker(client, url, counter, latencies):
+    while counter["left"] > 0:
+        counter["left"] -= 1
+        start = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            counter["errors"] += 1
+
+async def run(url, clients, total_requests):
+    counter = {"left": total_requests, "errors": 0}
+    latencies = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client, url, counter, latencies) for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"clients={clients} requests={len(latencies)} errors={counter['errors']}")
+    print(f"requests/sec: {len(latencies) / elapsed:.1f}")
+    print(f"p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.clients, args.requests))
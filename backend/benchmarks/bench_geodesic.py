@@ -0,0 +1,39 @@
+#Throughput and accuracy of the route distance engine (geo_utils) against the old per-pair geopy loop.
+#Usage: python -m backend.benchmarks.bench_geodesic --points 100000
+import argparse, time
+import numpy as np
+from geopy.distance import geodesic
+
+from backend.app.utils.geo_utils import DISTANCE_METHODS, segment_distances_km, polyline_length_km
+
+def random_track(points, seed=0):
+    #Random walk with ~1 km steps, looks like a dense GPX track
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.01, (points, 2))
+    return np.cumsum(steps, axis=0) + [45.0, 80.0]
+
+def run(points, reference_points):
+    track = random_track(points)
+
+    start = time.perf_counter()
+    reference = [geodesic(track[i - 1], track[i]).km for i in range(1, reference_points)]
+    geopy_time = (time.perf_counter() - start) * (points / reference_points)
+    print(f"geopy loop (extrapolated to {points} points): {geopy_time:.2f}s")
+
+    reference = np.array(reference)
+    for method in DISTANCE_METHODS:
+        sample = track if method != "karney" else track[:reference_points]
+        start = time.perf_counter()
+        polyline_length_km(sample, method)
+        elapsed = time.perf_counter() - start
+        if method == "karney":
+            elapsed *= points / reference_points
+        error = np.abs(segment_distances_km(track[:reference_points], method) - reference)
+        print(f"{method:>9}: {elapsed:.3f}s, max error vs geopy {error.max() * 1000:.6f} m, max relative error {(error / np.maximum(reference, 1e-9)).max():.2e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--reference_points", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.points, args.reference_points)
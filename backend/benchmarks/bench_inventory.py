@@ -0,0 +1,77 @@
+#Trade latency against inventory size: the old embedded user.inventory dict (read and rewritten whole by sell_goods, trade_ids
+#growing forever) against one users.inventory row per good (see inventory_utils).
+#Without --mongo it measures the BSON encode + decode of what each layout moves per trade. With --mongo it times real updates
+#on a scratch database of that server.
+#Usage: python -m backend.benchmarks.bench_inventory --goods 10 100 1000 --trades 200 [--mongo mongodb://localhost:27017/]
+import argparse, datetime, time, uuid
+import bson
+
+from backend.app.utils.inventory_utils import RECENT_TRADES_WINDOW
+
+def embedded_user(goods, trades):
+    now = datetime.datetime.now()
+    return {"username": "bench", "money": 10 ** 6, "inventory": {
+        f"good{i}": {"quantity": 100, "average_price": 10.0, "unit": "kg", "created_at": now, "updated_at": now,
+                     "trade_ids": [uuid.uuid4().hex for _ in range(trades)]}
+        for i in range(goods)
+    }}
+
+def inventory_row(trades):
+    now = datetime.datetime.now()
+    return {"username": "bench", "good_id": "good0", "quantity": 100, "average_price": 10.0, "unit": "kg", "created_at": now, "updated_at": now,
+            "recent_trade_ids": [uuid.uuid4().hex for _ in range(min(trades, RECENT_TRADES_WINDOW))]}
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run_offline(goods_sizes, trades, repeat):
+    row = bson.encode(inventory_row(trades))
+    for goods in goods_sizes:
+        user = bson.encode(embedded_user(goods, trades))
+        #Old sell_goods: read the whole user, rewrite the whole inventory
+        embedded_ms = timed(lambda: bson.encode(bson.decode(user)), repeat)
+        row_ms = timed(lambda: bson.encode(bson.decode(row)), repeat)
+        print(f"goods={goods:>5} trades/good={trades}: embedded user {len(user) / 1024:9.1f} KiB, {embedded_ms:8.3f} ms/trade | "
+              f"inventory row {len(row) / 1024:.1f} KiB, {row_ms:.4f} ms/trade")
+
+def run_mongo(uri, goods_sizes, trades, repeat):
+    from pymongo import MongoClient
+    from pymongo import UpdateOne
+    client = MongoClient(uri)
+    db = client["bench_inventory"]
+    for goods in goods_sizes:
+        db.drop_collection("users")
+        db.drop_collection("inventory")
+        user = embedded_user(goods, trades)
+        db["users"].insert_one(user)
+        db["inventory"].insert_many([{**inventory_row(trades), "good_id": f"good{i}"} for i in range(goods)])
+        db["inventory"].create_index([("username", 1), ("good_id", 1)], unique=True)
+
+        def embedded_trade():
+            document = db["users"].find_one({"username": "bench"})
+            document["inventory"]["good0"]["quantity"] -= 1
+            document["inventory"]["good0"]["trade_ids"].append(uuid.uuid4().hex)
+            db["users"].update_one({"username": "bench"}, {"$set": {"inventory": document["inventory"]}})
+
+        def row_trade():
+            db["inventory"].update_one({"username": "bench", "good_id": "good0", "quantity": {"$gte": 1}},
+                                       {"$inc": {"quantity": -1}, "$push": {"recent_trade_ids": {"$each": [uuid.uuid4().hex], "$slice": -RECENT_TRADES_WINDOW}}})
+
+        print(f"goods={goods:>5} trades/good={trades}: embedded {timed(embedded_trade, repeat):8.3f} ms/trade | inventory row {timed(row_trade, repeat):.3f} ms/trade")
+    client.drop_database("bench_inventory")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--goods", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--trades", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--mongo", default=None)
+    args = parser.parse_args()
+    if args.mongo:
+        run_mongo(args.mongo, args.goods, args.trades, args.repeat)
+    else:
+        run_offline(args.goods, args.trades, args.repeat)
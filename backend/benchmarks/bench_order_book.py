@@ -0,0 +1,48 @@
+#Throughput of the order book matching engine (see order_book_utils): resting inserts, cancels and crossing orders, no MongoDB.
+#Usage: python -m backend.benchmarks.bench_order_book --orders 200000
+import argparse, time
+import numpy as np
+
+from backend.app.utils.order_book_utils import OrderBook, Order
+
+def rate(count, seconds):
+    return f"{count / seconds:>12,.0f} orders/s ({seconds / count * 1e6:.2f} us/order)"
+
+def run(orders):
+    rng = np.random.default_rng(0)
+    prices = np.round(rng.normal(100, 5, orders), 1).tolist()
+    quantities = rng.integers(1, 50, orders).tolist()
+    book = OrderBook("outpost", "good")
+
+    #Non-crossing orders that rest in the book: bids below 100, asks above
+    resting = []
+    start = time.perf_counter()
+    for i in range(orders):
+        side = "buy" if i % 2 else "sell"
+        price = min(prices[i], 99.9) if side == "buy" else max(prices[i], 100.1)
+        order = Order(str(i), "user", side, price, quantities[i], "kg", i, None)
+        book.submit(order)
+        resting.append(order.order_id)
+    print(f"insert: {rate(orders, time.perf_counter() - start)}, {len(book.orders)} resting")
+
+    #Cancel half of them, in random order
+    cancel_ids = rng.permutation(resting)[:orders // 2].tolist()
+    start = time.perf_counter()
+    for order_id in cancel_ids:
+        book.cancel(order_id)
+    print(f"cancel: {rate(len(cancel_ids), time.perf_counter() - start)}, {len(book.orders)} resting")
+
+    #Aggressive orders that cross the spread and walk the book
+    fills = 0
+    start = time.perf_counter()
+    for i in range(orders // 2):
+        side = "buy" if i % 2 else "sell"
+        order = Order(f"m{i}", "taker", side, 200.0 if side == "buy" else 1.0, quantities[i], "kg", orders + i, None)
+        fills += len(book.submit(order))
+    print(f"match:  {rate(orders // 2, time.perf_counter() - start)}, {fills} fills, {len(book.orders)} resting")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.orders)
@@ -0,0 +1,101 @@
+#Cost of one pricing pass (see pricing_utils), no MongoDB:
+# - compute: compute_prices alone, over arrays that are already built
+# - reprice: reprice_goods end to end against stub collections. The goods are stored as BSON and decoded by find().to_list(),
+#   the bulk_write operations are BSON encoded and dropped, so load, array building and write preparation are all measured.
+#Usage: python -m backend.benchmarks.bench_pricing --outposts 500 --goods 10000 --density 0.1
+import argparse, asyncio, datetime, time
+import bson
+import numpy as np
+
+from backend.app.utils import pricing_utils
+from backend.app.utils.pricing_utils import compute_prices, reprice_goods, season_index, SEASONS, SEASONAL_FACTORS
+
+def run_compute(outposts, goods, density, repeat):
+    rng = np.random.default_rng(0)
+    shape = (outposts, goods)
+    present = rng.random(shape) < density
+    base_price = rng.integers(1, 500, shape).astype(np.float64)
+    stock = rng.integers(0, 5000, shape).astype(np.float64)
+    demand = np.where(rng.random(shape) < 0.05, 1.0, 0.0)
+    seasonal = np.tile([SEASONAL_FACTORS[season] for season in SEASONS], (goods, 1))
+    seasons = season_index(datetime.date(2025, 1, 15), rng.uniform(-60, 70, outposts))
+    event_factor = np.where(rng.random((outposts, 1)) < 0.1, 1.5, 1.0)
+    current = compute_prices(base_price, stock, present, demand, seasonal[:, seasons].T, event_factor)
+    stock = np.maximum(stock + rng.integers(-500, 500, shape), 0)
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prices = compute_prices(base_price, stock, present, demand, seasonal[:, seasons].T, event_factor)
+        changed = np.count_nonzero(present & (prices != current))
+        durations.append(time.perf_counter() - start)
+    print(f"compute: {outposts} outposts x {goods} goods ({present.sum():,} priced goods): {np.median(durations) * 1000:.1f} ms per pass, {changed:,} prices changed")
+
+class StubCursor:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def to_list(self):
+        start = time.perf_counter()
+        documents = bson.decode_all(self.collection.data)
+        self.collection.read_seconds += time.perf_counter() - start
+        return documents
+
+class StubCollection:
+    """find() decodes the stored BSON, bulk_write encodes the operations. Writes are not applied, every pass does the same work."""
+    def __init__(self, documents=()):
+        self.data = b"".join(bson.encode(document) for document in documents)
+        self.read_seconds = self.write_seconds = 0.0
+
+    def find(self, *args, **kwargs):
+        return StubCursor(self)
+
+    async def bulk_write(self, requests, ordered=True):
+        start = time.perf_counter()
+        for request in requests:
+            bson.encode({"q": request._filter, "u": request._doc})
+        self.write_seconds += time.perf_counter() - start
+
+def stub_outposts(outposts, goods, density):
+    rng = np.random.default_rng(1)
+    regions = [f"region{r}" for r in range(10)]
+    spawn_points = [{"id": f"outpost{i}", "region": regions[i % len(regions)], "latitude": float(rng.uniform(-60, 70)),
+                     "goods_demanded": [{"name": f"good{j}", "quantity": 100} for j in rng.choice(goods, 5, replace=False).tolist()]}
+                    for i in range(outposts)]
+    present = rng.random((outposts, goods)) < density
+    prices = rng.integers(1, 500, (outposts, goods))
+    stock = rng.integers(0, 5000, (outposts, goods))
+    goods_documents = [{"_id": bson.ObjectId(), "outpost_id": f"outpost{i}", "name": f"good{j}", "quantity": int(stock[i, j]),
+                        "price": int(prices[i, j]), "base_price": int(prices[i, j])}
+                       for i, j in zip(*np.nonzero(present))]
+    events = [{"region": regions[0], "goods": "*", "multiplier": 1.5}]
+    return {"spawn_points": StubCollection(spawn_points), "goods": StubCollection(goods_documents), "market_events": StubCollection(events)}
+
+def run_reprice(outposts, goods, density, repeat):
+    collections = stub_outposts(outposts, goods, density)
+    pricing_utils.mongo_client = {"outposts": collections}
+    priced = len(bson.decode_all(collections["goods"].data))
+
+    durations, reads, writes = [], [], []
+    for _ in range(repeat):
+        for collection in collections.values():
+            collection.read_seconds = collection.write_seconds = 0.0
+        start = time.perf_counter()
+        changed = asyncio.run(reprice_goods(datetime.datetime(2025, 1, 15)))
+        durations.append(time.perf_counter() - start)
+        reads.append(sum(collection.read_seconds for collection in collections.values()))
+        writes.append(collections["goods"].write_seconds)
+    total, read, write = np.median(durations), np.median(reads), np.median(writes)
+    print(f"reprice: {outposts} outposts x {goods} goods ({priced:,} priced goods): {total * 1000:.0f} ms per pass, {changed:,} prices changed")
+    print(f"  load (BSON decode): {read * 1000:.0f} ms, bulk_write (BSON encode): {write * 1000:.0f} ms, "
+          f"arrays + pricing + building the updates: {(total - read - write) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outposts", type=int, default=500)
+    parser.add_argument("--goods", type=int, default=10000)
+    parser.add_argument("--density", type=float, default=0.1, help="share of the outposts x goods cells that are sold")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run_compute(args.outposts, args.goods, args.density, args.repeat)
+    run_reprice(args.outposts, args.goods, args.density, args.repeat)
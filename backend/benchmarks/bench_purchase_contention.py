@@ -0,0 +1,62 @@
+#Contention benchmark for /trades/purchase_goods. Many buyers hit the same good at the same time.
+#Seeds one good and N bench players straight into MongoDB, calls the purchase handler concurrently, then checks nothing was oversold.
+#The trade ledger runs as in the app but writes to a scratch database (--ledger_db, dropped at the end) and a scratch spill file,
+#without the rollup/candle hooks, so the bench trades never reach trades.purchases or the spill file the server replays.
+#Usage: python -m backend.benchmarks.bench_purchase_contention --buyers 500 --stock 200 --quantity 1 --outpost_id <existing spawn id>
+import argparse, asyncio, os, tempfile, time
+
+from backend.app.utils.mongo_utils import mongo_client, connect_mongo_client, close_mongo_client
+from backend.app.utils.inventory_utils import inventory_collection
+from backend.app.utils.trade_ledger_utils import trade_ledger
+from backend.app.routers.trades import purchase_goods
+
+GOOD_NAME = "BenchGood"
+
+async def run(buyers, stock, quantity, outpost_id, ledger_db):
+    await connect_mongo_client()
+    goods_collection = mongo_client["outposts"]["goods"]
+    users_collection = mongo_client["users"]["metaverse_users"]
+    usernames = [f"bench_buyer_{i}" for i in range(buyers)]
+
+    spill_dir = tempfile.mkdtemp(prefix="bench_ledger_")
+    trade_ledger.database_name = ledger_db
+    trade_ledger.spill_path = os.path.join(spill_dir, "spill.jsonl")
+    trade_ledger.on_written = ()
+    await trade_ledger.start()
+
+    await goods_collection.delete_many({"name": GOOD_NAME, "outpost_id": outpost_id})
+    await goods_collection.insert_one({"type": "good", "name": GOOD_NAME, "outpost_id": outpost_id, "price": 1, "quantity": stock, "unit": "kg"})
+    await users_collection.delete_many({"username": {"$in": usernames}})
+    await users_collection.insert_many([{"username": u, "current_outpost_id": outpost_id, "money": 10 ** 6, "merchandise_weight": 0} for u in usernames])
+
+    try:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[purchase_goods(u, GOOD_NAME, quantity, outpost_id) for u in usernames])
+        elapsed = time.perf_counter() - start
+
+        successes = sum(1 for r in responses if r.status_code == 200)
+        final_stock = (await goods_collection.find_one({"name": GOOD_NAME, "outpost_id": outpost_id}))["quantity"]
+        print(f"buyers={buyers} stock={stock} quantity={quantity} elapsed={elapsed:.2f}s ({buyers / elapsed:.0f} purchases/sec)")
+        print(f"successful purchases={successes}, final stock={final_stock}")
+        print("OVERSOLD" if final_stock < 0 or successes * quantity != stock - final_stock else "No oversell")
+    finally:
+        await trade_ledger.stop()
+        print(f"ledger: {trade_ledger.stats}")
+        await goods_collection.delete_many({"name": GOOD_NAME, "outpost_id": outpost_id})
+        await users_collection.delete_many({"username": {"$in": usernames}})
+        await inventory_collection().delete_many({"username": {"$in": usernames}})
+        await mongo_client.drop_database(ledger_db)
+        for name in os.listdir(spill_dir):
+            os.remove(os.path.join(spill_dir, name))
+        os.rmdir(spill_dir)
+        await close_mongo_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--outpost_id", required=True)
+    parser.add_argument("--ledger_db", default="bench_trades")
+    args = parser.parse_args()
+    asyncio.run(run(args.buyers, args.stock, args.quantity, args.outpost_id, args.ledger_db))
@@ -0,0 +1,37 @@
+#Size and decode latency of the route storage formats (see polyline_utils), on a synthetic route document.
+#Usage: python -m backend.benchmarks.bench_route_encoding --points 10000
+import argparse, time
+import bson
+import numpy as np
+
+from backend.app.utils.polyline_utils import encode_route_binary, route_points, encode_google_polyline
+
+def timed(function, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run(points):
+    rng = np.random.default_rng(0)
+    route = (np.cumsum(rng.normal(0, 0.01, (points, 2)), axis=0) + [45.0, 80.0]).tolist()
+
+    documents = {
+        "array": {"route": route},
+        "float32": {"route_bin": encode_route_binary(route, "float32"), "route_encoding": "float32"},
+        "delta_int32": {"route_bin": encode_route_binary(route, "delta_int32"), "route_encoding": "delta_int32"},
+    }
+    for name, document in documents.items():
+        raw = bson.encode(document)
+        decode_ms = timed(lambda: route_points(bson.decode(raw)))
+        error = np.abs(route_points(bson.decode(raw)) - np.array(route)).max()
+        print(f"{name:>12}: {len(raw) / 1024:8.1f} KiB ({len(raw) / points:.1f} B/point), BSON decode to numpy {decode_ms:.3f} ms, max error {error:.2e} deg")
+
+    polyline = encode_google_polyline(route)
+    print(f"{'polyline':>12}: {len(polyline) / 1024:8.1f} KiB ({len(polyline) / points:.1f} B/point) as a JSON string for clients, encode {timed(lambda: encode_google_polyline(route), 5):.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=10000)
+    args = parser.parse_args()
+    run(args.points)
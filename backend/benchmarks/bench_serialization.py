@@ -0,0 +1,60 @@
+#Serializing the goods of one outpost (see response_utils): the old str(goods) repr and stdlib json against orjson, whole
+#documents and projected ones, and the NDJSON stream. No MongoDB, the documents are built in memory.
+#Usage: python -m backend.benchmarks.bench_serialization --goods 10000 --repeat 20
+import argparse, asyncio, datetime, json, time
+from bson import ObjectId, json_util
+
+from backend.app.utils.response_utils import dumps, ndjson_lines
+
+def outpost_goods(goods):
+    now = datetime.datetime.now()
+    return [{"_id": ObjectId(), "type": "good", "name": f"good{i}", "outpost_id": "outpost0", "price": 10 + i % 500, "base_price": 10 + i % 500,
+             "quantity": i * 7 % 1000, "unit": "kg", "last_updated": now, "last_priced": now} for i in range(goods)]
+
+def project(documents, fields):
+    return [{field: document[field] for field in fields} for document in documents]
+
+class ListCursor:
+    def __init__(self, documents):
+        self.documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+async def ndjson(documents):
+    return sum([len(chunk) async for chunk in ndjson_lines(ListCursor(documents))])
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = function()
+    return (time.perf_counter() - start) / repeat * 1000, size
+
+def run(goods, repeat):
+    documents = outpost_goods(goods)
+    projected = project(documents, ("name", "price", "quantity", "unit"))
+    cases = [
+        ("str(goods) (old, not JSON)", lambda: len(str({"outpost": "outpost0", "goods": str(documents)}))),
+        ("json.dumps default=str", lambda: len(json.dumps({"outpost": "outpost0", "goods": documents}, default=str))),
+        ("bson json_util.dumps", lambda: len(json_util.dumps({"outpost": "outpost0", "goods": documents}))),
+        ("orjson (BSONResponse)", lambda: len(dumps({"outpost": "outpost0", "goods": documents}))),
+        ("orjson, 4 projected fields", lambda: len(dumps({"outpost": "outpost0", "goods": projected}))),
+        ("orjson NDJSON stream", lambda: asyncio.run(ndjson(documents))),
+    ]
+    print(f"{goods} goods, {repeat} runs")
+    for name, function in cases:
+        elapsed, size = timed(function, repeat)
+        print(f"  {name:30s} {elapsed:8.2f} ms {size / 1024:8.0f} KiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--goods", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.goods, args.repeat)
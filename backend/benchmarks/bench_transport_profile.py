@@ -0,0 +1,30 @@
+#Latency of /transports/transport_profile, called in-process against the configured MongoDB. Prints p50/p99.
+#Run on the commit before and after the route cache to compare.
+#Usage: python -m backend.benchmarks.bench_transport_profile --user_id <username> --requests 2000
+import argparse, asyncio, time
+
+from backend.app.utils.mongo_utils import connect_mongo_client, close_mongo_client
+from backend.app.routers import transports
+
+async def run(user_id, requests):
+    await connect_mongo_client()
+    if hasattr(transports, "refresh_route_graph"):
+        await transports.refresh_route_graph()
+
+    await transports.transport_profile(user_id) #Warm up caches and the connection pool
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await transports.transport_profile(user_id)
+        latencies.append(time.perf_counter() - start)
+    await close_mongo_client()
+
+    latencies.sort()
+    print(f"requests={requests} p50={latencies[len(latencies) // 2] * 1000:.2f} ms p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user_id", required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.user_id, args.requests))
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+
+from backend.app.utils import geo_utils
+from backend.app.utils.geo_utils import pairwise_distance_km, segment_distances_km, polyline_length_km, simplify_route, build_route_levels, ROUTE_DETAIL_LEVELS
+
+#Reference: geopy.distance.geodesic (Karney, WGS-84). Tolerances:
+# - karney and vincenty: 1 mm, vincenty is documented as sub-millimetre
+# - haversine: 0.6% relative, the spherical earth is up to ~0.56% off the ellipsoid
+EXACT_TOLERANCE_KM = 1e-6
+HAVERSINE_RELATIVE_TOLERANCE = 6e-3
+
+EDGE_PAIRS = [
+    (0, 0, 0, 0),                  #coincident
+    (51.5, -0.12, 51.5, -0.12),    #coincident, off the equator
+    (0, 0, 0, 90),                 #along the equator
+    (0, -179.9, 0, 179.9),         #across the antimeridian
+    (89.9, 0, 89.9, 180),          #over the north pole
+    (-90, 0, 90, 0),               #pole to pole
+    (48.8566, 2.3522, 48.8567, 2.3523),  #about 13 m
+    (40.7128, -74.006, 34.0522, -118.2437),
+    (-33.8688, 151.2093, 51.5074, -0.1278),
+]
+
+#Nearly antipodal: Vincenty's iteration does not converge, these go through the geographiclib fallback
+ANTIPODAL_PAIRS = [
+    (0, 0, 0.5, 179.7),
+    (0, 0, 0, 179.5),
+    (0, 0, 0, 180),
+    (10, 20, -10, -160),
+    (45, 0, -45, 179.9),
+]
+
+def random_pairs(count, seed=0):
+    rng = np.random.default_rng(seed)
+    lat1, lat2 = rng.uniform(-90, 90, (2, count))
+    lon1, lon2 = rng.uniform(-180, 180, (2, count))
+    return [tuple(pair) for pair in np.column_stack([lat1, lon1, lat2, lon2]).tolist()]
+
+def reference_km(pairs):
+    return np.array([geodesic((lat1, lon1), (lat2, lon2)).km for lat1, lon1, lat2, lon2 in pairs])
+
+def distances_km(pairs, method):
+    lat1, lon1, lat2, lon2 = np.array(pairs, dtype=np.float64).T
+    return pairwise_distance_km(lat1, lon1, lat2, lon2, method)
+
+PAIRS = EDGE_PAIRS + random_pairs(500)
+
+@pytest.mark.parametrize("method", ["karney", "vincenty"])
+def test_ellipsoidal_methods_match_geopy(method):
+    np.testing.assert_allclose(distances_km(PAIRS, method), reference_km(PAIRS), rtol=0, atol=EXACT_TOLERANCE_KM)
+
+def test_haversine_within_spherical_error():
+    expected = reference_km(PAIRS)
+    np.testing.assert_allclose(distances_km(PAIRS, "haversine"), expected, rtol=HAVERSINE_RELATIVE_TOLERANCE, atol=EXACT_TOLERANCE_KM)
+
+@pytest.mark.parametrize("method", ["haversine", "vincenty", "karney"])
+def test_coincident_points_are_zero(method):
+    assert distances_km([(12.5, 45.25, 12.5, 45.25)], method)[0] == pytest.approx(0, abs=EXACT_TOLERANCE_KM)
+
+def test_vincenty_antipodal_falls_back_to_geographiclib(monkeypatch):
+    fallback_pairs = []
+    karney_km = geo_utils._karney_km
+
+    def counting_karney_km(lat1, lon1, lat2, lon2):
+        fallback_pairs.append(len(lat1))
+        return karney_km(lat1, lon1, lat2, lon2)
+
+    monkeypatch.setattr(geo_utils, "_karney_km", counting_karney_km)
+    pairs = ANTIPODAL_PAIRS + EDGE_PAIRS[-2:]
+    np.testing.assert_allclose(distances_km(pairs, "vincenty"), reference_km(pairs), rtol=0, atol=EXACT_TOLERANCE_KM)
+    #One batched fallback, for the antipodal pairs only
+    assert fallback_pairs == [len(ANTIPODAL_PAIRS)]
+
+def test_polyline_length_is_sum_of_geopy_segments():
+    points = [[48.8566, 2.3522], [50.8503, 4.3517], [52.3676, 4.9041], [52.52, 13.405]]
+    expected = [geodesic(a, b).km for a, b in zip(points, points[1:])]
+    np.testing.assert_allclose(segment_distances_km(points, "vincenty"), expected, rtol=0, atol=EXACT_TOLERANCE_KM)
+    assert polyline_length_km(points, "vincenty") == pytest.approx(sum(expected), abs=len(expected) * EXACT_TOLERANCE_KM)
+    assert polyline_length_km(points[:1]) == 0
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        pairwise_distance_km(0, 0, 1, 1, method="flat")
+
+@pytest.mark.parametrize("points", [[], [[48.85, 2.35]]])
+def test_route_levels_of_short_routes(points):
+    assert simplify_route(points, max_points=50) == (points, 0.0)
+    assert all(level["route"] == points for level in build_route_levels(points).values())
+
+def test_route_levels_respect_their_cap_on_ties():
+    #A zigzag of equal amplitude: every inner point has the same significance
+    points = [[0.0001 * (i % 2), 0.001 * i] for i in range(2000)]
+    levels = build_route_levels(points)
+    for max_points in ROUTE_DETAIL_LEVELS:
+        route = levels[str(max_points)]["route"]
+        assert len(route) == max_points
+        assert route[0] == points[0] and route[-1] == points[-1]
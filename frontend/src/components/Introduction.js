@@ -59,7 +59,7 @@ function Introduction() {
     const fetchRouteCoordinates = async () => {
       try {
         const response = await fetch(
-          `${config.backendUrl}/outposts/route_coordinates`,
+          `${config.backendUrl}/outposts/route_coordinates?zoom=3`,
           {
             method: "GET",
             headers: {
@@ -1,38 +1,80 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-# from .routers import users, outposts, trades, transports
-from backend.app.routers import users, outposts, trades, transports, auth, goods, trades, backup
-
-app = FastAPI(
-    title="Trading Outpost API",
-    description="API for managing trading outposts, users, and trades in the Trading Outpost game.",
-    version="1.0.0"
-)
-
-# CORS Setup (to allow React frontend in future)
-origins = [
-    "http://localhost:3000",  # React frontend
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Register Routers
-app.include_router(auth.router)
-app.include_router(outposts.router)
-app.include_router(trades.router)
-app.include_router(users.router)
-app.include_router(transports.router)
-app.include_router(goods.router)
-app.include_router(trades.router)
-app.include_router(backup.router)
-
-# Test route
-@app.get("/")
-async def root():
-    return {"message": "Welcome to the Trading Outpost API"}
\ No newline at end of file
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+# from .routers import users, outposts, trades, transports
+from backend.app.routers import users, outposts, trades, transports, auth, goods, trades, backup
+from backend.app.utils.mongo_utils import connect_mongo_client, close_mongo_client
+from backend.app.utils.route_graph_utils import refresh_route_graph, run_route_graph_checks
+from backend.app.utils.caravan_utils import run_caravan_ticks
+from backend.app.utils.trade_ledger_utils import trade_ledger
+from backend.app.utils.order_book_utils import start_order_books, stop_order_books, run_order_book_snapshots
+from backend.app.utils.pricing_utils import run_pricing
+from backend.app.utils.index_utils import ensure_indexes
+from backend.app.utils.response_utils import BSONResponse
+from backend.app.utils.catalog_cache_utils import catalog
+import asyncio
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    #One shared async MongoDB client for the whole app, opened on startup and closed on shutdown
+    await connect_mongo_client()
+    await catalog.start_pubsub()
+    await refresh_route_graph()
+    await ensure_indexes()
+    await trade_ledger.start()
+    await start_order_books()
+    caravan_ticks = asyncio.create_task(run_caravan_ticks())
+    order_book_snapshots = asyncio.create_task(run_order_book_snapshots())
+    pricing = asyncio.create_task(run_pricing())
+    route_graph_checks = asyncio.create_task(run_route_graph_checks())
+    yield
+    caravan_ticks.cancel()
+    order_book_snapshots.cancel()
+    pricing.cancel()
+    route_graph_checks.cancel()
+    await stop_order_books()
+    await trade_ledger.stop()
+    catalog.stop_pubsub()
+    await close_mongo_client()
+
+app = FastAPI(
+    title="Trading Outpost API",
+    description="API for managing trading outposts, users, and trades in the Trading Outpost game.",
+    version="1.0.0",
+    lifespan=lifespan,
+    #orjson with ObjectId/datetime support for every route that returns plain data (see response_utils)
+    default_response_class=BSONResponse
+)
+
+# CORS Setup (to allow React frontend in future)
+origins = [
+    "http://localhost:3000",  # React frontend
+]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Register Routers
+app.include_router(auth.router)
+app.include_router(outposts.router)
+app.include_router(trades.router)
+app.include_router(users.router)
+app.include_router(transports.router)
+app.include_router(goods.router)
+app.include_router(trades.router)
+app.include_router(backup.router)
+
+# Test route
+@app.get("/")
+async def root():
+    return {"message": "Welcome to the Trading Outpost API"}
+
+@app.get("/catalog/metrics")
+async def catalog_metrics():
+    """Hit/miss counts of the catalog caches of this worker (see catalog_cache_utils)."""
+    return catalog.metrics()
\ No newline at end of file